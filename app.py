@@ -1,35 +1,661 @@
 #!/usr/bin/env python3.12
 
-import sys
-import time
 import os
+import time
+
+STARTED = time.perf_counter()
+
+# STARTUP_PROFILE=1 logs start-up time per phase and the slowest imports. The
+# import timer has to be installed before the rest of the app is imported.
+startup_profiler = None
+if os.getenv("STARTUP_PROFILE") == "1":
+    from worker.startup import ImportTimer, StartupProfiler
+    import_timer = ImportTimer()
+    import_timer.install()
+    startup_profiler = StartupProfiler(STARTED, import_timer)
+
+import asyncio
+import functools
+import json
+import signal
+import sys
 from datetime import datetime
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
 
-def main():
+from worker.cgroup import UsageSampler
+from worker.checkpoint import CheckpointOffsetStore, CheckpointStore, create_checkpoint_backend
+from worker.health import HealthServer, HealthState
+from worker.http_client import HttpError, close_http_client, configure_http_client, get_http_client, parse_rate_limits
+from worker.ingest import OffsetStore, follow_jsonl, ingest_jsonl
+from worker.logwriter import close_log_writer, log
+from worker.memory import create_memory_governor
+from worker.metrics import configure_metrics, get_metrics
+from worker.polling import AdaptivePoller
+from worker.scheduler import TaskScheduler
+from worker.settings import get_settings
+from worker.shutdown import Deadline, install_signal_handlers
+from worker.ticker import format_summary
+from worker.transforms import normalize_request
+
+EXECUTION_MODES = ("async", "process")
+# Request fields resolved through the reference caches, and the cache for each.
+REFERENCE_FIELDS = {"employee_id": "employees", "org_unit_id": "org_units", "pay_grade": "pay_grades"}
+
+def startup_mark(phase: str) -> None:
+    if startup_profiler is not None:
+        startup_profiler.mark(phase)
+
+def print_banner(settings: Dict[str, Any]) -> None:
     print("=" * 50)
     print("HCM POC Application Starting...")
     print(f"Python version: {sys.version}")
-    print(f"Environment: {os.getenv('ENVIRONMENT', 'unknown')}")
-    print(f"Project: {os.getenv('PROJECT_NAME', 'unknown')}")
+    print(f"Environment: {settings['environment']}")
+    print(f"Project: {settings['project_name']}")
     print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 50)
-    
-    counter = 0
+    sys.stdout.flush()
+
+def create_pool(settings: Dict[str, Any]) -> Optional[Any]:
+    mode = settings["execution_mode"]
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode: {mode}. Available: {list(EXECUTION_MODES)}")
+    if mode == "async":
+        return None
+
+    # Imported here: concurrent.futures and multiprocessing cost ~15ms of
+    # start-up that async mode never needs.
+    from worker.pool import ProcessPool
+
+    pool = ProcessPool(
+        workers=settings["pool_workers"] or None,
+        chunk_size=settings["pool_chunk_size"],
+        ordered=settings["pool_ordered"]
+    )
+    log(f"Process pool started with {pool.workers} workers", event="pool_start", workers=pool.workers)
+    return pool
+
+def create_reference_caches(settings: Dict[str, Any]) -> Dict[str, Any]:
+    if not settings["reference_api_url"]:
+        return {}
+
+    from urllib.parse import quote
+    from worker.cache import MIB, create_cache, memory_budget
+
+    budget = int(settings["cache_memory_mib"] * MIB) or memory_budget(settings["cache_memory_fraction"])
+    base_url = settings["reference_api_url"].rstrip("/")
+    client = get_http_client()
+
+    def make_loader(name: str) -> Callable[[Any], Awaitable[Any]]:
+        async def load(key: Any) -> Any:
+            response = await client.get(f"{base_url}/{name}/{quote(str(key), safe='')}")
+            if response.status == 404:
+                return None
+            if not response.ok:
+                raise HttpError(f"GET {name}/{key} returned {response.status}")
+            return response.json()
+
+        return load
+
+    caches = {
+        name: create_cache(
+            name,
+            make_loader(name),
+            max_bytes=budget // len(REFERENCE_FIELDS),
+            ttl=settings["cache_ttl"],
+            stale_ttl=settings["cache_stale_ttl"]
+        )
+        for name in REFERENCE_FIELDS.values()
+    }
+    log(
+        f"Reference caches sized to {budget / MIB:.1f}MiB in total",
+        event="cache_start",
+        budget_bytes=budget,
+        caches=list(caches)
+    )
+    return caches
+
+def create_output_sink(settings: Dict[str, Any]) -> Optional[Any]:
+    # OUTPUT_BUCKET writes batches to S3, OUTPUT_DIR to a local directory;
+    # without either, results only appear in the logs.
+    if settings["output_bucket"]:
+        backend_name, location = "s3", settings["output_bucket"]
+    elif settings["output_dir"]:
+        backend_name, location = "local", settings["output_dir"]
+    else:
+        return None
+
+    from worker.output import MIB, OutputSink, create_output_backend
+
+    kwargs = {"endpoint_url": settings["output_s3_endpoint"]} if backend_name == "s3" else {}
+    sink = OutputSink(
+        create_output_backend(backend_name, location, **kwargs),
+        prefix=settings["output_prefix"],
+        fmt=settings["output_format"],
+        codec=settings["output_codec"],
+        batch_bytes=int(settings["output_batch_mib"] * MIB),
+        buffer_bytes=int(settings["output_buffer_mib"] * MIB),
+        part_bytes=int(settings["output_part_mib"] * MIB),
+        max_age=settings["output_max_age"]
+    )
+    log(
+        f"Writing {settings['output_format']} ({settings['output_codec']}) output to {backend_name}:{location}",
+        event="output_start",
+        backend=backend_name,
+        location=location
+    )
+    return sink
+
+def create_dedupe_index_from_settings(settings: Dict[str, Any]) -> Optional[Any]:
+    if not settings["dedupe_enabled"]:
+        return None
+
+    from worker.cache import memory_budget
+    from worker.dedupe import MIB, create_dedupe_index
+
+    budget = int(settings["dedupe_memory_mib"] * MIB) or memory_budget(settings["dedupe_memory_fraction"])
+    return create_dedupe_index(
+        settings["dedupe_store"],
+        settings["dedupe_path"],
+        budget,
+        window_keys=settings["dedupe_window_keys"],
+        window_seconds=settings["dedupe_window_seconds"],
+        error_rate=settings["dedupe_error_rate"],
+        claim_seconds=settings["dedupe_claim_seconds"]
+    )
+
+async def warm_reference_caches(settings: Dict[str, Any], caches: Dict[str, Any]) -> None:
+    # CACHE_WARM_PATH holds {"<cache name>": [keys...]}, typically the hot keys
+    # from a previous run.
+    path = settings["cache_warm_path"]
+    if not caches or not path:
+        return
+    try:
+        with open(path, "r") as f:
+            keys = json.load(f)
+    except (OSError, ValueError) as e:
+        log(f"Skipping cache warm-up, cannot read {path}: {e}", level="WARNING", event="cache_warm")
+        return
+
+    started = time.monotonic()
+    try:
+        loaded = await asyncio.wait_for(
+            asyncio.gather(*(cache.warm(keys.get(name, [])) for name, cache in caches.items())),
+            timeout=settings["cache_warm_timeout"]
+        )
+    except asyncio.TimeoutError:
+        log(
+            f"Cache warm-up did not finish within {settings['cache_warm_timeout']:.0f}s, continuing cold",
+            level="WARNING",
+            event="cache_warm"
+        )
+        return
+    log(
+        f"Warmed {sum(loaded)} reference entries in {time.monotonic() - started:.2f}s",
+        event="cache_warm",
+        loaded=dict(zip(caches, loaded))
+    )
+
+def make_request_handler(
+    pool: Optional[Any],
+    caches: Dict[str, Any],
+    sink: Optional[Any] = None,
+    dedupe: Optional[Any] = None,
+    dedupe_key: str = "request_id"
+) -> Callable[[Any], Awaitable[Optional[asyncio.Future]]]:
+    metrics = get_metrics()
+    processed = metrics.counter("RequestsProcessed")
+    latency = metrics.histogram("RequestLatency")
+
+    async def process(request: Dict[str, Any]) -> Optional[asyncio.Future]:
+        for field, name in REFERENCE_FIELDS.items():
+            cache = caches.get(name)
+            if cache is not None and request.get(field) is not None:
+                request.setdefault("reference", {})[field] = await cache.get(request[field])
+
+        log(
+            f"Processed request {request.get('request_id', 'unknown')}",
+            event="request",
+            request_id=request.get("request_id"),
+            fingerprint=request["fingerprint"]
+        )
+        # The future resolves once the result is written; intake acks the
+        # record only then.
+        if sink is not None:
+            return await sink.write(request)
+        return None
+
+    def settle(key: str, durable: asyncio.Future) -> None:
+        # A result that was never written does not make the request seen.
+        if durable.cancelled() or durable.exception() is not None:
+            dedupe.release(key)
+        else:
+            dedupe.complete(key)
+
+    async def process_request(record: Any) -> Optional[asyncio.Future]:
+        started = time.monotonic()
+        if pool is not None:
+            request = await pool.submit(normalize_request, record)
+        else:
+            request = normalize_request(record)
+
+        if dedupe is None:
+            durable = await process(request)
+        else:
+            # Replays of a completed request are skipped; without the key
+            # field, the content fingerprint identifies the request.
+            key = str(request.get(dedupe_key) or request["fingerprint"])
+            if not await dedupe.claim(key):
+                log(
+                    f"Skipping duplicate request {request.get('request_id', 'unknown')}",
+                    event="request_duplicate",
+                    request_id=request.get("request_id"),
+                    dedupe_key=key
+                )
+                return None
+            try:
+                durable = await process(request)
+            except BaseException:
+                dedupe.release(key)
+                raise
+            if durable is None:
+                dedupe.complete(key)
+            else:
+                durable.add_done_callback(functools.partial(settle, key))
+        processed.inc()
+        latency.record(time.monotonic() - started)
+        return durable
+
+    return process_request
+
+def open_checkpoint(settings: Dict[str, Any]) -> Optional[CheckpointStore]:
+    if settings["checkpoint_backend"] == "none":
+        return None
+
+    store = CheckpointStore(
+        create_checkpoint_backend(settings["checkpoint_backend"], settings["checkpoint_dir"]),
+        compact_bytes=settings["checkpoint_compact_bytes"]
+    )
+    started = time.perf_counter()
+    store.recover()
+    log(
+        f"Recovered checkpoint generation {store.generation} in {(time.perf_counter() - started) * 1000:.1f}ms",
+        event="checkpoint_recover",
+        generation=store.generation,
+        replayed_entries=store.recovered_entries
+    )
+    return store
+
+def start_ingestion(
+    settings: Dict[str, Any],
+    scheduler: TaskScheduler,
+    handler: Callable[[Any], Awaitable[Optional[asyncio.Future]]],
+    checkpoint: Optional[CheckpointStore],
+    poller: AdaptivePoller
+) -> Optional[asyncio.Task]:
+    if settings["sqs_queue_url"]:
+        from worker.sqs import QueueConsumer, get_sqs_client
+
+        consumer = QueueConsumer(
+            get_sqs_client(settings["sqs_queue_url"], max_connections=settings["sqs_max_connections"]),
+            settings["sqs_queue_url"],
+            scheduler,
+            handler,
+            batch_size=settings["sqs_batch_size"],
+            wait_seconds=settings["sqs_wait_seconds"],
+            visibility_timeout=settings["sqs_visibility_timeout"],
+            pollers=settings["sqs_pollers"],
+            delete_interval=settings["sqs_delete_interval"],
+            poller=poller
+        )
+        return asyncio.create_task(consumer.run(), name="queue")
+
+    if settings["partition_shards"]:
+        return start_partitioned_ingestion(settings, scheduler, handler)
+
+    path = settings["ingest_path"]
+    if not path or not os.path.exists(path):
+        log(f"No ingestion input at {path or '(unset)'}, running on the timer only")
+        return None
+
+    if checkpoint is not None and not settings["ingest_offset_path"]:
+        offset_store = CheckpointOffsetStore(checkpoint, f"ingest:{os.path.abspath(path)}")
+    else:
+        offset_store = OffsetStore(settings["ingest_offset_path"] or f"{path}.offset")
+    if settings["ingest_follow"]:
+        return asyncio.create_task(
+            follow_jsonl(
+                path,
+                scheduler,
+                handler,
+                offset_store,
+                poller,
+                chunk_size=settings["ingest_chunk_bytes"],
+                watch=settings["ingest_watch"]
+            ),
+            name="ingest"
+        )
+    return asyncio.create_task(
+        ingest_jsonl(
+            path,
+            scheduler,
+            handler,
+            offset_store,
+            chunk_size=settings["ingest_chunk_bytes"]
+        ),
+        name="ingest"
+    )
+
+def start_partitioned_ingestion(
+    settings: Dict[str, Any],
+    scheduler: TaskScheduler,
+    handler: Callable[[Any], Awaitable[Optional[asyncio.Future]]]
+) -> asyncio.Task:
+    # INGEST_PATH names one file per shard, e.g. requests-{shard}.jsonl, and
+    # each task follows only the shards it holds a lease on.
+    from worker.partition import LeaseOffsetStore, ShardCoordinator, create_lease_store
+
+    path = settings["ingest_path"]
+    if "{shard}" not in path:
+        raise ValueError(f"INGEST_PATH must contain {{shard}} when PARTITION_SHARDS is set, got {path}")
+    store = create_lease_store(settings["partition_store"], settings["partition_store_path"])
+
+    async def run_shard(shard: int, stop: asyncio.Event) -> None:
+        await follow_jsonl(
+            path.format(shard=shard),
+            scheduler,
+            handler,
+            LeaseOffsetStore(store, shard, coordinator.owner),
+            AdaptivePoller(
+                min_interval=settings["intake_poll_min"],
+                max_interval=settings["intake_poll_max"],
+                factor=settings["intake_poll_backoff"]
+            ),
+            chunk_size=settings["ingest_chunk_bytes"],
+            stop=stop,
+            watch=settings["ingest_watch"]
+        )
+
+    coordinator = ShardCoordinator(
+        store,
+        scheduler,
+        run_shard,
+        settings["partition_shards"],
+        owner=settings["partition_owner"] or None,
+        lease_ttl=settings["partition_lease_ttl"]
+    )
+
+    async def run_coordinator() -> None:
+        try:
+            await coordinator.run()
+        finally:
+            await asyncio.to_thread(store.close)
+
+    return asyncio.create_task(run_coordinator(), name="shards")
+
+async def run(settings: Dict[str, Any]) -> None:
+    metrics = configure_metrics(
+        settings["metrics_namespace"],
+        {"Environment": settings["environment"], "Service": settings["project_name"]}
+    )
+    heartbeats = metrics.counter("Heartbeats")
+    intake_poller = AdaptivePoller(
+        min_interval=settings["intake_poll_min"],
+        max_interval=settings["intake_poll_max"],
+        factor=settings["intake_poll_backoff"]
+    )
+    # Request handlers reach downstream APIs through get_http_client().
+    configure_http_client(
+        max_per_host=settings["http_max_per_host"],
+        timeout=settings["http_timeout"],
+        retries=settings["http_retries"],
+        retry_after_max=settings["http_retry_after_max"],
+        rate_limits=parse_rate_limits(settings["http_rate_limits"]),
+        breaker_failures=settings["http_breaker_failures"],
+        breaker_reset=settings["http_breaker_reset"]
+    )
+    caches = create_reference_caches(settings)
+    sink = create_output_sink(settings)
+    dedupe = create_dedupe_index_from_settings(settings)
+    scheduler = TaskScheduler(max_concurrency=settings["max_concurrency"])
+    health = HealthState(max_tick_age=settings["health_max_tick_age"])
+    health_server = HealthServer(health, host=settings["health_host"], port=settings["health_port"])
+    await health_server.start()
+    health.set_check("warmup", False)
+    startup_mark("health_server")
+    checkpoint = open_checkpoint(settings)
+    startup_mark("checkpoint_recover")
+    state = {"counter": checkpoint.counters.get("heartbeat", 0) if checkpoint is not None else 0}
+
+    async def heartbeat() -> None:
+        health.mark_tick()
+        heartbeats.inc()
+        if checkpoint is not None:
+            state["counter"] = checkpoint.incr("heartbeat", 2)
+        else:
+            state["counter"] += 2
+        log(f"Counter: {state['counter']} - Application running normally", event="tick", counter=state["counter"])
+
+    async def loop_lag_probe() -> None:
+        pass
+
+    async def report_tick_stats() -> None:
+        for name, ticker in scheduler.tickers.items():
+            log(format_summary(name, ticker), event="tick_stats", ticker=name, **ticker.summary())
+
+        loop_lag_p99_ms = loop_lag.lag.summary()["p99"] * 1000
+        if loop_lag_p99_ms > settings["loop_lag_warn_ms"]:
+            log(
+                f"Event loop lag p99 {loop_lag_p99_ms:.1f}ms exceeds "
+                f"{settings['loop_lag_warn_ms']:.0f}ms, the task CPU may be saturated",
+                level="WARNING",
+                event="loop_lag"
+            )
+
+    usage_sampler = UsageSampler()
+
+    async def publish_metrics() -> None:
+        # Task-level usage samples for tools/rightsizing.py.
+        usage = await asyncio.to_thread(usage_sampler.sample)
+        if "cpu_units" in usage:
+            metrics.gauge("CpuUtilized").set(round(usage["cpu_units"], 2))
+        if "memory_mib" in usage:
+            metrics.gauge("MemoryUtilized", "Megabytes").set(round(usage["memory_mib"], 1))
+        metrics.gauge("InFlight", "Count").set(scheduler.in_flight)
+        # What this task holds, running or waiting for a slot. It is bounded by
+        # the concurrency, so scaling uses the queue depth instead (EcsStack).
+        metrics.gauge("Backlog", "Count").set(scheduler.backlog)
+        metrics.gauge("LoopLagP99", "Milliseconds").set(round(loop_lag.lag.summary()["p99"] * 1000, 3))
+        metrics.gauge("IntakeMode").set(intake_poller.mode_code)
+        metrics.gauge("IntakePollInterval", "Seconds").set(intake_poller.interval)
+        for name, cache in caches.items():
+            metrics.gauge(f"CacheBytes.{name}", "Bytes").set(cache.bytes)
+            metrics.gauge(f"CacheEntries.{name}", "Count").set(len(cache))
+        if sink is not None:
+            metrics.gauge("OutputBufferedBytes", "Bytes").set(sink.buffered_bytes)
+        metrics.flush()
+
+    scheduler.add_periodic(
+        "heartbeat", heartbeat, interval=settings["tick_interval"], policy=settings["tick_policy"]
+    )
+    loop_lag = scheduler.add_periodic("loop-lag", loop_lag_probe, interval=settings["loop_lag_probe_interval"])
+    scheduler.add_periodic("tick-stats", report_tick_stats, interval=settings["stats_interval"])
+    scheduler.add_periodic("metrics", publish_metrics, interval=settings["metrics_interval"])
+
+    async def sync_checkpoint() -> None:
+        await asyncio.to_thread(checkpoint.flush)
+
+    if checkpoint is not None:
+        scheduler.add_periodic("checkpoint", sync_checkpoint, interval=settings["checkpoint_sync_interval"])
+    if sink is not None:
+        scheduler.add_periodic("output", sink.flush_due, interval=min(settings["output_max_age"], 5))
+    if dedupe is not None:
+        scheduler.add_periodic("dedupe", dedupe.flush, interval=settings["dedupe_flush_interval"])
+
+    memory = create_memory_governor(
+        scheduler,
+        limit_mib=settings["memory_limit_mib"],
+        shrink_at=settings["memory_shrink_at"],
+        throttle_at=settings["memory_throttle_at"],
+        pause_at=settings["memory_pause_at"],
+        trace_allocations=settings["memory_tracemalloc"],
+        caches=lambda: caches
+    )
+    if memory is not None:
+        scheduler.add_periodic("memory", memory.check, interval=settings["memory_check_interval"])
+    else:
+        log("No memory limit found, the memory governor is off", event="memory_pressure")
+
+    def on_signal(name: str) -> None:
+        if scheduler.stopping:
+            log(f"Received {name} while draining, still shutting down", level="WARNING", event="signal")
+            return
+        log(f"Application received {name}, shutting down gracefully...", event="signal", signal=name)
+        health.set_check("intake", False)
+        scheduler.stop()
+
+    install_signal_handlers(on_signal)
+
+    # SIGUSR1 or GET /admin/profile?seconds=&mode= on the health port (e.g.
+    # through ECS Exec) profiles the running task. The profiler is only
+    # imported on first use, so it costs nothing until then.
+    async def run_profile(seconds: float, mode: str) -> Dict[str, Any]:
+        from worker.profiler import get_profiler
+
+        profiler = get_profiler(
+            output_dir=settings["profile_dir"],
+            interval=settings["profile_interval"],
+            max_seconds=settings["profile_max_seconds"]
+        )
+        return await profiler.run(seconds, mode)
+
+    def on_profile_signal(name: str) -> None:
+        async def profile() -> None:
+            try:
+                await run_profile(settings["profile_seconds"], settings["profile_mode"])
+            except Exception as e:
+                log(f"Profile on {name} failed: {e}", level="WARNING", event="profile_error")
+
+        asyncio.ensure_future(profile())
+
+    async def profile_route(query: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        try:
+            seconds = float(query.get("seconds") or settings["profile_seconds"])
+            return 200, await run_profile(seconds, query.get("mode") or settings["profile_mode"])
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except RuntimeError as e:
+            return 409, {"error": str(e)}
+
+    install_signal_handlers(on_profile_signal, signals=(signal.SIGUSR1,))
+    health_server.add_route("/admin/profile", profile_route)
+
+    pool = create_pool(settings)
+    startup_mark("pool")
+    await warm_reference_caches(settings, caches)
+    startup_mark("cache_warm")
+    if dedupe is not None:
+        loaded = await dedupe.load()
+        log(f"Loaded {loaded} completed request keys into the dedupe filter", event="dedupe_load", loaded=loaded)
+        startup_mark("dedupe_load")
+    handler = make_request_handler(pool, caches, sink, dedupe, settings["dedupe_key"])
+    ingestion = start_ingestion(settings, scheduler, handler, checkpoint, intake_poller)
+    health.set_check("intake", True)
+    health.set_check("warmup", True)
+    # After the last phase: the heartbeat already ticks during the slow ones.
+    startup_mark("intake_start")
+    if startup_profiler is not None:
+        startup_profiler.report()
+
+    # Run in order once in-flight work has drained.
+    closers: List[Callable[[], Awaitable[Any]]] = []
+    if pool is not None:
+        closers.append(pool.close)
+    if dedupe is not None:
+        closers.append(dedupe.close)
+    if checkpoint is not None:
+        closers.append(lambda: asyncio.to_thread(checkpoint.close))
+    if settings["sqs_queue_url"]:
+        from worker.sqs import close_sqs_clients
+        closers.append(lambda: asyncio.to_thread(close_sqs_clients))
+    closers.append(close_http_client)
+    if caches:
+        from worker.cache import close_caches
+        closers.append(lambda: asyncio.to_thread(close_caches))
+
     try:
-        while True:
-            counter += 2
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            print(f"[{current_time}] Counter: {counter} - Application running normally")
-            
-            sys.stdout.flush()
-            
-            time.sleep(10)
+        await scheduler.run()
+    finally:
+        health.set_check("intake", False)
+        await shutdown(settings, scheduler, ingestion, sink, closers)
+        await health_server.close()
+
+async def shutdown(
+    settings: Dict[str, Any],
+    scheduler: TaskScheduler,
+    ingestion: Optional[asyncio.Task],
+    sink: Optional[Any],
+    closers: List[Callable[[], Awaitable[Any]]]
+) -> None:
+    deadline = Deadline(settings["shutdown_timeout"])
+    scheduler.stop()
+    in_flight = scheduler.in_flight
+    drained = await scheduler.drain(timeout=deadline.remaining())
+
+    # Whatever is still buffered is written out once the last records are in.
+    # Intake acks those records only after this, so anything not written by
+    # the deadline is redelivered rather than lost.
+    if sink is not None:
+        try:
+            await asyncio.wait_for(sink.close(), timeout=deadline.remaining())
+        except asyncio.TimeoutError:
+            log("Output not written before the shutdown deadline, its input will be redelivered", level="WARNING", event="shutdown")
+        except Exception as e:
+            log(f"Error while closing output: {e}", level="ERROR", event="shutdown_error", error=str(e))
+
+    # Ingestion acks what was written and saves the resume offset; if it runs
+    # out of time the cancellation still saves whatever has completed.
+    if ingestion is not None:
+        try:
+            await asyncio.wait_for(asyncio.shield(ingestion), timeout=deadline.remaining())
+        except asyncio.TimeoutError:
+            ingestion.cancel()
+            await asyncio.gather(ingestion, return_exceptions=True)
+        except Exception as e:
+            log(f"Ingestion failed during shutdown: {e!r}", level="ERROR", event="shutdown_error", error=str(e))
+
+    for close in closers:
+        try:
+            await close()
+        except Exception as e:
+            log(f"Error while shutting down: {e}", level="ERROR", event="shutdown_error", error=str(e))
+    get_metrics().flush()
+
+    log(
+        f"Shutdown complete in {deadline.elapsed():.2f}s",
+        level="INFO" if drained else "WARNING",
+        event="shutdown",
+        in_flight_at_stop=in_flight,
+        drained=drained,
+        elapsed_seconds=round(deadline.elapsed(), 3)
+    )
+
+def main():
+    startup_mark("imports")
+    settings = get_settings()
+    print_banner(settings)
+    startup_mark("settings")
+
+    try:
+        asyncio.run(run(settings))
     except KeyboardInterrupt:
-        print("Application received interrupt signal, shutting down gracefully...")
-        sys.exit(0)
+        log("Application received interrupt signal, shutting down gracefully...")
     except Exception as e:
-        print(f"ERROR: Unexpected error occurred: {e}")
+        log(f"Unexpected error occurred: {e}", level="ERROR")
+        close_log_writer()
         sys.exit(1)
 
+    close_log_writer()
+    sys.exit(0)
+
 if __name__ == "__main__":
     main()
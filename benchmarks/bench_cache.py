@@ -0,0 +1,79 @@
+#!/usr/bin/env python3.12
+# Reference cache on a Zipf-skewed key stream: hit rate for a few memory
+# budgets, the cost of a hit, and how many loads a stampede on one cold key
+# turns into.
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.cache import TtlLruCache, estimate_size
+
+KEYS = 100_000
+LOOKUPS = 200_000
+ZIPF_S = 1.1
+# Cache capacity as a share of the key space.
+CAPACITIES = (0.01, 0.05, 0.10)
+HIT_LOOKUPS = 200_000
+STAMPEDE_CALLERS = 500
+
+def make_record(key: Any) -> Dict[str, Any]:
+    return {"id": key, "name": f"employee-{key}", "org_unit": f"org-{hash(key) % 500}", "grade": "G7", "active": True}
+
+def zipf_keys(seed: int = 11, keys: int = KEYS, lookups: int = LOOKUPS) -> List[str]:
+    rng = random.Random(seed)
+    weights = list(itertools.accumulate(1 / (rank ** ZIPF_S) for rank in range(1, keys + 1)))
+    return [f"e{index}" for index in rng.choices(range(keys), cum_weights=weights, k=lookups)]
+
+async def replay(stream: List[str], max_bytes: int) -> Dict[str, Any]:
+    async def load(key: Any) -> Dict[str, Any]:
+        return make_record(key)
+
+    cache = TtlLruCache("bench", load, max_bytes=max_bytes, ttl=3600.0)
+    for key in stream:
+        await cache.get(key)
+    return {"hit_rate": cache.hit_rate, "entries": len(cache), "evictions": cache.evictions, "loads": cache.loads}
+
+async def hit_cost(lookups: int) -> float:
+    async def load(key: Any) -> Dict[str, Any]:
+        return make_record(key)
+
+    cache = TtlLruCache("bench", load)
+    await cache.warm(range(100))
+    started = time.perf_counter()
+    for i in range(lookups):
+        await cache.get(i % 100)
+    return (time.perf_counter() - started) / lookups * 1e9
+
+async def stampede(callers: int) -> int:
+    async def load(key: Any) -> Dict[str, Any]:
+        await asyncio.sleep(0.01)
+        return make_record(key)
+
+    cache = TtlLruCache("bench", load)
+    await asyncio.gather(*(cache.get("cold") for _ in range(callers)))
+    return cache.loads
+
+def run(lookups: int = LOOKUPS) -> Dict[str, Any]:
+    stream = zipf_keys(lookups=lookups)
+    entry_bytes = estimate_size("e12345") + estimate_size(make_record("e12345"))
+    results: Dict[str, Any] = {"keys": KEYS, "lookups": lookups, "zipf_s": ZIPF_S, "entry_bytes": entry_bytes}
+    for capacity in CAPACITIES:
+        budget = int(KEYS * capacity * entry_bytes)
+        results[f"capacity_{int(capacity * 100)}pct"] = {"max_bytes": budget, **asyncio.run(replay(stream, budget))}
+
+    results["hit_rate"] = results[f"capacity_{int(CAPACITIES[-1] * 100)}pct"]["hit_rate"]
+    results["get_hit_ns"] = asyncio.run(hit_cost(HIT_LOOKUPS))
+    results["stampede_callers"] = STAMPEDE_CALLERS
+    results["stampede_loads"] = asyncio.run(stampede(STAMPEDE_CALLERS))
+    return results
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
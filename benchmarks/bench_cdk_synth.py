@@ -0,0 +1,109 @@
+#!/usr/bin/env python3.12
+# CDK synthesis of cdk/app.py for one environment and for all of them: wall
+# time and peak RSS as the stack count grows, plus the cost of an environment
+# config lookup before and after it is memoized.
+
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CDK_DIR = os.path.join(ROOT, "cdk")
+sys.path.insert(0, ROOT)
+
+REPEATS = 2
+LOOKUPS = 100_000
+
+def _load_cdk_config() -> Any:
+    spec = importlib.util.spec_from_file_location("cdk_config", os.path.join(CDK_DIR, "config.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def synth(selector: str) -> Dict[str, Any]:
+    outdir = tempfile.mkdtemp(prefix="bench-cdk-synth-")
+    env = dict(os.environ)
+    env.update({
+        "CDK_ENVIRONMENT": selector,
+        "CDK_OUTDIR": outdir,
+        "CDK_DEFAULT_ACCOUNT": env.get("CDK_DEFAULT_ACCOUNT", "123456789012"),
+        "JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION": "1"
+    })
+    try:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "app.py"],
+            cwd=CDK_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        # wait4 reports this synth alone: the app and the jsii node host it
+        # spawns and reaps. ru_maxrss is in KiB on Linux, for the largest process.
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+        if os.waitstatus_to_exitcode(status) != 0:
+            raise RuntimeError(f"cdk synth failed for {selector}")
+
+        with open(os.path.join(outdir, "manifest.json"), "r") as f:
+            artifacts = json.load(f)["artifacts"].values()
+        return {
+            "stacks": sum(1 for artifact in artifacts if artifact["type"] == "aws:cloudformation:stack"),
+            "wall_s": elapsed,
+            "peak_rss_mib": usage.ru_maxrss / 1024
+        }
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+
+def best_of(selector: str, repeats: int) -> Dict[str, Any]:
+    runs = [synth(selector) for _ in range(repeats)]
+    return {
+        "stacks": runs[0]["stacks"],
+        "wall_s": min(run["wall_s"] for run in runs),
+        "peak_rss_mib": max(run["peak_rss_mib"] for run in runs)
+    }
+
+def config_lookups(config: Any, environments: List[str], lookups: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    for _ in range(lookups // 100):
+        config._environment_configs.cache_clear()
+        config.get_environment_config(environments[0])
+    cold = (time.perf_counter() - started) / (lookups // 100)
+
+    started = time.perf_counter()
+    for i in range(lookups):
+        config.get_environment_config(environments[i % len(environments)])
+    memoized = (time.perf_counter() - started) / lookups
+
+    return {"cold_us": cold * 1_000_000, "memoized_us": memoized * 1_000_000}
+
+def run(repeats: int = REPEATS) -> Dict[str, Any]:
+    config = _load_cdk_config()
+    environments = config.get_all_environments()
+
+    results: Dict[str, Any] = {"environments": {}}
+    for environment in environments:
+        results["environments"][environment] = best_of(environment, repeats)
+    results["all"] = best_of("all", repeats)
+
+    selected = results["environments"][environments[0]]
+    results["selected_wall_s"] = selected["wall_s"]
+    results["selected_peak_rss_mib"] = selected["peak_rss_mib"]
+    results["all_wall_s"] = results["all"]["wall_s"]
+    # Most of a synth is the fixed cost of loading aws-cdk-lib into jsii; this
+    # is what each further stack adds on top.
+    added_stacks = results["all"]["stacks"] - selected["stacks"]
+    if added_stacks:
+        results["marginal_wall_ms_per_stack"] = (results["all"]["wall_s"] - selected["wall_s"]) / added_stacks * 1000
+    results["selected_speedup"] = results["all"]["wall_s"] / selected["wall_s"]
+    results["config_lookup"] = config_lookups(config, environments, LOOKUPS)
+    return results
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3.12
+# The dedupe filter at 10M keys: insert and lookup rates, the measured false
+# positive rate against the configured one, and its size next to an exact
+# set of the same keys. Then claim/complete through DedupeIndex with each
+# store, with a share of the requests replayed.
+
+import asyncio
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.dedupe import MIB, DedupeIndex, GenerationalBloomFilter, MemoryDedupeStore, SqliteDedupeStore
+
+FILTER_KEYS = 10_000_000
+PROBE_KEYS = 1_000_000
+SET_SAMPLE = 100_000
+INDEX_REQUESTS = 200_000
+SQLITE_REQUESTS = 50_000
+REPLAY_EVERY = 10
+FLUSH_EVERY = 1_000
+
+def filter_run(keys: int, probes: int, error_rate: float = 0.001) -> Dict[str, Any]:
+    bloom = GenerationalBloomFilter(keys, 86400.0, error_rate=error_rate)
+    started = time.perf_counter()
+    for i in range(keys):
+        bloom.add(f"req-{i}", 0.0)
+    add_elapsed = time.perf_counter() - started
+
+    # Present keys from across all generations.
+    step = max(1, keys // probes)
+    started = time.perf_counter()
+    missed = sum(1 for i in range(0, keys, step) if f"req-{i}" not in bloom)
+    present_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    false_positives = sum(1 for i in range(probes) if f"new-{i}" in bloom)
+    absent_elapsed = time.perf_counter() - started
+
+    # An exact set of the same keys, extrapolated from a sample.
+    gc.collect()
+    tracemalloc.start()
+    sample = {f"req-{i}" for i in range(SET_SAMPLE)}
+    set_bytes = tracemalloc.get_traced_memory()[0] * keys / SET_SAMPLE
+    tracemalloc.stop()
+    del sample
+
+    return {
+        "keys": keys,
+        "adds_per_sec": keys / add_elapsed,
+        "present_lookups_per_sec": len(range(0, keys, step)) / present_elapsed,
+        "absent_lookups_per_sec": probes / absent_elapsed,
+        "missed_present_keys": missed,
+        "false_positive_rate": false_positives / probes,
+        "configured_error_rate": error_rate,
+        "filter_mib": bloom.nbytes / MIB,
+        "exact_set_mib": set_bytes / MIB
+    }
+
+async def index_run(store: Any, requests: int) -> Dict[str, Any]:
+    index = DedupeIndex(store, GenerationalBloomFilter(requests, 86400.0), window_keys=requests)
+    processed = 0
+    started = time.perf_counter()
+    for i in range(requests):
+        # Every REPLAY_EVERY-th request is a redelivery of an earlier one.
+        key = f"req-{i // 2}" if i % REPLAY_EVERY == 0 and i else f"req-{i}"
+        if await index.claim(key):
+            index.complete(key)
+            processed += 1
+        if i % FLUSH_EVERY == 0:
+            await index.flush()
+    await index.flush()
+    elapsed = time.perf_counter() - started
+    stats = index.stats()
+    await index.close()
+    return {
+        "requests": requests,
+        "claims_per_sec": requests / elapsed,
+        "processed": processed,
+        "duplicates": stats["duplicates"],
+        "false_positives": stats["false_positives"]
+    }
+
+def run(keys: int = FILTER_KEYS, probes: int = PROBE_KEYS) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"filter": filter_run(keys, probes)}
+    results["lookups_per_sec"] = results["filter"]["absent_lookups_per_sec"]
+    results["false_positive_rate"] = results["filter"]["false_positive_rate"]
+    results["memory_store"] = asyncio.run(index_run(MemoryDedupeStore(INDEX_REQUESTS), INDEX_REQUESTS))
+    with tempfile.TemporaryDirectory(prefix="bench-dedupe-") as directory:
+        store = SqliteDedupeStore(os.path.join(directory, "dedupe.db"))
+        results["sqlite_store"] = asyncio.run(index_run(store, SQLITE_REQUESTS))
+    return results
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3.12
+# Downstream call throughput through HttpClient against the local stub:
+# keep-alive pooling versus a new connection per request, and how many
+# upstream requests a burst of identical GETs turns into.
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.http_client import HttpClient
+from worker.http_stub import HttpStubServer
+
+REQUESTS = 2_000
+CONCURRENCY = 50
+MAX_PER_HOST = 10
+COALESCE_CALLERS = 200
+
+async def drive(client: HttpClient, url: str, requests: int, concurrency: int) -> float:
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(f"{url}&i={i}")
+
+    async def worker() -> None:
+        while not queue.empty():
+            response = await client.get(queue.get_nowait())
+            if response.status != 200:
+                raise RuntimeError(f"Unexpected status {response.status}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await client.close()
+    return requests / elapsed
+
+async def coalesce(url: str, callers: int) -> int:
+    client = HttpClient()
+    await asyncio.gather(*(client.get(url) for _ in range(callers)))
+    await client.close()
+    return client.requests_sent
+
+def run(requests: int = REQUESTS, concurrency: int = CONCURRENCY) -> Dict[str, Any]:
+    server = HttpStubServer().start()
+    try:
+        url = server.url("/ok?size=256")
+        results: Dict[str, Any] = {"requests": requests, "concurrency": concurrency, "max_per_host": MAX_PER_HOST}
+        for name, keep_alive in (("pooled", True), ("per_request", False)):
+            before = server.connections
+            client = HttpClient(max_per_host=MAX_PER_HOST, keep_alive=keep_alive)
+            results[f"{name}_requests_per_sec"] = asyncio.run(drive(client, url, requests, concurrency))
+            results[f"{name}_connections"] = server.connections - before
+
+        results["pooled_speedup"] = results["pooled_requests_per_sec"] / results["per_request_requests_per_sec"]
+        results["coalesce_callers"] = COALESCE_CALLERS
+        results["coalesce_upstream_requests"] = asyncio.run(coalesce(server.url("/ok?delay_ms=20"), COALESCE_CALLERS))
+        return results
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3.12
+# Compares the old print + sys.stdout.flush() path with the batched LogWriter.
+
+import io
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.logwriter import LogWriter
+
+LINES = 100_000
+
+def bench_print_flush(stream: io.TextIOBase, lines: int) -> float:
+    original = sys.stdout
+    sys.stdout = stream
+    try:
+        started = time.perf_counter()
+        for counter in range(lines):
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            print(f"[{current_time}] Counter: {counter} - Application running normally")
+            sys.stdout.flush()
+        return time.perf_counter() - started
+    finally:
+        sys.stdout = original
+
+def bench_log_writer(stream: io.TextIOBase, lines: int) -> Dict[str, float]:
+    writer = LogWriter(stream=stream)
+    started = time.perf_counter()
+    for counter in range(lines):
+        writer.log(f"Counter: {counter} - Application running normally", event="tick", counter=counter)
+    enqueued = time.perf_counter() - started
+    writer.close()
+    return {
+        "enqueue_seconds": enqueued,
+        "total_seconds": time.perf_counter() - started,
+        "batches": writer.batches_written
+    }
+
+def _drain(fd: int) -> None:
+    while os.read(fd, 1 << 16):
+        pass
+
+def _pipe_stream() -> io.TextIOBase:
+    # A pipe with a reader on the other end is what the awslogs driver sees.
+    read_fd, write_fd = os.pipe()
+    threading.Thread(target=_drain, args=(read_fd,), daemon=True).start()
+    return open(write_fd, "w", buffering=1)
+
+def run(lines: int = LINES) -> Dict[str, Any]:
+    with _pipe_stream() as stream:
+        print_seconds = bench_print_flush(stream, lines)
+    with _pipe_stream() as stream:
+        writer = bench_log_writer(stream, lines)
+
+    return {
+        "lines": lines,
+        "print_flush_lines_per_sec": lines / print_seconds,
+        "log_writer_caller_lines_per_sec": lines / writer["enqueue_seconds"],
+        "log_writer_total_lines_per_sec": lines / writer["total_seconds"],
+        "log_writer_batches": writer["batches"],
+        "print_flush_writes": lines
+    }
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3.12
+# Stress test for the memory governor: a child process ingests a JSONL file
+# of oversized records through a slow handler at full concurrency, against a
+# simulated task memory limit: without the governor, with it, and with it
+# while the handler leaks records, which should walk the pressure levels.
+# Reports each run's peak RSS against that limit.
+
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.cgroup import process_rss
+from worker.ingest import OffsetStore, ingest_jsonl
+from worker.memory import MemoryGovernor
+from worker.scheduler import TaskScheduler
+from worker.transforms import normalize_request
+
+LIMIT_MIB = 128
+RECORDS = 400
+PAYLOAD_BYTES = 384 * 1024
+CONCURRENCY = 200
+HOLD_SECONDS = 0.1
+CHECK_INTERVAL = 0.05
+LEAKED_RECORDS = 200
+
+def write_input(path: str, records: int) -> None:
+    with open(path, "w") as f:
+        for i in range(records):
+            f.write(json.dumps({"request_id": f"big-{i}", "payload": f" {i:08d}" * (PAYLOAD_BYTES // 9)}) + "\n")
+
+async def stress(path: str, governed: bool, leak: bool = False) -> Dict[str, Any]:
+    scheduler = TaskScheduler(max_concurrency=CONCURRENCY)
+    governor = None
+    if governed:
+        governor = MemoryGovernor(scheduler, LIMIT_MIB * 2**20, process_rss, trace_allocations=True)
+        scheduler.add_periodic("memory", governor.check, interval=CHECK_INTERVAL)
+
+    leaked = []
+
+    async def handler(record: Any) -> None:
+        # Holds the record and a normalized copy while "calling downstream".
+        request = normalize_request(record)
+        await asyncio.sleep(HOLD_SECONDS)
+        if leak and len(leaked) < LEAKED_RECORDS:
+            leaked.append(request)
+        del request
+
+    started = time.perf_counter()
+    reader = await ingest_jsonl(path, scheduler, handler, OffsetStore(f"{path}.offset"))
+    elapsed = time.perf_counter() - started
+    scheduler.stop()
+    await scheduler.drain(timeout=5)
+    return {
+        "records": reader.records,
+        "elapsed_s": elapsed,
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "escalations": governor.escalations if governor is not None else 0
+    }
+
+def measure(path: str, governed: bool, leak: bool = False) -> Dict[str, Any]:
+    # A fresh process per run, so each peak RSS is its own.
+    if os.path.exists(f"{path}.offset"):
+        os.remove(f"{path}.offset")
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", path, "1" if governed else "0", "1" if leak else "0"],
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    logs = [json.loads(line) for line in output.splitlines()[:-1] if line.startswith("{")]
+    result["pressure_changes"] = [entry["pressure"] for entry in logs if entry.get("event") == "memory_pressure"]
+    result["logged_top_allocations"] = any(entry.get("event") == "memory_top_allocations" for entry in logs)
+    result["under_limit"] = result["peak_rss_mib"] < LIMIT_MIB
+    return result
+
+def run() -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "oversized.jsonl")
+        write_input(path, RECORDS)
+        results: Dict[str, Any] = {
+            "limit_mib": LIMIT_MIB,
+            "input_mib": os.path.getsize(path) / 2**20,
+            "concurrency": CONCURRENCY
+        }
+        results["ungoverned"] = measure(path, governed=False)
+        results["governed"] = measure(path, governed=True)
+        results["governed_leaking"] = measure(path, governed=True, leak=True)
+    results["governed_peak_pct_of_limit"] = results["governed"]["peak_rss_mib"] / LIMIT_MIB * 100
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        result = asyncio.run(stress(sys.argv[2], sys.argv[3] == "1", sys.argv[4] == "1"))
+        from worker.logwriter import close_log_writer
+        close_log_writer()
+        print(json.dumps(result), flush=True)
+    else:
+        print(json.dumps(run(), indent=2))
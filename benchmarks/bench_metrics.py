@@ -0,0 +1,54 @@
+#!/usr/bin/env python3.12
+# Per-observation cost of the in-process metrics; the target is < 1 microsecond.
+
+import io
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.logwriter import LogWriter
+from worker.metrics import MetricsRegistry
+
+OPERATIONS = 1_000_000
+
+def ns_per_op(func: Callable[[float], None], values: list) -> float:
+    started = time.perf_counter_ns()
+    for value in values:
+        func(value)
+    return (time.perf_counter_ns() - started) / len(values)
+
+def run(operations: int = OPERATIONS) -> Dict[str, Any]:
+    writer = LogWriter(stream=io.StringIO())
+    registry = MetricsRegistry("HCM/POC/Bench", {"Environment": "bench"}, writer)
+    counter = registry.counter("Ops")
+    gauge = registry.gauge("Depth")
+    histogram = registry.histogram("Latency")
+
+    rng = random.Random(42)
+    values = [rng.lognormvariate(-6, 1.5) for _ in range(operations)]
+
+    baseline = ns_per_op(lambda value: None, values)
+    results = {
+        "operations": operations,
+        "loop_overhead_ns": baseline,
+        "counter_inc_ns": ns_per_op(lambda value: counter.inc(), values) - baseline,
+        "gauge_set_ns": ns_per_op(gauge.set, values) - baseline,
+        "histogram_record_ns": ns_per_op(histogram.record, values) - baseline,
+        "histogram_p50_ms": histogram.percentile(0.50) * 1000,
+        "histogram_p99_ms": histogram.percentile(0.99) * 1000
+    }
+
+    started = time.perf_counter()
+    document = registry.flush()
+    results["flush_ms"] = (time.perf_counter() - started) * 1000
+    results["flush_bytes"] = len(json.dumps(document))
+    writer.close()
+    return results
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3.12
+# Batched, compressed output against one object per record, both through the
+# local-directory backend (each object is written, fsynced and renamed into
+# place, as each S3 PUT is a durable request of its own). Also counts the S3
+# requests each approach would make.
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.output import MIB, LocalDirectoryBackend, OutputSink
+from worker.transforms import normalize_request
+
+RECORDS = 50_000
+PER_RECORD_SAMPLE = 2_000
+
+def make_records(count: int) -> List[Dict[str, Any]]:
+    return [
+        normalize_request({
+            "request_id": f"req-{i}",
+            "employee_id": f"E{i % 5000:05d}",
+            "org_unit_id": f"OU{i % 40:03d}",
+            "pay_grade": f"G{i % 12}",
+            "action": "update",
+            "payload": {"hours": i % 60, "note": f"timesheet correction {i}"}
+        })
+        for i in range(count)
+    ]
+
+async def batched(directory: str, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    sink = OutputSink(
+        LocalDirectoryBackend(directory),
+        batch_bytes=16 * MIB,
+        buffer_bytes=1 * MIB,
+        part_bytes=5 * MIB,
+        max_age=3600
+    )
+    started = time.perf_counter()
+    for record in records:
+        await sink.write(record)
+    await sink.close()
+    elapsed = time.perf_counter() - started
+    return {
+        "records_per_sec": len(records) / elapsed,
+        "objects": sink.batches,
+        "bytes_written": sink.bytes_written,
+        # CreateMultipartUpload + parts + CompleteMultipartUpload per batch.
+        "s3_requests": 2 * sink.batches + sink.parts
+    }
+
+async def per_record(directory: str, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    backend = LocalDirectoryBackend(directory)
+    written = 0
+
+    def put(index: int, record: Dict[str, Any]) -> int:
+        data = zlib.compress(json.dumps(record, separators=(",", ":")).encode() + b"\n", 6, 31)
+        upload = backend.start(f"single/{index:08d}.jsonl.gz")
+        upload.upload_part(data)
+        upload.complete()
+        return len(data)
+
+    started = time.perf_counter()
+    for index, record in enumerate(records):
+        written += await asyncio.to_thread(put, index, record)
+    elapsed = time.perf_counter() - started
+    return {
+        "records_per_sec": len(records) / elapsed,
+        "objects": len(records),
+        "bytes_written": written,
+        "s3_requests": len(records)
+    }
+
+def run(records: int = RECORDS, sample: int = PER_RECORD_SAMPLE) -> Dict[str, Any]:
+    data = make_records(records)
+    raw_bytes = sum(len(json.dumps(record, separators=(",", ":"))) + 1 for record in data)
+    directory = tempfile.mkdtemp(prefix="bench-output-")
+    try:
+        results: Dict[str, Any] = {"records": records, "raw_mib": raw_bytes / MIB}
+        results["batched"] = asyncio.run(batched(os.path.join(directory, "batched"), data))
+        # One object per record is slow enough that a sample gives the rate.
+        results["per_record"] = asyncio.run(per_record(os.path.join(directory, "single"), data[:sample]))
+        results["per_record"]["bytes_per_record"] = results["per_record"]["bytes_written"] / sample
+        results["batched"]["bytes_per_record"] = results["batched"]["bytes_written"] / records
+        results["compression_ratio"] = raw_bytes / results["batched"]["bytes_written"]
+        results["batched_speedup"] = results["batched"]["records_per_sec"] / results["per_record"]["records_per_sec"]
+        results["s3_requests_per_1k_records"] = {
+            "batched": results["batched"]["s3_requests"] / records * 1000,
+            "per_record": 1000
+        }
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3.12
+# Sharded intake across 1..N worker processes sharing one SQLite lease store:
+# records per second once the shards have settled, whether every record was
+# handled exactly once, and how many shards move when a task joins.
+
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.ingest import follow_jsonl
+from worker.partition import LeaseOffsetStore, ShardCoordinator, SqliteLeaseStore, assign_shards, shard_for
+from worker.polling import AdaptivePoller
+from worker.scheduler import TaskScheduler
+
+SHARDS = 16
+RECORDS = 4_000
+TASKS = (1, 2, 4)
+# Each record waits on a simulated downstream call, so a task is bound by its
+# concurrency limit rather than by CPU; that is what adding tasks relieves.
+RECORD_DELAY = 0.02
+CONCURRENCY = 10
+LEASE_TTL = 2.0
+
+async def _run_task(store_path: str, pattern: str, owner: str, owned: Any, processed: Any, stop: Any) -> None:
+    scheduler = TaskScheduler(max_concurrency=CONCURRENCY)
+    store = SqliteLeaseStore(store_path)
+
+    async def handler(record: Any) -> None:
+        await asyncio.sleep(RECORD_DELAY)
+        with processed.get_lock():
+            processed.value += 1
+
+    async def run_shard(shard: int, shard_stop: asyncio.Event) -> None:
+        offsets = LeaseOffsetStore(store, shard, owner)
+        poller = AdaptivePoller(min_interval=0.02, max_interval=0.1, factor=2)
+        await follow_jsonl(pattern.format(shard=shard), scheduler, handler, offsets, poller, stop=shard_stop)
+
+    coordinator = ShardCoordinator(store, scheduler, run_shard, SHARDS, owner=owner, lease_ttl=LEASE_TTL)
+
+    async def watch() -> None:
+        while not stop.is_set():
+            owned.value = len(coordinator.owned)
+            await asyncio.sleep(0.02)
+        scheduler.stop()
+
+    await asyncio.gather(coordinator.run(), watch())
+    store.close()
+
+def task_main(store_path: str, pattern: str, owner: str, owned: Any, processed: Any, stop: Any) -> None:
+    sys.stdout = open(os.devnull, "w")
+    asyncio.run(_run_task(store_path, pattern, owner, owned, processed, stop))
+
+def write_records(pattern: str, records: int) -> None:
+    shards: Dict[int, List[str]] = {}
+    for i in range(records):
+        line = json.dumps({"request_id": f"bench-{i}"})
+        shards.setdefault(shard_for(f"bench-{i}", SHARDS), []).append(line)
+    for shard, lines in shards.items():
+        with open(pattern.format(shard=shard), "a") as f:
+            f.write("\n".join(lines) + "\n")
+
+def measure(tasks: int, records: int) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        store_path = os.path.join(directory, "leases.db")
+        pattern = os.path.join(directory, "requests-{shard}.jsonl")
+        SqliteLeaseStore(store_path).close()
+        stop = context.Event()
+        processed = context.Value("q", 0)
+        owned = [context.Value("i", 0) for _ in range(tasks)]
+        processes = [
+            context.Process(target=task_main, args=(store_path, pattern, f"task-{i}", owned[i], processed, stop))
+            for i in range(tasks)
+        ]
+        for process in processes:
+            process.start()
+
+        # Time only steady-state processing: wait until every task holds its
+        # share of the shards before any input appears.
+        expected = assign_shards(SHARDS, [f"task-{i}" for i in range(tasks)])
+        shares = [sum(owner == f"task-{i}" for owner in expected.values()) for i in range(tasks)]
+        settle_started = time.perf_counter()
+        while [value.value for value in owned] != shares:
+            time.sleep(0.01)
+        settle_seconds = time.perf_counter() - settle_started
+
+        started = time.perf_counter()
+        write_records(pattern, records)
+        while processed.value < records:
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        # Anything handled twice would show up here.
+        time.sleep(0.3)
+        stop.set()
+        for process in processes:
+            process.join()
+
+        return {
+            "records_per_sec": records / elapsed,
+            "processed": processed.value,
+            "shards_per_task": shares,
+            "settle_seconds": settle_seconds
+        }
+
+def run(records: int = RECORDS) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "shards": SHARDS,
+        "records": records,
+        "record_delay_ms": RECORD_DELAY * 1000,
+        "concurrency_per_task": CONCURRENCY
+    }
+    for tasks in TASKS:
+        results[f"tasks_{tasks}"] = measure(tasks, records)
+
+    single = results[f"tasks_{TASKS[0]}"]["records_per_sec"]
+    for tasks in TASKS:
+        result = results[f"tasks_{tasks}"]
+        result["speedup"] = result["records_per_sec"] / single
+        # The task with the most shards finishes last, so an uneven split caps
+        # the speedup below the task count.
+        result["speedup_limit"] = SHARDS / max(result["shards_per_task"])
+    most = TASKS[-1]
+    results["scaling_efficiency"] = results[f"tasks_{most}"]["speedup"] / (most / TASKS[0])
+    results["exactly_once"] = all(results[f"tasks_{tasks}"]["processed"] == records for tasks in TASKS)
+
+    before = assign_shards(SHARDS, [f"task-{i}" for i in range(most)])
+    after = assign_shards(SHARDS, [f"task-{i}" for i in range(most + 1)])
+    results["shards_moved_on_join"] = sum(before[shard] != after[shard] for shard in range(SHARDS))
+    return results
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3.12
+# Throughput of a CPU-bound record transform through ProcessPool at 1..N workers.
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.cgroup import effective_cpu_count
+from worker.pool import ProcessPool
+from worker.transforms import normalize_request
+
+RECORDS = 20_000
+ROUNDS_PER_RECORD = 20
+
+def heavy_transform(record: Dict[str, Any]) -> Dict[str, Any]:
+    result = record
+    for _ in range(ROUNDS_PER_RECORD):
+        result = normalize_request(record)
+    return result
+
+def make_records(count: int) -> List[Dict[str, Any]]:
+    return [
+        {"request_id": f"req-{i}", "employee_id": i % 5000, "title": " Update pay grade ", "body": "x" * 200}
+        for i in range(count)
+    ]
+
+async def measure(workers: int, records: List[Dict[str, Any]], chunk_size: int) -> float:
+    pool = ProcessPool(workers=workers, chunk_size=chunk_size)
+    # Warm the workers so process start-up is not counted as throughput.
+    async for _ in pool.map(heavy_transform, records[:workers * chunk_size]):
+        pass
+
+    started = time.perf_counter()
+    count = 0
+    async for _ in pool.map(heavy_transform, records):
+        count += 1
+    elapsed = time.perf_counter() - started
+    await pool.close()
+    return count / elapsed
+
+def run(records: int = RECORDS, max_workers: int = 0, chunk_size: int = 256) -> Dict[str, Any]:
+    max_workers = max_workers or max(2, effective_cpu_count())
+    data = make_records(records)
+
+    started = time.perf_counter()
+    for record in data:
+        heavy_transform(record)
+    inline = records / (time.perf_counter() - started)
+
+    scaling = {}
+    for workers in range(1, max_workers + 1):
+        scaling[str(workers)] = asyncio.run(measure(workers, data, chunk_size))
+
+    return {
+        "records": records,
+        "chunk_size": chunk_size,
+        "effective_cpu_count": effective_cpu_count(),
+        "inline_records_per_sec": inline,
+        "pool_records_per_sec": scaling,
+        "speedup": {workers: rate / scaling["1"] for workers, rate in scaling.items()}
+    }
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
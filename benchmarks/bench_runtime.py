@@ -0,0 +1,130 @@
+#!/usr/bin/env python3.12
+# Worker runtime: per-tick scheduler overhead, cold start to first healthy
+# tick, and peak RSS under ingestion compared with the task memory limits.
+
+import asyncio
+import importlib.util
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from worker.health import probe
+from worker.scheduler import TaskScheduler
+
+TICKS = 20_000
+
+def _load_cdk_config() -> Any:
+    spec = importlib.util.spec_from_file_location("cdk_config", os.path.join(ROOT, "cdk", "config.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def _tick_overhead(ticks: int) -> float:
+    scheduler = TaskScheduler(max_concurrency=10)
+    done = asyncio.Event()
+    count = 0
+
+    async def job() -> None:
+        nonlocal count
+        count += 1
+        if count >= ticks:
+            done.set()
+
+    started = time.perf_counter()
+    scheduler.add_periodic("bench", job, interval=1e-9)
+    await done.wait()
+    elapsed = time.perf_counter() - started
+    scheduler.stop()
+    await scheduler.drain(timeout=1)
+    return elapsed / ticks
+
+def _app_env(workdir: str, **overrides: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "HEALTH_PORT": str(_free_port()),
+        "CHECKPOINT_DIR": os.path.join(workdir, ".checkpoint"),
+        "INGEST_PATH": "",
+        "PYTHONUNBUFFERED": "1"
+    })
+    env.update(overrides)
+    return env
+
+def cold_start(timeout: float = 30.0) -> Optional[float]:
+    workdir = tempfile.mkdtemp(prefix="bench-start-")
+    env = _app_env(workdir, TICK_INTERVAL_SECONDS="10")
+    port = int(env["HEALTH_PORT"])
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "app.py")],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        # /healthz turns 200 only after the first heartbeat tick and warm-up.
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                return None
+            if probe("/healthz", port=port, timeout=0.5, quiet=True) == 0:
+                return time.perf_counter() - started
+            time.sleep(0.005)
+        return None
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def peak_rss_mib(records: int = 200_000, seconds: float = 5.0) -> float:
+    workdir = tempfile.mkdtemp(prefix="bench-rss-")
+    input_path = os.path.join(workdir, "requests.jsonl")
+    with open(input_path, "w") as f:
+        for i in range(records):
+            f.write(json.dumps({"request_id": f"req-{i}", "title": "Update pay grade", "body": "x" * 512}) + "\n")
+
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "app.py")],
+        cwd=workdir,
+        env=_app_env(workdir, INGEST_PATH=input_path, TICK_INTERVAL_SECONDS="1"),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        time.sleep(seconds)
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # ru_maxrss is in KiB on Linux and is the max over all waited children.
+    return max(before, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+def run(ticks: int = TICKS) -> Dict[str, Any]:
+    config = _load_cdk_config()
+    limits = {env: config.get_environment_config(env)["ecs"]["memory"] for env in config.get_all_environments()}
+    rss = peak_rss_mib()
+    start_seconds = cold_start()
+
+    return {
+        "tick_overhead_us": asyncio.run(_tick_overhead(ticks)) * 1_000_000,
+        "cold_start_to_first_tick_ms": None if start_seconds is None else start_seconds * 1000,
+        "peak_rss_mib": rss,
+        "memory_limit_mib": limits,
+        "peak_rss_fraction_of_limit": {env: rss / limit for env, limit in limits.items()}
+    }
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3.12
+# Queue intake throughput per task against the local SQS stand-in: messages
+# received, handled and deleted per second, and how many HTTP requests and
+# connections that took.
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.scheduler import TaskScheduler
+from worker.sqs import MAX_BATCH, QueueConsumer, SqsClient
+from worker.sqs_local import LocalSqsServer
+
+MESSAGES = 5_000
+POLLERS = 2
+
+async def consume(client: SqsClient, queue_url: str, messages: int, pollers: int) -> Dict[str, Any]:
+    scheduler = TaskScheduler(max_concurrency=200)
+    handled = 0
+
+    async def handler(record: Any) -> None:
+        nonlocal handled
+        handled += 1
+        if handled == messages:
+            scheduler.stop()
+
+    consumer = QueueConsumer(client, queue_url, scheduler, handler, wait_seconds=1, pollers=pollers)
+    started = time.perf_counter()
+    await consumer.run()
+    elapsed = time.perf_counter() - started
+    return {"elapsed": elapsed, "deleted": consumer.deleted, "polls": consumer.polls}
+
+def run(messages: int = MESSAGES, pollers: int = POLLERS) -> Dict[str, Any]:
+    server = LocalSqsServer().start()
+    try:
+        queue_url = server.queue_url("bench")
+        client = SqsClient(server.queue_url(""), "us-east-1", max_connections=pollers + 4)
+        for i in range(0, messages, MAX_BATCH):
+            client.send_message_batch(
+                queue_url,
+                [json.dumps({"request_id": f"bench-{j}"}) for j in range(i, min(i + MAX_BATCH, messages))]
+            )
+        seeded_requests = client.requests
+
+        result = asyncio.run(consume(client, queue_url, messages, pollers))
+        remaining = client.get_queue_attributes(queue_url, ["All"])
+        client.close()
+
+        consume_requests = client.requests - seeded_requests - 1
+        return {
+            "messages": messages,
+            "pollers": pollers,
+            "messages_per_sec": result["deleted"] / result["elapsed"],
+            "deleted": result["deleted"],
+            "left_in_queue": int(remaining["ApproximateNumberOfMessages"]) + int(remaining["ApproximateNumberOfMessagesNotVisible"]),
+            "receive_calls": result["polls"],
+            "requests_per_message": consume_requests / messages,
+            "connections_opened": client.connections_opened
+        }
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
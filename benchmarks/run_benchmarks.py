@@ -0,0 +1,137 @@
+#!/usr/bin/env python3.12
+# Runs the benchmark modules, writes their results as JSON and compares the
+# tracked metrics against a stored baseline.
+#
+#   python3 benchmarks/run_benchmarks.py                      # run and compare
+#   python3 benchmarks/run_benchmarks.py --save-baseline      # record a new baseline
+#   python3 benchmarks/run_benchmarks.py --only runtime --threshold 0.2
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+BENCHMARKS = ["runtime", "logwriter", "metrics", "checkpoint", "process_pool", "sqs", "intake_polling", "http_client", "cache", "partition", "profiler", "memory", "output", "dedupe", "cdk_synth"]
+
+# "<benchmark>.<key>" -> whether a larger value is better.
+TRACKED_METRICS = {
+    "runtime.tick_overhead_us": False,
+    "runtime.cold_start_to_first_tick_ms": False,
+    "runtime.peak_rss_mib": False,
+    "logwriter.log_writer_total_lines_per_sec": True,
+    "metrics.counter_inc_ns": False,
+    "metrics.histogram_record_ns": False,
+    "checkpoint.incr_ns": False,
+    "checkpoint.recover_ms": False,
+    "process_pool.inline_records_per_sec": True,
+    "sqs.messages_per_sec": True,
+    "intake_polling.latency_mean_ratio": False,
+    "intake_polling.latency_p99_ratio": False,
+    "intake_polling.wakeup_ratio": False,
+    "intake_polling.idle_wakeup_ratio": False,
+    "http_client.pooled_requests_per_sec": True,
+    "http_client.pooled_speedup": True,
+    "cache.hit_rate": True,
+    "cache.get_hit_ns": False,
+    "partition.scaling_efficiency": True,
+    "profiler.sample_cost_us": False,
+    "memory.governed_peak_pct_of_limit": False,
+    "output.batched_speedup": True,
+    "output.compression_ratio": True,
+    "dedupe.lookups_per_sec": True,
+    "dedupe.false_positive_rate": False,
+    "cdk_synth.selected_wall_s": False,
+    "cdk_synth.selected_peak_rss_mib": False
+}
+
+def run_benchmarks(names: List[str]) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name in names:
+        module = importlib.import_module(f"bench_{name}")
+        started = time.perf_counter()
+        results[name] = module.run()
+        print(f"{name}: done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return results
+
+def lookup(results: Dict[str, Any], dotted: str) -> Optional[float]:
+    value: Any = results
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value if isinstance(value, (int, float)) else None
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    rows = []
+    for metric, higher_is_better in TRACKED_METRICS.items():
+        now = lookup(current, metric)
+        before = lookup(baseline, metric)
+        if now is None or before is None or before == 0:
+            continue
+
+        change = (now - before) / abs(before)
+        regression = change < -threshold if higher_is_better else change > threshold
+        rows.append({
+            "metric": metric,
+            "baseline": before,
+            "current": now,
+            "change": change,
+            "regression": regression
+        })
+    return rows
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the worker benchmark suite")
+    parser.add_argument("--only", action="append", choices=BENCHMARKS, help="benchmark to run (repeatable)")
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "results", "latest.json"))
+    parser.add_argument("--baseline", default=os.path.join(BENCH_DIR, "results", "baseline.json"))
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression, e.g. 0.10 for 10%%")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    document = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": run_benchmarks(args.only or BENCHMARKS)
+    }
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    rows = compare(document["results"], baseline["results"], args.threshold)
+    for row in rows:
+        marker = "REGRESSION" if row["regression"] else "ok"
+        print(f"{marker:>10}  {row['metric']:<45} {row['baseline']:>14.3f} -> {row['current']:>14.3f} ({row['change']:+.1%})")
+
+    regressions = [row for row in rows if row["regression"]]
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 
+import os
 import aws_cdk as cdk
 from infra.ecr_stack import EcrStack
 from infra.vpc_stack import VpcStack
 from infra.ecs_stack import EcsStack
-from config import get_environment_config
+from config import ENVIRONMENT_CONTEXT_KEY, ENVIRONMENT_ENV_VAR, get_environment_config, select_environments
 
 app = cdk.App()
 
-environments = ["dev", "prod"]
+# Only the selected environments' stacks are constructed, so a single-environment
+# diff or deploy doesn't pay to synthesize the others.
+environments = select_environments(
+    app.node.try_get_context(ENVIRONMENT_CONTEXT_KEY) or os.getenv(ENVIRONMENT_ENV_VAR)
+)
 
 for env_name in environments:
     config = get_environment_config(env_name)
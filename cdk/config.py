@@ -1,9 +1,14 @@
+import functools
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-def get_environment_config(environment: str) -> Dict[str, Any]:
+# Selects the environments app.py builds stacks for: `cdk synth -c environment=dev`
+# or CDK_ENVIRONMENT=dev, comma-separated for several, "all" or unset for every one.
+ENVIRONMENT_CONTEXT_KEY = "environment"
+ENVIRONMENT_ENV_VAR = "CDK_ENVIRONMENT"
 
-    base_config = {
+def _base_config(environment: str) -> Dict[str, Any]:
+    return {
         "project_name": "cdk-hcm-poc",
         "tags": {
             "Project": "HCM-POC",
@@ -12,9 +17,13 @@ def get_environment_config(environment: str) -> Dict[str, Any]:
         }
     }
 
-    environment_configs = {
+# Built once per process; callers share the returned dicts and must not mutate them.
+@functools.lru_cache(maxsize=None)
+def _environment_configs() -> Dict[str, Dict[str, Any]]:
+
+    return {
         "dev": {
-            **base_config,
+            **_base_config("dev"),
             "account": os.getenv("CDK_DEFAULT_ACCOUNT"),
             "region": os.getenv("CDK_DEFAULT_REGION", "ap-northeast-1"),
             "vpc": {
@@ -29,14 +38,73 @@ def get_environment_config(environment: str) -> Dict[str, Any]:
                     "max_image_count": 10
                 }
             },
+            "sqs": {
+                "visibility_timeout": 30,
+                "receive_wait_time": 20,
+                "retention_days": 4,
+                "max_receive_count": 5,
+                "pollers": 2
+            },
+            "cache": {
+                "memory_fraction": 0.15,
+                "ttl_seconds": 300,
+                "stale_seconds": 60
+            },
+            "output": {
+                "prefix": "results",
+                "codec": "gzip",
+                "batch_mib": 16,
+                "max_age_seconds": 60,
+                "retention_days": 30
+            },
+            "dedupe": {
+                # Claims go to a DynamoDB table every task shares, so a replay
+                # is caught whichever task receives it.
+                "store": "dynamodb",
+                "window_keys": 200_000,
+                "window_seconds": 86400,
+                "memory_fraction": 0.10
+            },
+            "partition": {
+                # Shard leases for tasks that follow sharded files
+                # (PARTITION_SHARDS); shared by every task like the dedupe table.
+                "store": "dynamodb",
+                "lease_ttl_seconds": 15
+            },
             "ecs": {
                 "cpu": 256,
                 "memory": 512,
-                "desired_count": 0
+                # The worker is stateless and drains on SIGTERM, so it can run on
+                # Spot. Spot only places X86_64 tasks; ARM64 (Graviton) is for
+                # on-demand-only strategies, and the image is built for both.
+                "cpu_architecture": "X86_64",
+                "capacity_providers": [
+                    {"capacity_provider": "FARGATE_SPOT", "base": 0, "weight": 1}
+                ],
+                "stop_timeout": 30,
+                "shutdown_timeout": 25,
+                "health_check": {
+                    "interval": 15,
+                    "timeout": 5,
+                    "retries": 3,
+                    "start_period": 30
+                },
+                "metrics_namespace": "HCM/POC",
+                "autoscaling": {
+                    "min_tasks": 1,
+                    "max_tasks": 2,
+                    "target_backlog_per_task": 100,
+                    "scale_in_cooldown": 300,
+                    "scale_out_cooldown": 60,
+                    "burst_steps": [
+                        {"lower": 500, "change": 1}
+                    ],
+                    "burst_cooldown": 60
+                }
             }
         },
         "prod": {
-            **base_config,
+            **_base_config("prod"),
             "account": os.getenv("CDK_DEFAULT_ACCOUNT"),
             "region": os.getenv("CDK_DEFAULT_REGION", "ap-northeast-1"),
             "vpc": {
@@ -51,18 +119,91 @@ def get_environment_config(environment: str) -> Dict[str, Any]:
                     "max_image_count": 50
                 }
             },
+            "sqs": {
+                "visibility_timeout": 60,
+                "receive_wait_time": 20,
+                "retention_days": 14,
+                "max_receive_count": 5,
+                "pollers": 4
+            },
+            "cache": {
+                "memory_fraction": 0.25,
+                "ttl_seconds": 900,
+                "stale_seconds": 300
+            },
+            "output": {
+                "prefix": "results",
+                "codec": "gzip",
+                "batch_mib": 64,
+                # Queue messages stay leased until the batch holding their
+                # results completes, so batches close within a minute.
+                "max_age_seconds": 60,
+                "retention_days": 365
+            },
+            "dedupe": {
+                "store": "dynamodb",
+                "window_keys": 10_000_000,
+                "window_seconds": 86400,
+                "memory_fraction": 0.05
+            },
+            "partition": {
+                "store": "dynamodb",
+                "lease_ttl_seconds": 15
+            },
             "ecs": {
                 "cpu": 512,
                 "memory": 1024,
-                "desired_count": 0
+                "cpu_architecture": "X86_64",
+                # The first task always on demand, then one in four.
+                "capacity_providers": [
+                    {"capacity_provider": "FARGATE", "base": 1, "weight": 1},
+                    {"capacity_provider": "FARGATE_SPOT", "base": 0, "weight": 3}
+                ],
+                "stop_timeout": 60,
+                "shutdown_timeout": 50,
+                "health_check": {
+                    "interval": 15,
+                    "timeout": 5,
+                    "retries": 3,
+                    "start_period": 30
+                },
+                "metrics_namespace": "HCM/POC",
+                "autoscaling": {
+                    "min_tasks": 1,
+                    "max_tasks": 10,
+                    "target_backlog_per_task": 100,
+                    "scale_in_cooldown": 300,
+                    "scale_out_cooldown": 60,
+                    "burst_steps": [
+                        {"lower": 500, "change": 2},
+                        {"lower": 2000, "change": 4}
+                    ],
+                    "burst_cooldown": 60
+                }
             }
         }
     }
 
+def get_environment_config(environment: str) -> Dict[str, Any]:
+    environment_configs = _environment_configs()
+
     if environment not in environment_configs:
         raise ValueError(f"Unknown environment: {environment}. Available: {list(environment_configs.keys())}")
 
     return environment_configs[environment]
 
 def get_all_environments() -> list:
-    return ["dev", "prod"] 
+    return list(_environment_configs().keys())
+
+def select_environments(selector: Optional[str]) -> List[str]:
+    available = get_all_environments()
+    if not selector or selector.strip() == "all":
+        return available
+
+    selected = [name.strip() for name in selector.split(",") if name.strip()]
+    for name in selected:
+        if name not in available:
+            raise ValueError(f"Unknown environment: {name}. Available: {available}")
+
+    return [name for name in available if name in selected]
+
@@ -1,18 +1,32 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 from constructs import Construct
 import aws_cdk as cdk
 from aws_cdk import (
     Stack,
     aws_ecs as ecs,
     aws_ec2 as ec2,
+    aws_applicationautoscaling as appscaling,
+    aws_cloudwatch as cloudwatch,
+    aws_dynamodb as dynamodb,
     aws_ecr as ecr,
     aws_iam as iam,
     aws_logs as logs,
+    aws_s3 as s3,
+    aws_sqs as sqs,
     CfnOutput,
     Tags,
     RemovalPolicy
 )
 
+CAPACITY_PROVIDERS = ("FARGATE", "FARGATE_SPOT")
+CPU_ARCHITECTURES = {
+    "X86_64": ecs.CpuArchitecture.X86_64,
+    "ARM64": ecs.CpuArchitecture.ARM64
+}
+# Queue depth per running task; with no task running yet the whole queue is
+# the backlog of the first one.
+BACKLOG_PER_TASK = "IF(tasks > 0, visible / tasks, visible)"
+
 class EcsStack(Stack):
 
     def __init__(
@@ -34,6 +48,15 @@ class EcsStack(Stack):
         
         self.cluster = self._create_ecs_cluster()
         
+        self.queue = self._create_queue()
+
+        self.output_bucket = self._create_output_bucket()
+
+        # Completed request keys and in-progress claims, and shard leases with
+        # their offsets, each shared by every task.
+        self.dedupe_table = self._create_table("DedupeTable", "dedupe")
+        self.lease_table = self._create_table("LeaseTable", "leases")
+
         self.task_role = self._create_task_role()
         self.execution_role = self._create_execution_role()
         
@@ -42,6 +65,8 @@ class EcsStack(Stack):
         self.task_definition = self._create_task_definition()
         
         self.service = self._create_ecs_service()
+
+        self._create_autoscaling()
         
         self._create_outputs()
 
@@ -78,7 +103,8 @@ class EcsStack(Stack):
             "EcsCluster",
             vpc=self.vpc,
             cluster_name=f"{self.config['project_name']}-cluster-{self.environment_name}",
-            container_insights_v2=ecs.ContainerInsights.ENABLED
+            container_insights_v2=ecs.ContainerInsights.ENABLED,
+            enable_fargate_capacity_providers=True
         )
 
         for key, value in self.config["tags"].items():
@@ -86,8 +112,84 @@ class EcsStack(Stack):
 
         return cluster
 
+    def _create_queue(self) -> sqs.Queue:
+        sqs_config = self.config["sqs"]
+
+        dead_letter_queue = sqs.Queue(
+            self,
+            "WorkDeadLetterQueue",
+            queue_name=f"{self.config['project_name']}-queue-dlq-{self.environment_name}",
+            retention_period=cdk.Duration.days(14),
+            encryption=sqs.QueueEncryption.SQS_MANAGED
+        )
+
+        queue = sqs.Queue(
+            self,
+            "WorkQueue",
+            queue_name=f"{self.config['project_name']}-queue-{self.environment_name}",
+            visibility_timeout=cdk.Duration.seconds(sqs_config["visibility_timeout"]),
+            receive_message_wait_time=cdk.Duration.seconds(sqs_config["receive_wait_time"]),
+            retention_period=cdk.Duration.days(sqs_config["retention_days"]),
+            encryption=sqs.QueueEncryption.SQS_MANAGED,
+            dead_letter_queue=sqs.DeadLetterQueue(
+                queue=dead_letter_queue,
+                max_receive_count=sqs_config["max_receive_count"]
+            )
+        )
+
+        for resource in [queue, dead_letter_queue]:
+            for key, value in self.config["tags"].items():
+                Tags.of(resource).add(key, value)
+
+        return queue
+
+    def _create_output_bucket(self) -> s3.Bucket:
+        output_config = self.config["output"]
+
+        # Tasks reach it through the S3 gateway endpoint in VpcStack.
+        bucket = s3.Bucket(
+            self,
+            "OutputBucket",
+            bucket_name=f"{self.config['project_name']}-output-{self.environment_name}-{self.account}",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+            lifecycle_rules=[
+                s3.LifecycleRule(
+                    # Uploads left open by a task that died mid-batch.
+                    abort_incomplete_multipart_upload_after=cdk.Duration.days(1),
+                    expiration=cdk.Duration.days(output_config["retention_days"])
+                )
+            ],
+            removal_policy=RemovalPolicy.DESTROY if self.environment_name == "dev" else RemovalPolicy.RETAIN
+        )
+
+        for key, value in self.config["tags"].items():
+            Tags.of(bucket).add(key, value)
+
+        return bucket
+
+    def _create_table(self, construct_id: str, name: str) -> dynamodb.Table:
+        # Items expire through the table's TTL. Tasks reach it through the
+        # DynamoDB gateway endpoint in VpcStack.
+        table = dynamodb.Table(
+            self,
+            construct_id,
+            table_name=f"{self.config['project_name']}-{name}-{self.environment_name}",
+            partition_key=dynamodb.Attribute(name="pk", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            encryption=dynamodb.TableEncryption.AWS_MANAGED,
+            removal_policy=RemovalPolicy.DESTROY if self.environment_name == "dev" else RemovalPolicy.RETAIN
+        )
+
+        for key, value in self.config["tags"].items():
+            Tags.of(table).add(key, value)
+
+        return table
+
     def _create_task_role(self) -> iam.Role:
-        return iam.Role(
+        role = iam.Role(
             self,
             "EcsTaskRole",
             assumed_by=iam.ServicePrincipal("ecs-tasks.amazonaws.com"),
@@ -97,6 +199,59 @@ class EcsStack(Stack):
             ]
         )
 
+        role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "sqs:ReceiveMessage",
+                    "sqs:DeleteMessage",
+                    "sqs:ChangeMessageVisibility",
+                    "sqs:GetQueueAttributes"
+                ],
+                resources=[self.queue.queue_arn]
+            )
+        )
+
+        role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "s3:PutObject",
+                    "s3:AbortMultipartUpload"
+                ],
+                resources=[self.output_bucket.arn_for_objects(f"{self.config['output']['prefix']}/*")]
+            )
+        )
+
+        role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "dynamodb:GetItem",
+                    "dynamodb:PutItem",
+                    "dynamodb:DeleteItem",
+                    "dynamodb:BatchWriteItem"
+                ],
+                resources=[self.dedupe_table.table_arn]
+            )
+        )
+
+        role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "dynamodb:GetItem",
+                    "dynamodb:PutItem",
+                    "dynamodb:UpdateItem",
+                    "dynamodb:DeleteItem",
+                    "dynamodb:Scan"
+                ],
+                resources=[self.lease_table.table_arn]
+            )
+        )
+
+        return role
+
     def _create_execution_role(self) -> iam.Role:
         role = iam.Role(
             self,
@@ -140,6 +295,10 @@ class EcsStack(Stack):
             family=f"{self.config['project_name']}-task-{self.environment_name}",
             cpu=ecs_config["cpu"],
             memory_limit_mib=ecs_config["memory"],
+            runtime_platform=ecs.RuntimePlatform(
+                cpu_architecture=self._cpu_architecture(),
+                operating_system_family=ecs.OperatingSystemFamily.LINUX
+            ),
             task_role=self.task_role,
             execution_role=self.execution_role
         )
@@ -166,8 +325,36 @@ class EcsStack(Stack):
             environment={
                 "ENVIRONMENT": self.environment_name,
                 "PROJECT_NAME": self.config["project_name"],
-                "PYTHONUNBUFFERED": "1"
-            }
+                "PYTHONUNBUFFERED": "1",
+                "SHUTDOWN_TIMEOUT_SECONDS": str(ecs_config["shutdown_timeout"]),
+                "METRICS_NAMESPACE": ecs_config["metrics_namespace"],
+                "SQS_QUEUE_URL": self.queue.queue_url,
+                "SQS_VISIBILITY_TIMEOUT_SECONDS": str(self.config["sqs"]["visibility_timeout"]),
+                "SQS_WAIT_SECONDS": str(self.config["sqs"]["receive_wait_time"]),
+                "SQS_POLLERS": str(self.config["sqs"]["pollers"]),
+                # The reference caches get a fixed share of the task memory.
+                "CACHE_MEMORY_MIB": str(int(ecs_config["memory"] * self.config["cache"]["memory_fraction"])),
+                "CACHE_TTL_SECONDS": str(self.config["cache"]["ttl_seconds"]),
+                "CACHE_STALE_SECONDS": str(self.config["cache"]["stale_seconds"]),
+                "OUTPUT_BUCKET": self.output_bucket.bucket_name,
+                "OUTPUT_PREFIX": self.config["output"]["prefix"],
+                "OUTPUT_CODEC": self.config["output"]["codec"],
+                "OUTPUT_BATCH_MIB": str(self.config["output"]["batch_mib"]),
+                "OUTPUT_MAX_AGE_SECONDS": str(self.config["output"]["max_age_seconds"]),
+                "DEDUPE_STORE": self.config["dedupe"]["store"],
+                "DEDUPE_PATH": self.dedupe_table.table_name,
+                "DEDUPE_WINDOW_KEYS": str(self.config["dedupe"]["window_keys"]),
+                "DEDUPE_WINDOW_SECONDS": str(self.config["dedupe"]["window_seconds"]),
+                # The dedupe filter (and the in-memory store) get their own share.
+                "DEDUPE_MEMORY_MIB": str(int(ecs_config["memory"] * self.config["dedupe"]["memory_fraction"])),
+                "PARTITION_STORE": self.config["partition"]["store"],
+                "PARTITION_STORE_PATH": self.lease_table.table_name,
+                "PARTITION_LEASE_TTL_SECONDS": str(self.config["partition"]["lease_ttl_seconds"]),
+                # Profiles also land here, for retrieval through ECS Exec.
+                "PROFILE_DIR": "/tmp/profiles"
+            },
+            stop_timeout=cdk.Duration.seconds(ecs_config["stop_timeout"]),
+            health_check=self._create_health_check()
         )
         
         for key, value in self.config["tags"].items():
@@ -175,6 +362,17 @@ class EcsStack(Stack):
         
         return task_definition
 
+    def _create_health_check(self) -> ecs.HealthCheck:
+        health_config = self.config["ecs"]["health_check"]
+
+        return ecs.HealthCheck(
+            command=["CMD", "python3.12", "-m", "worker.health", "/healthz"],
+            interval=cdk.Duration.seconds(health_config["interval"]),
+            timeout=cdk.Duration.seconds(health_config["timeout"]),
+            retries=health_config["retries"],
+            start_period=cdk.Duration.seconds(health_config["start_period"])
+        )
+
     def _create_ecs_service(self) -> ecs.FargateService:
         ecs_config = self.config["ecs"]
         
@@ -194,21 +392,157 @@ class EcsStack(Stack):
             cluster=self.cluster,
             task_definition=self.task_definition,
             service_name=f"{self.config['project_name']}-service-{self.environment_name}",
-            desired_count=ecs_config["desired_count"],
+            # Left unset when autoscaling owns the task count, or every deploy
+            # would reset the running service to the configured number.
+            desired_count=None if "autoscaling" in ecs_config else ecs_config["desired_count"],
             max_healthy_percent=200,
             min_healthy_percent=50,
             vpc_subnets=ec2.SubnetSelection(subnets=private_subnets),
             security_groups=[self.security_group],
             assign_public_ip=False,
             platform_version=ecs.FargatePlatformVersion.LATEST,
+            capacity_provider_strategies=self._capacity_provider_strategies(),
             enable_execute_command=True
         )
+        # The strategy can only name providers already associated with the
+        # cluster, and that association is a resource of its own.
+        service.node.add_dependency(self.cluster)
         
         for key, value in self.config["tags"].items():
             Tags.of(service).add(key, value)
         
         return service
 
+    def _cpu_architecture(self) -> ecs.CpuArchitecture:
+        name = self.config["ecs"]["cpu_architecture"]
+        if name not in CPU_ARCHITECTURES:
+            raise ValueError(f"Unknown CPU architecture: {name}. Available: {list(CPU_ARCHITECTURES.keys())}")
+        return CPU_ARCHITECTURES[name]
+
+    def _capacity_provider_strategies(self) -> List[ecs.CapacityProviderStrategy]:
+        # Same rules ECS applies at deploy time, checked at synth instead.
+        strategies = self.config["ecs"]["capacity_providers"]
+        for strategy in strategies:
+            if strategy["capacity_provider"] not in CAPACITY_PROVIDERS:
+                raise ValueError(
+                    f"Unknown capacity provider: {strategy['capacity_provider']}. Available: {list(CAPACITY_PROVIDERS)}"
+                )
+            if strategy.get("base", 0) < 0 or strategy["weight"] < 0:
+                raise ValueError(f"Capacity provider base and weight must be >= 0: {strategy}")
+        if not strategies or not any(strategy["weight"] > 0 for strategy in strategies):
+            raise ValueError(f"At least one capacity provider needs a weight above 0 in {self.environment_name}")
+        if sum(1 for strategy in strategies if strategy.get("base", 0) > 0) > 1:
+            raise ValueError(f"Only one capacity provider can have a base in {self.environment_name}")
+        if self.config["ecs"]["cpu_architecture"] == "ARM64" and any(
+            strategy["capacity_provider"] == "FARGATE_SPOT" for strategy in strategies
+        ):
+            # Fargate Spot only places Linux/X86_64 tasks; ARM64 ones would never start.
+            raise ValueError(f"FARGATE_SPOT does not support ARM64 tasks in {self.environment_name}; use X86_64")
+
+        return [
+            ecs.CapacityProviderStrategy(
+                capacity_provider=strategy["capacity_provider"],
+                base=strategy.get("base", 0),
+                weight=strategy["weight"]
+            )
+            for strategy in strategies
+        ]
+
+    def _create_autoscaling(self) -> ecs.ScalableTaskCount:
+        scaling_config = self.config["ecs"]["autoscaling"]
+        period = cdk.Duration.minutes(1)
+
+        # Backlog per task: messages waiting in the work queue over the tasks
+        # running to take them. Anything a task has already pulled is bounded
+        # by its own concurrency, so only the queue shows real depth.
+        visible = self.queue.metric_approximate_number_of_messages_visible(statistic="Maximum", period=period)
+        running_tasks = cloudwatch.Metric(
+            namespace="ECS/ContainerInsights",
+            metric_name="RunningTaskCount",
+            dimensions_map={
+                "ClusterName": self.cluster.cluster_name,
+                "ServiceName": self.service.service_name
+            },
+            statistic="Average",
+            period=period
+        )
+        backlog_per_task = cloudwatch.MathExpression(
+            expression=BACKLOG_PER_TASK,
+            using_metrics={"visible": visible, "tasks": running_tasks},
+            label="BacklogPerTask",
+            period=period
+        )
+
+        scalable_target = self.service.auto_scale_task_count(
+            min_capacity=scaling_config["min_tasks"],
+            max_capacity=scaling_config["max_tasks"]
+        )
+
+        # The L2 target tracking policy only takes a single metric, so the
+        # metric math goes through the L1 resource.
+        appscaling.CfnScalingPolicy(
+            self,
+            "BacklogTargetTracking",
+            policy_name=f"{self.config['project_name']}-backlog-tracking-{self.environment_name}",
+            policy_type="TargetTrackingScaling",
+            scaling_target_id=scalable_target.node.find_child("Target").scalable_target_id,
+            target_tracking_scaling_policy_configuration=appscaling.CfnScalingPolicy.TargetTrackingScalingPolicyConfigurationProperty(
+                target_value=scaling_config["target_backlog_per_task"],
+                scale_in_cooldown=scaling_config["scale_in_cooldown"],
+                scale_out_cooldown=scaling_config["scale_out_cooldown"],
+                customized_metric_specification=appscaling.CfnScalingPolicy.CustomizedMetricSpecificationProperty(
+                    metrics=[
+                        self._metric_query("visible", visible),
+                        self._metric_query("tasks", running_tasks),
+                        appscaling.CfnScalingPolicy.TargetTrackingMetricDataQueryProperty(
+                            id="backlog_per_task",
+                            expression=BACKLOG_PER_TASK,
+                            label="BacklogPerTask",
+                            return_data=True
+                        )
+                    ]
+                )
+            )
+        )
+
+        burst_steps = scaling_config["burst_steps"]
+        scalable_target.scale_on_metric(
+            "BacklogBurstScaling",
+            metric=backlog_per_task,
+            scaling_steps=[
+                appscaling.ScalingInterval(upper=burst_steps[0]["lower"], change=0),
+                *[
+                    appscaling.ScalingInterval(lower=step["lower"], change=step["change"])
+                    for step in burst_steps
+                ]
+            ],
+            adjustment_type=appscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+            cooldown=cdk.Duration.seconds(scaling_config["burst_cooldown"])
+        )
+
+        return scalable_target
+
+    def _metric_query(
+        self,
+        query_id: str,
+        metric: cloudwatch.Metric
+    ) -> appscaling.CfnScalingPolicy.TargetTrackingMetricDataQueryProperty:
+        return appscaling.CfnScalingPolicy.TargetTrackingMetricDataQueryProperty(
+            id=query_id,
+            return_data=False,
+            metric_stat=appscaling.CfnScalingPolicy.TargetTrackingMetricStatProperty(
+                stat=metric.statistic,
+                metric=appscaling.CfnScalingPolicy.TargetTrackingMetricProperty(
+                    namespace=metric.namespace,
+                    metric_name=metric.metric_name,
+                    dimensions=[
+                        appscaling.CfnScalingPolicy.TargetTrackingMetricDimensionProperty(name=name, value=value)
+                        for name, value in metric.dimensions.items()
+                    ]
+                )
+            )
+        )
+
     def _create_outputs(self) -> None:
         CfnOutput(
             self,
@@ -250,6 +584,46 @@ class EcsStack(Stack):
             export_name=f"cdk-hcm-ecs-{self.environment_name}-task-definition-arn"
         )
 
+        CfnOutput(
+            self,
+            "QueueUrl",
+            value=self.queue.queue_url,
+            description=f"SQS work queue URL for {self.environment_name} environment",
+            export_name=f"cdk-hcm-ecs-{self.environment_name}-queue-url"
+        )
+
+        CfnOutput(
+            self,
+            "QueueArn",
+            value=self.queue.queue_arn,
+            description=f"SQS work queue ARN for {self.environment_name} environment",
+            export_name=f"cdk-hcm-ecs-{self.environment_name}-queue-arn"
+        )
+
+        CfnOutput(
+            self,
+            "OutputBucketName",
+            value=self.output_bucket.bucket_name,
+            description=f"S3 output bucket name for {self.environment_name} environment",
+            export_name=f"cdk-hcm-ecs-{self.environment_name}-output-bucket-name"
+        )
+
+        CfnOutput(
+            self,
+            "DedupeTableName",
+            value=self.dedupe_table.table_name,
+            description=f"DynamoDB dedupe table name for {self.environment_name} environment",
+            export_name=f"cdk-hcm-ecs-{self.environment_name}-dedupe-table-name"
+        )
+
+        CfnOutput(
+            self,
+            "LeaseTableName",
+            value=self.lease_table.table_name,
+            description=f"DynamoDB shard lease table name for {self.environment_name} environment",
+            export_name=f"cdk-hcm-ecs-{self.environment_name}-lease-table-name"
+        )
+
         CfnOutput(
             self,
             "LogGroupName",
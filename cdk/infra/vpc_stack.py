@@ -86,6 +86,14 @@ class VpcStack(Stack):
             subnets=[ec2.SubnetSelection(subnets=self.vpc.isolated_subnets)]
         )
         
+        dynamodb_endpoint = ec2.GatewayVpcEndpoint(
+            self,
+            "DynamoDbEndpoint",
+            vpc=self.vpc,
+            service=ec2.GatewayVpcEndpointAwsService.DYNAMODB,
+            subnets=[ec2.SubnetSelection(subnets=self.vpc.isolated_subnets)]
+        )
+        
         ecr_dkr_endpoint = ec2.InterfaceVpcEndpoint(
             self,
             "EcrDkrEndpoint",
@@ -116,7 +124,17 @@ class VpcStack(Stack):
             private_dns_enabled=True
         )
         
-        for endpoint in [s3_endpoint, ecr_dkr_endpoint, ecr_api_endpoint, logs_endpoint]:
+        sqs_endpoint = ec2.InterfaceVpcEndpoint(
+            self,
+            "SqsEndpoint",
+            vpc=self.vpc,
+            service=ec2.InterfaceVpcEndpointAwsService.SQS,
+            subnets=ec2.SubnetSelection(subnets=self.vpc.isolated_subnets),
+            security_groups=[vpc_endpoint_sg],
+            private_dns_enabled=True
+        )
+        
+        for endpoint in [s3_endpoint, dynamodb_endpoint, ecr_dkr_endpoint, ecr_api_endpoint, logs_endpoint, sqs_endpoint]:
             for key, value in self.config["tags"].items():
                 Tags.of(endpoint).add(key, value)
 
@@ -0,0 +1,216 @@
+import copy
+import json
+from typing import Any, Dict
+
+import aws_cdk as cdk
+import pytest
+from aws_cdk.assertions import Match, Template
+
+from config import get_environment_config
+from infra.ecs_stack import EcsStack
+
+def synth(environment: str, config: Dict[str, Any]) -> Template:
+    app = cdk.App()
+    stack = EcsStack(
+        app,
+        f"cdk-hcm-ecs-{environment}",
+        env=cdk.Environment(account="123456789012", region="ap-northeast-1"),
+        environment_name=environment,
+        config=config
+    )
+    return Template.from_stack(stack)
+
+@pytest.fixture(scope="module")
+def templates() -> Dict[str, Template]:
+    return {environment: synth(environment, get_environment_config(environment)) for environment in ("dev", "prod")}
+
+def test_service_uses_capacity_provider_strategy(templates: Dict[str, Template]) -> None:
+    templates["dev"].has_resource_properties("AWS::ECS::Service", {
+        "LaunchType": Match.absent(),
+        "CapacityProviderStrategy": [{"CapacityProvider": "FARGATE_SPOT", "Base": 0, "Weight": 1}]
+    })
+    templates["prod"].has_resource_properties("AWS::ECS::Service", {
+        "LaunchType": Match.absent(),
+        "CapacityProviderStrategy": [
+            {"CapacityProvider": "FARGATE", "Base": 1, "Weight": 1},
+            {"CapacityProvider": "FARGATE_SPOT", "Base": 0, "Weight": 3}
+        ]
+    })
+
+def test_cluster_enables_fargate_capacity_providers(templates: Dict[str, Template]) -> None:
+    for template in templates.values():
+        template.has_resource_properties("AWS::ECS::ClusterCapacityProviderAssociations", {
+            "CapacityProviders": Match.array_with(["FARGATE", "FARGATE_SPOT"])
+        })
+
+def test_spot_tasks_run_on_x86(templates: Dict[str, Template]) -> None:
+    for environment, template in templates.items():
+        strategies = get_environment_config(environment)["ecs"]["capacity_providers"]
+        if any(strategy["capacity_provider"] == "FARGATE_SPOT" for strategy in strategies):
+            template.has_resource_properties("AWS::ECS::TaskDefinition", {
+                "RuntimePlatform": {"CpuArchitecture": "X86_64", "OperatingSystemFamily": "LINUX"}
+            })
+
+def test_spot_with_arm64_is_rejected() -> None:
+    config = copy.deepcopy(get_environment_config("dev"))
+    config["ecs"]["cpu_architecture"] = "ARM64"
+    with pytest.raises(ValueError, match="FARGATE_SPOT does not support ARM64"):
+        synth("dev", config)
+
+def test_arm64_on_demand_only() -> None:
+    config = copy.deepcopy(get_environment_config("prod"))
+    config["ecs"]["cpu_architecture"] = "ARM64"
+    config["ecs"]["capacity_providers"] = [{"capacity_provider": "FARGATE", "base": 1, "weight": 1}]
+    synth("prod", config).has_resource_properties("AWS::ECS::TaskDefinition", {
+        "RuntimePlatform": {"CpuArchitecture": "ARM64"}
+    })
+
+@pytest.mark.parametrize("strategies", [
+    [],
+    [{"capacity_provider": "FARGATE", "base": 0, "weight": 0}],
+    [{"capacity_provider": "EC2", "base": 0, "weight": 1}],
+    [{"capacity_provider": "FARGATE", "base": -1, "weight": 1}],
+    [
+        {"capacity_provider": "FARGATE", "base": 1, "weight": 1},
+        {"capacity_provider": "FARGATE_SPOT", "base": 1, "weight": 1}
+    ]
+])
+def test_invalid_strategies_are_rejected(strategies: Any) -> None:
+    config = copy.deepcopy(get_environment_config("dev"))
+    config["ecs"]["capacity_providers"] = strategies
+    with pytest.raises(ValueError):
+        synth("dev", config)
+
+def test_autoscaling_owns_desired_count(templates: Dict[str, Template]) -> None:
+    for environment, template in templates.items():
+        scaling = get_environment_config(environment)["ecs"]["autoscaling"]
+        template.has_resource_properties("AWS::ECS::Service", {"DesiredCount": Match.absent()})
+        template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+            "ScalableDimension": "ecs:service:DesiredCount",
+            "MinCapacity": scaling["min_tasks"],
+            "MaxCapacity": scaling["max_tasks"]
+        })
+
+def test_target_tracking_on_queue_backlog_per_task(templates: Dict[str, Template]) -> None:
+    for environment, template in templates.items():
+        scaling = get_environment_config(environment)["ecs"]["autoscaling"]
+        template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+            "PolicyType": "TargetTrackingScaling",
+            "TargetTrackingScalingPolicyConfiguration": {
+                "TargetValue": scaling["target_backlog_per_task"],
+                "ScaleInCooldown": scaling["scale_in_cooldown"],
+                "ScaleOutCooldown": scaling["scale_out_cooldown"],
+                "CustomizedMetricSpecification": {
+                    "Metrics": [
+                        Match.object_like({
+                            "Id": "visible",
+                            "MetricStat": Match.object_like({
+                                "Metric": Match.object_like({
+                                    "Namespace": "AWS/SQS",
+                                    "MetricName": "ApproximateNumberOfMessagesVisible"
+                                })
+                            })
+                        }),
+                        Match.object_like({
+                            "Id": "tasks",
+                            "MetricStat": Match.object_like({
+                                "Metric": Match.object_like({
+                                    "Namespace": "ECS/ContainerInsights",
+                                    "MetricName": "RunningTaskCount"
+                                })
+                            })
+                        }),
+                        {
+                            "Id": "backlog_per_task",
+                            "Expression": "IF(tasks > 0, visible / tasks, visible)",
+                            "Label": "BacklogPerTask",
+                            "ReturnData": True
+                        }
+                    ]
+                }
+            }
+        })
+
+def test_burst_steps_scale_on_queue_backlog_per_task(templates: Dict[str, Template]) -> None:
+    for environment, template in templates.items():
+        scaling = get_environment_config(environment)["ecs"]["autoscaling"]
+        steps = scaling["burst_steps"]
+        template.has_resource_properties("AWS::CloudWatch::Alarm", {
+            "Threshold": steps[0]["lower"],
+            "ComparisonOperator": "GreaterThanOrEqualToThreshold",
+            "Metrics": Match.array_with([
+                Match.object_like({"Expression": "IF(tasks > 0, visible / tasks, visible)", "ReturnData": True})
+            ])
+        })
+        template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+            "PolicyType": "StepScaling",
+            "StepScalingPolicyConfiguration": Match.object_like({
+                "AdjustmentType": "ChangeInCapacity",
+                "Cooldown": scaling["burst_cooldown"],
+                "StepAdjustments": [
+                    Match.object_like({
+                        "MetricIntervalLowerBound": step["lower"] - steps[0]["lower"],
+                        "ScalingAdjustment": step["change"]
+                    })
+                    for step in steps
+                ]
+            })
+        })
+
+def test_scaling_does_not_use_the_app_backlog_gauge(templates: Dict[str, Template]) -> None:
+    # The app's Backlog gauge is capped by its concurrency and never shows queue depth.
+    for environment, template in templates.items():
+        namespace = get_environment_config(environment)["ecs"]["metrics_namespace"]
+        for resource_type in ("AWS::CloudWatch::Alarm", "AWS::ApplicationAutoScaling::ScalingPolicy"):
+            assert namespace not in json.dumps(template.find_resources(resource_type))
+
+def _shared_table(template: Template, environment: str, name: str) -> str:
+    [table_id] = template.find_resources("AWS::DynamoDB::Table", {
+        "Properties": {
+            "TableName": f"cdk-hcm-poc-{name}-{environment}",
+            "KeySchema": [{"AttributeName": "pk", "KeyType": "HASH"}],
+            "BillingMode": "PAY_PER_REQUEST",
+            "TimeToLiveSpecification": {"AttributeName": "expires_at", "Enabled": True}
+        }
+    })
+    return table_id
+
+def test_dedupe_table_is_shared_by_all_tasks(templates: Dict[str, Template]) -> None:
+    for environment, template in templates.items():
+        table_id = _shared_table(template, environment, "dedupe")
+        template.has_resource_properties("AWS::ECS::TaskDefinition", {
+            "ContainerDefinitions": [Match.object_like({
+                "Environment": Match.array_with([
+                    {"Name": "DEDUPE_STORE", "Value": "dynamodb"},
+                    {"Name": "DEDUPE_PATH", "Value": {"Ref": table_id}}
+                ])
+            })]
+        })
+        template.has_resource_properties("AWS::IAM::Policy", {
+            "PolicyDocument": {
+                "Statement": Match.array_with([Match.object_like({
+                    "Action": Match.array_with(["dynamodb:PutItem", "dynamodb:DeleteItem"]),
+                    "Resource": {"Fn::GetAtt": [table_id, "Arn"]}
+                })])
+            }
+        })
+
+def test_lease_table_is_shared_by_all_tasks(templates: Dict[str, Template]) -> None:
+    for environment, template in templates.items():
+        table_id = _shared_table(template, environment, "leases")
+        template.has_resource_properties("AWS::ECS::TaskDefinition", {
+            "ContainerDefinitions": [Match.object_like({
+                "Environment": Match.array_with([
+                    {"Name": "PARTITION_STORE", "Value": "dynamodb"},
+                    {"Name": "PARTITION_STORE_PATH", "Value": {"Ref": table_id}}
+                ])
+            })]
+        })
+        template.has_resource_properties("AWS::IAM::Policy", {
+            "PolicyDocument": {
+                "Statement": Match.array_with([Match.object_like({
+                    "Action": Match.array_with(["dynamodb:UpdateItem", "dynamodb:DeleteItem", "dynamodb:Scan"]),
+                    "Resource": {"Fn::GetAtt": [table_id, "Arn"]}
+                })])
+            }
+        })
@@ -0,0 +1,19 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker import logwriter
+
+@pytest.fixture(autouse=True)
+def log_output(monkeypatch):
+    # The writer flushes from its own thread, often after pytest has put the
+    # real stdout back; each test gets its own writer on a buffer instead.
+    stream = io.StringIO()
+    writer = logwriter.LogWriter(stream=stream)
+    monkeypatch.setattr(logwriter, "_writer", writer)
+    yield stream
+    writer.close()
@@ -0,0 +1,42 @@
+import os
+
+from worker.checkpoint import CheckpointStore, FileCheckpointBackend, MemoryCheckpointBackend
+
+def test_torn_tail_is_truncated_before_new_appends(tmp_path) -> None:
+    store = CheckpointStore(FileCheckpointBackend(str(tmp_path)))
+    store.recover()
+    store.incr("processed")
+    store.close()
+
+    # A crash mid-append: half a batch and no trailing newline.
+    with open(os.path.join(str(tmp_path), "log.0"), "ab") as f:
+        f.write(b'[["incr","processed",1')
+
+    store = CheckpointStore(FileCheckpointBackend(str(tmp_path)))
+    store.recover()
+    assert store.counters["processed"] == 1
+    for _ in range(5):
+        store.incr("processed")
+        store.flush()
+    store.close()
+
+    store = CheckpointStore(FileCheckpointBackend(str(tmp_path)))
+    store.recover()
+    assert store.counters["processed"] == 6
+    assert store.recovered_entries == 6
+
+def test_memory_backend_truncates_torn_tail() -> None:
+    backend = MemoryCheckpointBackend()
+    store = CheckpointStore(backend)
+    store.set_cursor("offset", 10)
+    store.flush()
+    backend.append(0, b'[["cursor","offset",2')
+
+    store = CheckpointStore(backend)
+    store.recover()
+    store.set_cursor("offset", 20)
+    store.flush()
+
+    store = CheckpointStore(backend)
+    store.recover()
+    assert store.cursors["offset"] == 20
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from worker.dedupe import DedupeIndex, DynamoDedupeStore, GenerationalBloomFilter
+from worker.dynamodb import DynamoClient
+from worker.dynamodb_local import LocalDynamoServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KEYS = ["req-1", "req-2", "a much longer request key than the others"]
+POSITIONS = (
+    "import json\n"
+    "from worker.dedupe import GenerationalBloomFilter\n"
+    "bloom = GenerationalBloomFilter(1000, 60.0)\n"
+    f"print(json.dumps([bloom._positions(key) for key in {KEYS!r}]))\n"
+)
+
+def test_bloom_positions_do_not_depend_on_the_hash_seed() -> None:
+    expected = [GenerationalBloomFilter(1000, 60.0)._positions(key) for key in KEYS]
+    for seed in ("1", "2"):
+        output = subprocess.run(
+            [sys.executable, "-c", POSITIONS],
+            env={**os.environ, "PYTHONHASHSEED": seed, "PYTHONPATH": ROOT},
+            capture_output=True,
+            check=True
+        ).stdout
+        assert json.loads(output) == expected
+
+def test_dynamodb_store_dedupes_across_tasks(monkeypatch) -> None:
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "local")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "local")
+    server = LocalDynamoServer().start()
+    now = [1000.0]
+
+    def task_index() -> DedupeIndex:
+        client = DynamoClient("us-east-1", endpoint_url=server.endpoint_url)
+        store = DynamoDedupeStore("dedupe", window_seconds=60, claim_seconds=10, client=client)
+        return DedupeIndex(store, GenerationalBloomFilter(1000, 60.0), window_seconds=60, clock=lambda: now[0])
+
+    async def scenario() -> None:
+        first, second = task_index(), task_index()
+        try:
+            assert await first.claim("req-1")
+            # Still being processed on the first task.
+            assert not await second.claim("req-1")
+
+            # Failed there: released, so the redelivery goes through elsewhere.
+            first.release("req-1")
+            for _ in range(100):
+                if await second.claim("req-1"):
+                    break
+                await asyncio.sleep(0.01)
+            else:
+                raise AssertionError("the claim was never released")
+            second.complete("req-1")
+            await second.flush()
+            assert not await first.claim("req-1")
+
+            # A claim left by a task that died lapses on its own.
+            assert await first.claim("req-2")
+            now[0] += 11
+            assert await second.claim("req-2")
+
+            # Completed keys are remembered for the window only.
+            assert not await first.claim("req-1")
+            now[0] += 60
+            assert await first.claim("req-1")
+        finally:
+            await first.close()
+            await second.close()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        server.close()
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from worker.http_client import HostPool, HttpClient, HttpError
+
+async def _start_server(received: list) -> asyncio.AbstractServer:
+    # Answers the first request on each connection; takes in the second and
+    # drops the connection without a response, as a server restarting might.
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        served = 0
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError:
+                break
+            length = 0
+            for line in head.decode("latin-1").split("\r\n"):
+                name, _, value = line.partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            received.append(head.split(b" ", 1)[0].decode())
+            served += 1
+            if served > 1:
+                break
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(serve, "127.0.0.1", 0)
+
+@pytest.mark.parametrize("method, replayed", [("GET", True), ("POST", False)])
+def test_reused_connection_replays_only_idempotent_requests(method: str, replayed: bool) -> None:
+    async def scenario() -> list:
+        received: list = []
+        server = await _start_server(received)
+        port = server.sockets[0].getsockname()[1]
+        client = HttpClient(backoff_base=0)
+        url = f"http://127.0.0.1:{port}/jobs"
+        try:
+            assert (await client.request(method, url, body=b"{}")).status == 200
+            if replayed:
+                assert (await client.request(method, url, body=b"{}")).status == 200
+            else:
+                with pytest.raises(HttpError):
+                    await client.request(method, url, body=b"{}")
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+        return received
+
+    # The second request reached the server before the connection dropped.
+    assert asyncio.run(scenario()) == [method] * (3 if replayed else 2)
+
+async def _start_scripted_server(responses: list, received: list) -> asyncio.AbstractServer:
+    # Answers requests in order from responses, one per connection.
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.readuntil(b"\r\n\r\n")
+        received.append(asyncio.get_running_loop().time())
+        status, headers = responses[min(len(received), len(responses)) - 1]
+        lines = [f"HTTP/1.1 {status} X", "Content-Length: 0", "Connection: close", *headers]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(serve, "127.0.0.1", 0)
+
+@pytest.mark.parametrize("retry_after, attempts", [("1", 2), ("60", 1)])
+def test_retry_after_is_honoured_up_to_its_own_cap(retry_after: str, attempts: int) -> None:
+    async def scenario() -> tuple:
+        received: list = []
+        server = await _start_scripted_server([(503, [f"Retry-After: {retry_after}"]), (200, [])], received)
+        port = server.sockets[0].getsockname()[1]
+        client = HttpClient(backoff_max=0.01, retry_after_max=30, keep_alive=False)
+        try:
+            response = await client.request("GET", f"http://127.0.0.1:{port}/")
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+        return response.status, received
+
+    status, received = asyncio.run(scenario())
+    assert len(received) == attempts
+    if attempts == 2:
+        # Waited what the server asked, not backoff_max.
+        assert status == 200
+        assert received[1] - received[0] >= 0.9
+    else:
+        # Too long to wait: the 503 goes straight back to the caller.
+        assert status == 503
+
+def test_half_open_trial_is_released_when_it_raises_unexpectedly(monkeypatch) -> None:
+    async def scenario() -> None:
+        received: list = []
+        server = await _start_scripted_server([(200, [])], received)
+        port = server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}/"
+        client = HttpClient(retries=0, breaker_failures=1, breaker_reset=0, keep_alive=False)
+        breaker = client.breaker(f"127.0.0.1:{port}")
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        async def broken(self, request: bytes, method: str, replay: bool) -> None:
+            raise RuntimeError("unexpected")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(HostPool, "exchange", broken)
+            with pytest.raises(RuntimeError):
+                await client.request("GET", url)
+
+        try:
+            # The next call is let through as a new trial and closes the circuit.
+            assert (await client.request("GET", url)).status == 200
+            assert breaker.state == "closed"
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+from typing import Any, List
+
+from worker.filewatch import FileWatcher
+from worker.ingest import OffsetStore, OffsetTracker, follow_jsonl, ingest_jsonl
+from worker.polling import AdaptivePoller
+from worker.scheduler import TaskScheduler
+
+def _append(path, *records: Any) -> None:
+    with open(path, "a") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+
+async def _wait_for(condition, timeout: float) -> float:
+    started = time.monotonic()
+    while not condition():
+        assert time.monotonic() - started < timeout
+        await asyncio.sleep(0.01)
+    return time.monotonic() - started
+
+def test_follow_wakes_on_append_before_the_idle_ceiling(tmp_path) -> None:
+    path = tmp_path / "requests.jsonl"
+    path.touch()
+
+    async def scenario() -> float:
+        if FileWatcher.create(str(path)) is None:
+            return 0.0
+        scheduler = TaskScheduler()
+        handled: List[Any] = []
+
+        async def handler(record: Any) -> None:
+            handled.append(record)
+
+        poller = AdaptivePoller(min_interval=0.05, max_interval=30)
+        store = OffsetStore(str(tmp_path / "offset"))
+        follow = asyncio.create_task(follow_jsonl(str(path), scheduler, handler, store, poller))
+        await _wait_for(lambda: poller.idle_wakeups >= 3, timeout=5)
+
+        _append(path, {"id": 1})
+        waited = await _wait_for(lambda: handled, timeout=5)
+        scheduler.stop()
+        await follow
+        return waited
+
+    assert asyncio.run(scenario()) < 5
+
+def test_follow_keeps_reading_while_output_is_unwritten(tmp_path) -> None:
+    path = tmp_path / "requests.jsonl"
+    store = OffsetStore(str(tmp_path / "offset"))
+    _append(path, {"id": 1})
+
+    async def scenario() -> None:
+        scheduler = TaskScheduler()
+        written: List[asyncio.Future] = []
+
+        async def handler(record: Any) -> asyncio.Future:
+            written.append(asyncio.get_running_loop().create_future())
+            return written[-1]
+
+        poller = AdaptivePoller(min_interval=0.05, max_interval=0.1)
+        follow = asyncio.create_task(follow_jsonl(str(path), scheduler, handler, store, poller, watch=False))
+        await _wait_for(lambda: len(written) == 1, timeout=5)
+
+        # Nothing is written yet, but the next append is still picked up.
+        _append(path, {"id": 2})
+        await _wait_for(lambda: len(written) == 2, timeout=5)
+        assert store.load() == 0
+
+        written[0].set_result(None)
+        await _wait_for(lambda: store.load() == len(json.dumps({"id": 1})) + 1, timeout=5)
+
+        scheduler.stop()
+        written[1].set_result(None)
+        await follow
+
+    asyncio.run(scenario())
+    assert store.load() == path.stat().st_size
+
+def test_failed_record_holds_back_the_saved_offset(tmp_path) -> None:
+    path = tmp_path / "requests.jsonl"
+    store = OffsetStore(str(tmp_path / "offset"))
+    _append(path, *({"id": n} for n in range(1, 6)))
+    before_failure = len(json.dumps({"id": 1})) + 1
+
+    async def scenario(fail: int) -> List[int]:
+        scheduler = TaskScheduler()
+        handled: List[int] = []
+
+        async def handler(record: Any) -> None:
+            if record["id"] == fail:
+                raise ValueError("backend rejected it")
+            handled.append(record["id"])
+
+        tracker = OffsetTracker(store.load())
+        await ingest_jsonl(str(path), scheduler, handler, store, commit_every=2, tracker=tracker)
+        # Finished records behind the failed one are not kept one by one.
+        assert tracker.pending <= 2
+        return sorted(handled)
+
+    assert asyncio.run(scenario(fail=2)) == [1, 3, 4, 5]
+    assert store.load() == before_failure
+    # The next run reads the failed record again.
+    assert asyncio.run(scenario(fail=0)) == [2, 3, 4, 5]
+    assert store.load() == path.stat().st_size
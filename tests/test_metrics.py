@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from worker.logwriter import LogWriter
+from worker.metrics import MAX_VALUES_PER_METRIC, MetricsRegistry
+
+DIMENSIONS = {"Service": "hcm-worker", "Environment": "dev"}
+
+def _flush_to_stdout(registry: MetricsRegistry, writer: LogWriter, capsys) -> list:
+    registry.flush()
+    writer.close()
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+def test_flush_writes_an_emf_document_to_stdout(capsys) -> None:
+    writer = LogWriter()
+    registry = MetricsRegistry("HCM/Test", DIMENSIONS, writer)
+    registry.counter("RequestsProcessed").inc(3)
+    registry.gauge("QueueBacklog").set(12)
+    latency = registry.histogram("RequestLatency")
+    for seconds in (0.001, 0.002, 0.002, 0.002, 0.5):
+        latency.record(seconds)
+
+    [document] = _flush_to_stdout(registry, writer, capsys)
+
+    [directive] = document["_aws"]["CloudWatchMetrics"]
+    assert directive["Namespace"] == "HCM/Test"
+    assert directive["Dimensions"] == [["Service", "Environment"]]
+    assert directive["Metrics"] == [
+        {"Name": "RequestsProcessed", "Unit": "Count"},
+        {"Name": "QueueBacklog", "Unit": "None"},
+        {"Name": "RequestLatency", "Unit": "Milliseconds"}
+    ]
+    assert isinstance(document["_aws"]["Timestamp"], int)
+    assert document["Service"] == "hcm-worker" and document["Environment"] == "dev"
+    assert document["RequestsProcessed"] == 3
+    assert document["QueueBacklog"] == 12
+
+    histogram = document["RequestLatency"]
+    assert histogram["Counts"] == [1, 3, 1]
+    for value, expected in zip(histogram["Values"], (1.0, 2.0, 500.0)):
+        assert value == pytest.approx(expected, rel=1 / 32)
+
+def test_histogram_is_merged_to_the_emf_value_limit(capsys) -> None:
+    writer = LogWriter()
+    registry = MetricsRegistry("HCM/Test", DIMENSIONS, writer)
+    latency = registry.histogram("RequestLatency")
+    for micros in range(1, 5000, 7):
+        latency.record(micros / 1_000_000)
+
+    [document] = _flush_to_stdout(registry, writer, capsys)
+
+    histogram = document["RequestLatency"]
+    assert len(histogram["Values"]) <= MAX_VALUES_PER_METRIC
+    assert sum(histogram["Counts"]) == len(range(1, 5000, 7))
+    assert histogram["Values"] == sorted(histogram["Values"])
@@ -0,0 +1,69 @@
+import asyncio
+import os
+
+import pytest
+
+from worker.ingest import OffsetStore, ingest_jsonl
+from worker.output import LocalDirectoryBackend, OutputBatchFailed, OutputSink
+from worker.scheduler import TaskScheduler
+
+class _FailingBackend(LocalDirectoryBackend):
+
+    def start(self, key: str):
+        raise OSError("disk full")
+
+def test_write_resolves_once_its_batch_is_complete(tmp_path) -> None:
+    async def scenario() -> None:
+        sink = OutputSink(LocalDirectoryBackend(str(tmp_path)), codec="none")
+        durable = [await sink.write({"request_id": i}) for i in range(3)]
+        assert len(set(map(id, durable))) == 1
+        await asyncio.sleep(0)
+        assert not durable[0].done()
+
+        await sink.close()
+        assert durable[0].done() and durable[0].exception() is None
+        assert sink.records == 3
+
+    asyncio.run(scenario())
+
+def test_failed_batch_fails_its_records_not_the_writer(tmp_path) -> None:
+    async def scenario() -> None:
+        sink = OutputSink(_FailingBackend(str(tmp_path)), codec="none", buffer_bytes=64)
+        first = await sink.write({"payload": "x" * 100})
+        # The next write flushes the full buffer, which fails; it must not raise.
+        second = await sink.write({"payload": "y"})
+        assert isinstance(first.exception(), OutputBatchFailed)
+        assert second is not first and not second.done()
+
+        await sink.close()
+        assert isinstance(second.exception(), OutputBatchFailed)
+        assert sink.records == 0
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("written", [True, False])
+def test_ingest_commits_offset_only_once_output_is_written(tmp_path, written: bool) -> None:
+    path = tmp_path / "requests.jsonl"
+    path.write_text("".join(f'{{"request_id": {i}}}\n' for i in range(5)))
+    offset_store = OffsetStore(str(tmp_path / "offset"))
+
+    async def scenario() -> None:
+        scheduler = TaskScheduler(max_concurrency=2)
+        durable = asyncio.get_running_loop().create_future()
+
+        async def handler(record) -> asyncio.Future:
+            return durable
+
+        ingestion = asyncio.create_task(ingest_jsonl(str(path), scheduler, handler, offset_store))
+        await asyncio.sleep(0.1)
+        assert not ingestion.done()
+        assert offset_store.load() == 0
+
+        if written:
+            durable.set_result(None)
+        else:
+            durable.set_exception(OutputBatchFailed("lost"))
+        await ingestion
+
+    asyncio.run(scenario())
+    assert offset_store.load() == (os.path.getsize(path) if written else 0)
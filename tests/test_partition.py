@@ -0,0 +1,137 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+from worker.dynamodb_local import LocalDynamoServer
+from worker.partition import create_lease_store, rendezvous_owner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARDS = 8
+LEASE_TTL = 2.0
+OWNERS = ["task-a", "task-b", "task-c"]
+
+# One worker process: follows no files, only records when each of its shard
+# runners starts and stops.
+MEMBER = f"""
+import asyncio, json, signal, sys, time
+from worker.partition import ShardCoordinator, create_lease_store
+from worker.scheduler import TaskScheduler
+
+store_name, location, owner, events = sys.argv[1:]
+
+def record(shard, event):
+    with open(events, "a") as f:
+        f.write(json.dumps({{"owner": owner, "shard": shard, "event": event, "at": time.time()}}) + "\\n")
+
+async def main():
+    scheduler = TaskScheduler()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, scheduler.stop)
+
+    async def run_shard(shard, stop):
+        record(shard, "start")
+        await stop.wait()
+        record(shard, "stop")
+
+    store = create_lease_store(store_name, location)
+    await ShardCoordinator(store, scheduler, run_shard, {SHARDS}, owner=owner, lease_ttl={LEASE_TTL}).run()
+
+asyncio.run(main())
+"""
+
+def _wait_balanced(store: Any, members: List[str], timeout: float = 30) -> Dict[int, str]:
+    # Every shard leased, unexpired, to the member rendezvous hashing picks.
+    deadline = time.monotonic() + timeout
+    while True:
+        now = time.time()
+        leases = store.leases()
+        owners = {shard: owner for shard, (owner, expires) in leases.items() if owner and expires > now}
+        if owners == {shard: rendezvous_owner(shard, members) for shard in range(SHARDS)}:
+            return owners
+        assert time.monotonic() < deadline, f"shards never settled on {members}: {leases}"
+        time.sleep(0.1)
+
+def _runs(events: str, killed: str, killed_at: float) -> Dict[int, List[List[Any]]]:
+    # [owner, start, stop] per shard; the killed member's runners never
+    # recorded their stop, so they end when it was killed.
+    runs: Dict[int, List[List[Any]]] = {}
+    with open(events) as f:
+        for line in f:
+            event = json.loads(line)
+            shard_runs = runs.setdefault(event["shard"], [])
+            if event["event"] == "start":
+                shard_runs.append([event["owner"], event["at"], None])
+            else:
+                [run] = [run for run in shard_runs if run[0] == event["owner"] and run[2] is None]
+                run[2] = event["at"]
+    for shard_runs in runs.values():
+        for run in shard_runs:
+            if run[2] is None:
+                assert run[0] == killed
+                run[2] = killed_at
+    return runs
+
+@pytest.fixture(params=["sqlite", "dynamodb"])
+def lease_store(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        # Processes on one host sharing the file.
+        yield "sqlite", str(tmp_path / "leases.db")
+        return
+
+    server = LocalDynamoServer().start()
+    monkeypatch.setenv("AWS_ENDPOINT_URL_DYNAMODB", server.endpoint_url)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "local")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "local")
+    try:
+        yield "dynamodb", "leases"
+    finally:
+        server.close()
+
+def test_each_shard_has_one_owner_and_moves_when_its_lease_expires(lease_store, tmp_path) -> None:
+    store_name, location = lease_store
+    events = str(tmp_path / "events.jsonl")
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    members = {
+        owner: subprocess.Popen(
+            [sys.executable, "-c", MEMBER, store_name, location, owner, events],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        for owner in OWNERS
+    }
+    store = create_lease_store(store_name, location)
+    try:
+        _wait_balanced(store, OWNERS)
+
+        # Killed outright: its leases are not released and have to run out.
+        victim = rendezvous_owner(0, OWNERS)
+        members[victim].kill()
+        members[victim].wait()
+        killed_at = time.time()
+        survivors = [owner for owner in OWNERS if owner != victim]
+        _wait_balanced(store, survivors)
+    finally:
+        for process in members.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in members.values():
+            process.wait(timeout=30)
+        store.close()
+
+    runs = _runs(events, victim, killed_at)
+    assert set(runs) == set(range(SHARDS))
+    for shard, shard_runs in runs.items():
+        shard_runs.sort(key=lambda run: run[1])
+        for previous, run in zip(shard_runs, shard_runs[1:]):
+            assert run[1] >= previous[2], f"shard {shard} ran on {previous[0]} and {run[0]} at once"
+
+    moved = [shard for shard in range(SHARDS) if rendezvous_owner(shard, OWNERS) == victim]
+    assert moved
+    for shard in moved:
+        taken_over = [run for run in runs[shard] if run[1] > killed_at]
+        assert taken_over and taken_over[0][0] in survivors
@@ -0,0 +1,44 @@
+import random
+from typing import List
+
+from worker.polling import BACKING_OFF, DRAINING, IDLE, AdaptivePoller, simulate
+
+SIMULATED_SECONDS = 2 * 3600
+FIXED_INTERVAL = 10.0
+
+def _bursty_arrivals(duration: float, seed: int = 7) -> List[float]:
+    # Bursts of 1 to 500 items, a few minutes apart on average.
+    rng = random.Random(seed)
+    arrivals: List[float] = []
+    now = 0.0
+    while True:
+        now += rng.expovariate(1 / 300)
+        if now >= duration:
+            break
+        size = rng.choice((1, 5, 50, 500))
+        arrivals.extend(now + rng.uniform(0, 30) * (size > 1) for _ in range(size))
+    return sorted(arrivals)
+
+def test_poller_modes() -> None:
+    poller = AdaptivePoller(min_interval=2, max_interval=30, factor=4)
+    assert poller.record(10, more=True) == 0 and poller.mode == DRAINING
+    assert poller.record(3) == 2 and poller.mode == BACKING_OFF
+    assert poller.record(0) == 8
+    assert poller.record(0) == 30 and poller.mode == IDLE
+    assert poller.record(0) == 30
+
+def test_adaptive_polling_wakes_less_than_fixed_loop() -> None:
+    arrivals = _bursty_arrivals(SIMULATED_SECONDS)
+    fixed = simulate(arrivals, lambda found: FIXED_INTERVAL, SIMULATED_SECONDS)
+    polled = simulate(arrivals, AdaptivePoller().record, SIMULATED_SECONDS)
+    poller = AdaptivePoller()
+    watched = simulate(arrivals, poller.record, SIMULATED_SECONDS, wake_after=poller.min_interval)
+
+    for adaptive in (polled, watched):
+        assert adaptive["items"] == fixed["items"] == len(arrivals)
+        assert adaptive["wakeups_per_hour"] < fixed["wakeups_per_hour"]
+        assert adaptive["idle_wakeups_per_hour"] < fixed["idle_wakeups_per_hour"]
+    # Woken by the watcher, the long idle ceiling costs no latency.
+    assert watched["latency_mean_s"] < fixed["latency_mean_s"] / 2
+    assert watched["latency_p99_s"] < fixed["latency_p99_s"]
+    assert watched["latency_max_s"] < fixed["latency_max_s"]
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from worker.scheduler import TaskScheduler
+from worker.ticker import CATCH_UP, SKIP
+
+async def _saturate(scheduler: TaskScheduler, release: asyncio.Event) -> asyncio.Task:
+    for _ in range(scheduler.max_concurrency):
+        await scheduler.submit(release.wait, name="intake")
+    # One more caller blocked waiting for a slot, as the intake loop would be.
+    return asyncio.create_task(scheduler.submit(release.wait, name="intake"))
+
+def test_periodic_jobs_tick_while_intake_is_saturated() -> None:
+    async def scenario() -> int:
+        scheduler = TaskScheduler(max_concurrency=2)
+        release = asyncio.Event()
+        blocked = await _saturate(scheduler, release)
+        ticks = 0
+
+        async def heartbeat() -> None:
+            nonlocal ticks
+            ticks += 1
+
+        scheduler.add_periodic("heartbeat", heartbeat, interval=0.05)
+        await asyncio.sleep(0.5)
+        assert not blocked.done()
+
+        release.set()
+        await blocked
+        scheduler.stop()
+        await scheduler.drain(timeout=1)
+        return ticks
+
+    assert asyncio.run(scenario()) >= 5
+
+def test_periodic_jobs_tick_while_intake_is_paused() -> None:
+    async def scenario() -> int:
+        scheduler = TaskScheduler(max_concurrency=2)
+        scheduler.set_limit(0)
+        ticks = 0
+
+        async def heartbeat() -> None:
+            nonlocal ticks
+            ticks += 1
+
+        scheduler.add_periodic("heartbeat", heartbeat, interval=0.05)
+        await asyncio.sleep(0.5)
+        scheduler.stop()
+        await scheduler.drain(timeout=1)
+        return ticks
+
+    assert asyncio.run(scenario()) >= 5
+
+def test_throttled_jobs_stay_within_max_concurrency() -> None:
+    async def scenario() -> int:
+        scheduler = TaskScheduler(max_concurrency=3)
+        running = peak = 0
+
+        async def job() -> None:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        tasks = [await scheduler.submit(job) for _ in range(20)]
+        await asyncio.gather(*tasks)
+        return peak
+
+    assert asyncio.run(scenario()) == 3
+
+@pytest.mark.parametrize("policy", [SKIP, CATCH_UP])
+def test_periodic_job_slower_than_its_interval_never_overlaps(policy: str) -> None:
+    async def scenario() -> tuple:
+        scheduler = TaskScheduler(max_concurrency=2)
+        running = peak = runs = 0
+
+        async def slow() -> None:
+            nonlocal running, peak, runs
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.15)
+            running -= 1
+            runs += 1
+
+        ticker = scheduler.add_periodic("slow", slow, interval=0.05, policy=policy)
+        await asyncio.sleep(0.7)
+        scheduler.stop()
+        await scheduler.drain(timeout=1)
+        return peak, runs, ticker.skipped
+
+    peak, runs, skipped = asyncio.run(scenario())
+    assert peak == 1
+    assert 3 <= runs <= 5
+    assert (skipped > 0) == (policy == SKIP)
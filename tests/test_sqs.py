@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+from worker.scheduler import TaskScheduler
+from worker.sqs import QueueConsumer, SqsClient
+from worker.sqs_local import LocalSqsServer
+
+def test_consumer_keeps_polling_after_a_batch(monkeypatch) -> None:
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "local")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "local")
+    server = LocalSqsServer().start()
+    client = SqsClient(server.queue_url(""), "us-east-1")
+    queue_url = server.queue_url("batches")
+    handled = []
+
+    async def consume() -> QueueConsumer:
+        scheduler = TaskScheduler(max_concurrency=10)
+
+        async def handler(record: dict) -> None:
+            handled.append(record["n"])
+            if len(handled) == 3:
+                # The second batch only arrives once the first one is done.
+                await asyncio.to_thread(client.send_message_batch, queue_url, [json.dumps({"n": n}) for n in range(3, 6)])
+            if len(handled) == 6:
+                scheduler.stop()
+
+        consumer = QueueConsumer(client, queue_url, scheduler, handler, wait_seconds=1)
+        await asyncio.wait_for(consumer.run(), timeout=15)
+        return consumer
+
+    try:
+        client.send_message_batch(queue_url, [json.dumps({"n": n}) for n in range(3)])
+        consumer = asyncio.run(consume())
+    finally:
+        client.close()
+        server.close()
+
+    assert sorted(handled) == list(range(6))
+    assert consumer.polls >= 2
+    assert consumer.deleted == 6
+
+def test_consumer_deletes_only_once_output_is_written(monkeypatch) -> None:
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "local")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "local")
+    server = LocalSqsServer().start()
+    client = SqsClient(server.queue_url(""), "us-east-1")
+    queue_url = server.queue_url("deferred")
+
+    async def consume(written: bool) -> QueueConsumer:
+        scheduler = TaskScheduler(max_concurrency=10)
+        durable = asyncio.get_running_loop().create_future()
+        handled = 0
+
+        async def handler(record: dict) -> asyncio.Future:
+            nonlocal handled
+            handled += 1
+            if handled == 3:
+                scheduler.stop()
+            return durable
+
+        consumer = QueueConsumer(client, queue_url, scheduler, handler, wait_seconds=1, visibility_timeout=2, delete_interval=0.05)
+        run = asyncio.create_task(consumer.run())
+        while handled < 3:
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.3)
+        assert not run.done()
+        assert consumer.deleted == 0
+
+        if written:
+            durable.set_result(None)
+        else:
+            durable.set_exception(RuntimeError("lost"))
+        await asyncio.wait_for(run, timeout=15)
+        return consumer
+
+    try:
+        client.send_message_batch(queue_url, [json.dumps({"n": n}) for n in range(3)])
+        consumer = asyncio.run(consume(written=False))
+        assert (consumer.deleted, consumer.failed) == (0, 3)
+
+        # Left alone, the messages reappear after the visibility timeout.
+        consumer = asyncio.run(consume(written=True))
+        assert (consumer.deleted, consumer.failed) == (3, 0)
+    finally:
+        client.close()
+        server.close()
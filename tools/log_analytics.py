@@ -0,0 +1,312 @@
+#!/usr/bin/env python3.12
+# Summarizes exported worker logs: per-minute request throughput, heartbeat
+# tick drift and latency percentiles, per task and for all tasks together.
+# Files are streamed line by line (gzipped or not), so a multi-GB export
+# needs memory only for per-minute counts, tick timestamps (8 bytes each)
+# and the bucketed latency histograms. Needs numpy (tools/requirements.txt).
+#
+#   python3 tools/log_analytics.py export/ > deploy-a.json
+#   python3 tools/log_analytics.py export/ --baseline deploy-a.json --format csv
+#
+# Accepts CloudWatch Logs exports to S3 (<task id>/000000.gz files whose lines
+# start with the ingestion timestamp) as well as raw container output (one
+# file per task, timestamps from the "time" field, to the second).
+
+import argparse
+import calendar
+import csv
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+TICK = '"event":"tick"'
+REQUEST = '"event":"request",'
+METRICS = '"_aws":'
+PERCENTILES = {"p50": 0.50, "p90": 0.90, "p99": 0.99, "p999": 0.999}
+EXPORT_TIMESTAMP = re.compile(r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?Z$")
+EXPORT_FILE = re.compile(r"^\d+(\.gz)?$")
+# A gap of more than this many tick intervals counts the ticks in it as missed.
+MISSED_TICK_FACTOR = 1.5
+
+def iter_files(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+def task_for(path: str) -> str:
+    # Exports keep each log stream (ecs/<container>/<task id>) in its own
+    # directory, split into numbered files.
+    name = os.path.basename(path)
+    if EXPORT_FILE.match(name):
+        return os.path.basename(os.path.dirname(path)) or "unknown"
+    for suffix in (".gz", ".log", ".jsonl", ".txt"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+def open_log(path: str) -> TextIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+def _parse_time(text: str) -> float:
+    # The worker logs container-local time, which is UTC on Fargate.
+    return calendar.timegm(time.strptime(text, "%Y-%m-%d %H:%M:%S"))
+
+def _parse_export_time(text: str) -> float:
+    seconds, _, fraction = text.rstrip("Z").partition(".")
+    return calendar.timegm(time.strptime(seconds, "%Y-%m-%dT%H:%M:%S")) + float(f"0.{fraction or 0}")
+
+class TaskStats:
+
+    def __init__(self) -> None:
+        self.requests: Counter = Counter()
+        self.ticks = array("d")
+        self.precise_ticks = True
+        self.histograms: Dict[str, Dict[float, int]] = {}
+        self.units: Dict[str, str] = {}
+
+    def add_histogram(self, name: str, unit: str, values: List[float], counts: List[int]) -> None:
+        histogram = self.histograms.setdefault(name, {})
+        self.units[name] = unit
+        for value, count in zip(values, counts):
+            histogram[value] = histogram.get(value, 0) + count
+
+class LogAnalyzer:
+    # Only tick, request and EMF lines are of interest. They are picked out
+    # by substring first, and request lines are counted from their minute
+    # prefix without decoding the JSON at all.
+
+    def __init__(self) -> None:
+        self.tasks: Dict[str, TaskStats] = {}
+        self.files = 0
+        self.lines = 0
+        self.unparsed = 0
+
+    def add_file(self, path: str) -> None:
+        stats = self.tasks.setdefault(task_for(path), TaskStats())
+        self.files += 1
+        with open_log(path) as f:
+            for line in f:
+                self.lines += 1
+                self._add_line(stats, line)
+
+    def _add_line(self, stats: TaskStats, line: str) -> None:
+        is_request = REQUEST in line
+        if not (is_request or TICK in line or METRICS in line):
+            return
+
+        start = line.find("{")
+        prefix = line[:start].strip() if start > 0 else ""
+        if prefix and not EXPORT_TIMESTAMP.match(prefix):
+            self.unparsed += 1
+            return
+
+        if is_request:
+            if prefix:
+                stats.requests[prefix[:16]] += 1
+            elif line.startswith('{"time":"', start):
+                stats.requests[line[start + 9:start + 25].replace(" ", "T")] += 1
+            else:
+                self.unparsed += 1
+            return
+
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            self.unparsed += 1
+            return
+        if record.get("event") == "tick":
+            if prefix:
+                stats.ticks.append(_parse_export_time(prefix))
+            elif "time" in record:
+                stats.ticks.append(_parse_time(record["time"]))
+                stats.precise_ticks = False
+        elif "_aws" in record:
+            self._add_metrics(stats, record)
+
+    def _add_metrics(self, stats: TaskStats, record: Dict[str, Any]) -> None:
+        for directive in record["_aws"].get("CloudWatchMetrics", []):
+            for metric in directive.get("Metrics", []):
+                value = record.get(metric.get("Name"))
+                if isinstance(value, dict) and "Values" in value:
+                    stats.add_histogram(metric["Name"], metric.get("Unit", "None"), value["Values"], value["Counts"])
+
+def throughput(minutes: Counter) -> Dict[str, Any]:
+    if not minutes:
+        return {"requests": 0}
+    stamps = np.array(list(minutes.keys()), dtype="datetime64[m]").astype(np.int64)
+    counts = np.array(list(minutes.values()), dtype=np.int64)
+    # Minutes without a single request count as zeros, not as gaps.
+    series = np.zeros(stamps.max() - stamps.min() + 1, dtype=np.int64)
+    np.add.at(series, stamps - stamps.min(), counts)
+    return {
+        "requests": int(series.sum()),
+        "minutes": int(series.size),
+        "per_minute_mean": float(series.mean()),
+        "per_minute_p50": float(np.percentile(series, 50)),
+        "per_minute_p95": float(np.percentile(series, 95)),
+        "per_minute_max": int(series.max()),
+        "per_second_mean": float(series.mean() / 60)
+    }
+
+def tick_drift(ticks: array, interval: Optional[float]) -> Tuple[Dict[str, Any], np.ndarray]:
+    stamps = np.sort(np.frombuffer(ticks, dtype=np.float64))
+    if stamps.size < 2:
+        return {"ticks": int(stamps.size)}, np.empty(0)
+    gaps = np.diff(stamps)
+    expected = interval or float(np.median(gaps))
+    if expected <= 0:
+        # Ticks faster than the timestamps' resolution.
+        return {"ticks": int(stamps.size)}, np.empty(0)
+    drift = gaps - expected
+    late = np.abs(drift)
+    return {
+        "ticks": int(stamps.size),
+        "interval_s": expected,
+        "drift_ms_mean": float(drift.mean() * 1000),
+        "drift_ms_p50": float(np.percentile(late, 50) * 1000),
+        "drift_ms_p99": float(np.percentile(late, 99) * 1000),
+        "drift_ms_max": float(late.max() * 1000),
+        "missed": int(np.maximum(np.round(gaps[gaps > expected * MISSED_TICK_FACTOR] / expected) - 1, 0).sum())
+    }, drift
+
+def latency(histogram: Dict[float, int], unit: str) -> Dict[str, Any]:
+    values = np.array(list(histogram.keys()), dtype=np.float64)
+    counts = np.array(list(histogram.values()), dtype=np.int64)
+    order = np.argsort(values)
+    values, counts = values[order], counts[order]
+    cumulative = np.cumsum(counts)
+    total = int(cumulative[-1])
+    ranks = np.array(list(PERCENTILES.values())) * total
+    positions = np.minimum(np.searchsorted(cumulative, ranks), values.size - 1)
+    result: Dict[str, Any] = {"unit": unit, "count": total, "mean": float((values * counts).sum() / total)}
+    result.update({name: float(value) for name, value in zip(PERCENTILES, values[positions])})
+    result["max"] = float(values[-1])
+    return result
+
+def summarize(analyzer: LogAnalyzer, interval: Optional[float] = None) -> Dict[str, Any]:
+    tasks: Dict[str, Any] = {}
+    all_minutes: Counter = Counter()
+    all_histograms = TaskStats()
+    drifts = []
+    precise = True
+    for name, stats in sorted(analyzer.tasks.items()):
+        ticks, drift = tick_drift(stats.ticks, interval)
+        if drift.size:
+            ticks["resolution"] = "ms" if stats.precise_ticks else "s"
+            precise = precise and stats.precise_ticks
+        tasks[name] = {
+            "throughput": throughput(stats.requests),
+            "ticks": ticks,
+            "latency": {metric: latency(h, stats.units[metric]) for metric, h in sorted(stats.histograms.items())}
+        }
+        all_minutes.update(stats.requests)
+        for metric, histogram in stats.histograms.items():
+            all_histograms.add_histogram(metric, stats.units[metric], list(histogram), list(histogram.values()))
+        drifts.append(drift)
+
+    # Drift only means something within a task, so tasks are pooled after.
+    drift = np.concatenate(drifts) if drifts else np.empty(0)
+    all_ticks: Dict[str, Any] = {"ticks": int(sum(len(stats.ticks) for stats in analyzer.tasks.values()))}
+    if drift.size:
+        late = np.abs(drift)
+        all_ticks.update({
+            "drift_ms_p50": float(np.percentile(late, 50) * 1000),
+            "drift_ms_p99": float(np.percentile(late, 99) * 1000),
+            "drift_ms_max": float(late.max() * 1000),
+            "missed": sum(task["ticks"].get("missed", 0) for task in tasks.values()),
+            "resolution": "ms" if precise else "s"
+        })
+
+    return {
+        "files": analyzer.files,
+        "lines": analyzer.lines,
+        "unparsed": analyzer.unparsed,
+        "all": {
+            "tasks": len(tasks),
+            "throughput": throughput(all_minutes),
+            "ticks": all_ticks,
+            "latency": {
+                metric: latency(h, all_histograms.units[metric])
+                for metric, h in sorted(all_histograms.histograms.items())
+            }
+        },
+        "tasks": tasks
+    }
+
+def flatten(summary: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat: Dict[str, Any] = {}
+    for key, value in summary.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Only the all-tasks figures line up between deploys; task ids differ.
+    before, after = flatten(baseline["all"], "all."), flatten(current["all"], "all.")
+    rows = []
+    for key in sorted(set(before) | set(after)):
+        old, new = before.get(key), after.get(key)
+        numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (old, new))
+        change = (new - old) / abs(old) if numeric and old else None
+        rows.append({"metric": key, "baseline": old, "current": new, "change": change})
+    return rows
+
+def write_output(data: Any, fmt: str, out: TextIO) -> None:
+    if fmt == "json":
+        json.dump(data, out, indent=2)
+        out.write("\n")
+        return
+    rows = data if isinstance(data, list) else [{"metric": k, "value": v} for k, v in flatten(data).items()]
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]) if rows else ["metric", "value"])
+    writer.writeheader()
+    writer.writerows(rows)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput, tick drift and latency percentiles from exported worker logs")
+    parser.add_argument("paths", nargs="+", help="log files or directories (searched recursively)")
+    parser.add_argument("--tick-interval", type=float, default=None, help="expected tick interval (default: median gap)")
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument("--baseline", help="summary JSON from an earlier deploy to compare against")
+    parser.add_argument("--output", help="write here instead of stdout")
+    args = parser.parse_args()
+
+    analyzer = LogAnalyzer()
+    started = time.monotonic()
+    for path in iter_files(args.paths):
+        analyzer.add_file(path)
+    summary = summarize(analyzer, args.tick_interval)
+    print(
+        f"{analyzer.lines} lines from {analyzer.files} files in {time.monotonic() - started:.1f}s",
+        file=sys.stderr
+    )
+
+    data: Any = summary
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            data = compare(summary, json.load(f))
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            write_output(data, args.format, f)
+    else:
+        write_output(data, args.format, sys.stdout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3.12
+# Recommends the cheapest Fargate CPU/memory size per environment from
+# recorded usage, and writes the change to cdk/config.py (and the matching
+# CFN mappings) as a patch. Runs offline on exported samples, either:
+#
+#   - the worker's own metric lines (CpuUtilized/MemoryUtilized in the EMF
+#     output, one sample per task per METRICS_INTERVAL_SECONDS), or
+#   - Container Insights performance events (Type "Task") exported from
+#     /aws/ecs/containerinsights/<cluster>/performance.
+#
+#   python3 tools/rightsizing.py export/ --diff rightsizing.patch && git apply rightsizing.patch
+#
+# Needs numpy (tools/requirements.txt).
+
+import argparse
+import difflib
+import json
+import os
+import re
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from log_analytics import iter_files, open_log
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "cdk"))
+
+from config import get_all_environments, get_environment_config
+
+CONFIG_PATH = "cdk/config.py"
+CFN_PATH = "cfn/ecs-stack.yaml"
+HOURS_PER_MONTH = 730
+# Fargate on-demand list prices (Linux/x86, ap-northeast-1) per vCPU-hour and
+# GB-hour; pass current ones for another region with --vcpu-hour/--gb-hour.
+VCPU_HOUR = 0.05056
+GB_HOUR = 0.00553
+# Memory (MiB) allowed with each CPU size: (min, max, step).
+FARGATE_MEMORY = {
+    256: (512, 2048, 512),
+    512: (1024, 4096, 1024),
+    1024: (2048, 8192, 1024),
+    2048: (4096, 16384, 1024),
+    4096: (8192, 30720, 1024),
+    8192: (16384, 61440, 4096),
+    16384: (32768, 122880, 8192)
+}
+STATS = {"p50": 50, "p95": 95, "p99": 99, "max": 100}
+
+def fargate_sizes() -> List[Tuple[int, int]]:
+    sizes = []
+    for cpu, (low, high, step) in FARGATE_MEMORY.items():
+        # 256 CPU units come with 512MiB, 1GiB or 2GiB only.
+        memories = (512, 1024, 2048) if cpu == 256 else range(low, high + 1, step)
+        sizes.extend((cpu, memory) for memory in memories)
+    return sizes
+
+def monthly_cost(cpu: int, memory: int, vcpu_hour: float = VCPU_HOUR, gb_hour: float = GB_HOUR) -> float:
+    return (cpu / 1024 * vcpu_hour + memory / 1024 * gb_hour) * HOURS_PER_MONTH
+
+class UsageSamples:
+    # One array of CPU units and one of MiB per environment.
+
+    def __init__(self, environments: List[str], environment: Optional[str] = None) -> None:
+        self.environments = environments
+        self.environment = environment
+        self.cpu: Dict[str, array] = {name: array("d") for name in environments}
+        self.memory: Dict[str, array] = {name: array("d") for name in environments}
+        self.files = 0
+        self.unmatched = 0
+
+    def add_file(self, path: str) -> None:
+        self.files += 1
+        with open_log(path) as f:
+            for line in f:
+                if '"CpuUtilized"' in line or '"MemoryUtilized"' in line:
+                    self._add_line(line)
+
+    def _add_line(self, line: str) -> None:
+        try:
+            record = json.loads(line[line.find("{"):])
+        except ValueError:
+            return
+        if "Type" in record and record["Type"] != "Task":
+            # Container Insights also reports each container; size the task.
+            return
+
+        environment = self.environment or self._environment_for(record)
+        if environment not in self.cpu:
+            self.unmatched += 1
+            return
+        if isinstance(record.get("CpuUtilized"), (int, float)):
+            self.cpu[environment].append(record["CpuUtilized"])
+        if isinstance(record.get("MemoryUtilized"), (int, float)):
+            self.memory[environment].append(record["MemoryUtilized"])
+
+    def _environment_for(self, record: Dict[str, Any]) -> Optional[str]:
+        # The worker's EMF lines carry it as a dimension; Container Insights
+        # names the cluster, service and family after it (EcsStack naming).
+        if "Environment" in record:
+            return record["Environment"]
+        for field in ("ClusterName", "ServiceName", "TaskDefinitionFamily"):
+            for name in self.environments:
+                if str(record.get(field, "")).endswith(f"-{name}"):
+                    return name
+        return None
+
+def _stats(samples: np.ndarray) -> Dict[str, float]:
+    return {name: round(float(np.percentile(samples, q)), 1) for name, q in STATS.items()}
+
+def recommend(
+    environment: str,
+    cpu: np.ndarray,
+    memory: np.ndarray,
+    cpu_percentile: float = 95,
+    memory_percentile: float = 100,
+    cpu_headroom: float = 0.30,
+    memory_headroom: float = 0.30,
+    vcpu_hour: float = VCPU_HOUR,
+    gb_hour: float = GB_HOUR
+) -> Dict[str, Any]:
+    config = get_environment_config(environment)
+    current_cpu, current_memory = config["ecs"]["cpu"], config["ecs"]["memory"]
+    cpu_demand = float(np.percentile(cpu, cpu_percentile))
+    memory_demand = float(np.percentile(memory, memory_percentile))
+
+    # The reference caches and the dedupe index are budgeted as fractions of
+    # the task memory, so that part of the usage grows with the task.
+    scaled = config["cache"]["memory_fraction"] + config["dedupe"]["memory_fraction"]
+    fixed = max(0.0, memory_demand - scaled * current_memory)
+
+    def fits(size: Tuple[int, int]) -> bool:
+        cpu_units, mib = size
+        return cpu_demand <= cpu_units * (1 - cpu_headroom) and fixed + scaled * mib <= mib * (1 - memory_headroom)
+
+    candidates = [size for size in fargate_sizes() if fits(size)]
+    if not candidates:
+        raise ValueError(f"No Fargate size fits {environment}: {cpu_demand:.0f} CPU units, {memory_demand:.0f}MiB")
+    best = min(candidates, key=lambda size: (monthly_cost(*size, vcpu_hour, gb_hour), size[1]))
+
+    def sizing(cpu_units: int, mib: int) -> Dict[str, Any]:
+        return {
+            "cpu": cpu_units,
+            "memory": mib,
+            "cpu_utilization": round(cpu_demand / cpu_units, 3),
+            "memory_utilization": round((fixed + scaled * mib) / mib, 3),
+            "monthly_cost_per_task": round(monthly_cost(cpu_units, mib, vcpu_hour, gb_hour), 2)
+        }
+
+    current, recommended = sizing(current_cpu, current_memory), sizing(*best)
+    # Fargate caps a task at its CPU size, so usage pinned near it hides how
+    # much more the task would have used.
+    saturated = float(np.mean(cpu >= current_cpu * 0.95))
+    return {
+        "samples": {"cpu": int(cpu.size), "memory": int(memory.size)},
+        "cpu_units": _stats(cpu),
+        "memory_mib": _stats(memory),
+        "demand": {
+            "cpu_units": round(cpu_demand, 1),
+            "cpu_percentile": cpu_percentile,
+            "memory_mib": round(memory_demand, 1),
+            "memory_percentile": memory_percentile,
+            "memory_fixed_mib": round(fixed, 1),
+            "memory_scaled_fraction": scaled
+        },
+        "cpu_saturated_fraction": round(saturated, 3),
+        "current": current,
+        "recommended": recommended,
+        "monthly_savings_per_task": round(current["monthly_cost_per_task"] - recommended["monthly_cost_per_task"], 2)
+    }
+
+def _replace_in_block(lines: List[str], start: str, end: str, values: Dict[str, Any]) -> List[str]:
+    # Rewrites "<key>: <number>" lines between the first line matching start
+    # and the next matching end, keeping everything else as it is.
+    out = list(lines)
+    begin = next(i for i, line in enumerate(out) if re.match(start, line))
+    for i in range(begin + 1, len(out)):
+        if re.match(end, out[i]):
+            break
+        for key, value in values.items():
+            out[i] = re.sub(rf'^(\s*"?{key}"?:\s*"?)[\d_]+("?,?\s*)$', rf"\g<1>{value}\g<2>", out[i])
+    return out
+
+def propose_diff(recommendations: Dict[str, Dict[str, Any]]) -> str:
+    with open(os.path.join(REPO_ROOT, CONFIG_PATH), "r") as f:
+        config_lines = f.readlines()
+    with open(os.path.join(REPO_ROOT, CFN_PATH), "r") as f:
+        cfn_lines = f.readlines()
+
+    new_config, new_cfn = config_lines, cfn_lines
+    for environment, result in recommendations.items():
+        cpu, memory = result["recommended"]["cpu"], result["recommended"]["memory"]
+        # In config.py the env's "ecs" block; "cpu" and "memory" come first in it.
+        env_start = next(i for i, line in enumerate(new_config) if re.match(rf'\s*"{environment}": \{{', line))
+        ecs_start = next(i for i in range(env_start, len(new_config)) if re.match(r'\s*"ecs": \{', new_config[i]))
+        head, tail = new_config[:ecs_start], new_config[ecs_start:]
+        new_config = head + _replace_in_block(tail, r'\s*"ecs": \{', r'\s*"cpu_architecture"', {"cpu": cpu, "memory": memory})
+
+        # The CFN mappings also spell out the memory budgets derived from it.
+        config = get_environment_config(environment)
+        new_cfn = _replace_in_block(new_cfn, rf"    {environment}:$", r"    \S|\S", {
+            "Cpu": cpu,
+            "Memory": memory,
+            "CacheMemoryMib": int(memory * config["cache"]["memory_fraction"]),
+            "DedupeMemoryMib": int(memory * config["dedupe"]["memory_fraction"])
+        })
+
+    return "".join(
+        "".join(difflib.unified_diff(old, new, f"a/{path}", f"b/{path}"))
+        for path, old, new in ((CONFIG_PATH, config_lines, new_config), (CFN_PATH, cfn_lines, new_cfn))
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fargate CPU/memory recommendations from recorded usage")
+    parser.add_argument("paths", nargs="+", help="sample files or directories (searched recursively)")
+    parser.add_argument("--environment", choices=get_all_environments(), help="attribute every sample to this environment")
+    parser.add_argument("--cpu-percentile", type=float, default=95, help="CPU demand to size for (default p95)")
+    parser.add_argument("--memory-percentile", type=float, default=100, help="memory demand to size for (default the peak)")
+    parser.add_argument("--cpu-headroom", type=float, default=0.30, help="CPU left free at the demand")
+    # 0.30 keeps the peak below MEMORY_SHRINK_AT (0.70), where the memory
+    # governor starts cutting the caches.
+    parser.add_argument("--memory-headroom", type=float, default=0.30, help="memory left free at the demand")
+    parser.add_argument("--min-samples", type=int, default=60, help="skip environments with fewer samples")
+    parser.add_argument("--vcpu-hour", type=float, default=VCPU_HOUR, help="Fargate price per vCPU-hour")
+    parser.add_argument("--gb-hour", type=float, default=GB_HOUR, help="Fargate price per GB-hour")
+    parser.add_argument("--diff", help="write the proposed config changes here as a patch")
+    args = parser.parse_args()
+
+    samples = UsageSamples(get_all_environments(), args.environment)
+    for path in iter_files(args.paths):
+        samples.add_file(path)
+
+    recommendations: Dict[str, Dict[str, Any]] = {}
+    for environment in samples.environments:
+        cpu = np.frombuffer(samples.cpu[environment], dtype=np.float64)
+        memory = np.frombuffer(samples.memory[environment], dtype=np.float64)
+        if min(cpu.size, memory.size) < args.min_samples:
+            print(
+                f"{environment}: skipped, {cpu.size} CPU and {memory.size} memory samples (need {args.min_samples})",
+                file=sys.stderr
+            )
+            continue
+        result = recommend(
+            environment,
+            cpu,
+            memory,
+            cpu_percentile=args.cpu_percentile,
+            memory_percentile=args.memory_percentile,
+            cpu_headroom=args.cpu_headroom,
+            memory_headroom=args.memory_headroom,
+            vcpu_hour=args.vcpu_hour,
+            gb_hour=args.gb_hour
+        )
+        recommendations[environment] = result
+        if result["cpu_saturated_fraction"] > 0.05:
+            print(
+                f"{environment}: CPU at its limit in {result['cpu_saturated_fraction']:.0%} of samples, "
+                f"the real demand may be higher than measured",
+                file=sys.stderr
+            )
+        current, recommended = result["current"], result["recommended"]
+        print(
+            f"{environment}: {current['cpu']}/{current['memory']} -> {recommended['cpu']}/{recommended['memory']} "
+            f"(${current['monthly_cost_per_task']:.2f} -> ${recommended['monthly_cost_per_task']:.2f} per task-month)",
+            file=sys.stderr
+        )
+
+    print(json.dumps({"files": samples.files, "unmatched": samples.unmatched, "environments": recommendations}, indent=2))
+    if args.diff and recommendations:
+        with open(args.diff, "w") as f:
+            f.write(propose_diff(recommendations))
+        print(f"Wrote the proposed changes to {args.diff} (git apply {args.diff})", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
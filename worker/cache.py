@@ -0,0 +1,225 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from worker.cgroup import memory_limit
+from worker.logwriter import log
+from worker.metrics import get_metrics
+
+Loader = Callable[[Any], Awaitable[Any]]
+
+MIB = 1024 * 1024
+DEFAULT_BUDGET = 64 * MIB
+
+def estimate_size(value: Any) -> int:
+    # Deep sys.getsizeof over the JSON-shaped values the reference APIs
+    # return. Shared objects are counted once.
+    seen = set()
+    total = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return total
+
+def memory_budget(fraction: float, fallback: int = DEFAULT_BUDGET) -> int:
+    limit = memory_limit()
+    return int(limit * fraction) if limit else fallback
+
+class _Entry:
+    __slots__ = ("value", "size", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, size: int, fresh_until: float, stale_until: float) -> None:
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+class TtlLruCache:
+    # LRU bounded by an estimated byte size (and optionally an entry count).
+    # An entry is fresh for its ttl, then served stale for up to stale_ttl
+    # more while a single background reload replaces it. Concurrent misses on
+    # one key share a single load.
+
+    def __init__(
+        self,
+        name: str,
+        loader: Loader,
+        max_bytes: int = DEFAULT_BUDGET,
+        max_entries: Optional[int] = None,
+        ttl: float = 300.0,
+        stale_ttl: float = 60.0,
+        sizeof: Callable[[Any], int] = estimate_size,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.name = name
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._sizeof = sizeof
+        self._clock = clock
+        self._entries: "OrderedDict[Any, _Entry]" = OrderedDict()
+        self._loading: Dict[Any, asyncio.Task] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_errors = 0
+        metrics = get_metrics()
+        self._hit_metric = metrics.counter(f"CacheHits.{name}")
+        self._miss_metric = metrics.counter(f"CacheMisses.{name}")
+        self._eviction_metric = metrics.counter(f"CacheEvictions.{name}")
+        self._load_latency = metrics.histogram(f"CacheLoadLatency.{name}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Any) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and self._clock() < entry.stale_until
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    async def get(self, key: Any, ttl: Optional[float] = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = self._clock()
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._hit_metric.inc()
+                if now >= entry.fresh_until:
+                    self.stale_hits += 1
+                    self._load(key, ttl)
+                return entry.value
+
+        self.misses += 1
+        self._miss_metric.inc()
+        # Shielded so one caller giving up does not cancel the others' load.
+        return await asyncio.shield(self._load(key, ttl))
+
+    def put(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        size = self._sizeof(key) + self._sizeof(value)
+        self.invalidate(key)
+        if size > self.max_bytes:
+            return
+
+        now = self._clock()
+        fresh_until = now + (self.ttl if ttl is None else ttl)
+        self._entries[key] = _Entry(value, size, fresh_until, fresh_until + self.stale_ttl)
+        self.bytes += size
+        while self.bytes > self.max_bytes or (self.max_entries is not None and len(self._entries) > self.max_entries):
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+            self._eviction_metric.inc()
+
+    def resize(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        while self.bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+            self._eviction_metric.inc()
+
+    def invalidate(self, key: Any) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    async def warm(self, keys: Iterable[Any], concurrency: int = 16) -> int:
+        # Loads keys that are not already cached; returns how many loaded.
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm_one(key: Any) -> bool:
+            async with semaphore:
+                await asyncio.shield(self._load(key, None))
+                return True
+
+        pending = [key for key in dict.fromkeys(keys) if key not in self]
+        results = await asyncio.gather(*(warm_one(key) for key in pending), return_exceptions=True)
+        return sum(result is True for result in results)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "evictions": self.evictions,
+            "loads": self.loads,
+            "load_errors": self.load_errors
+        }
+
+    def _load(self, key: Any, ttl: Optional[float]) -> asyncio.Task:
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(key, ttl))
+            self._loading[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return task
+
+    def _forget(self, key: Any, task: asyncio.Task) -> None:
+        self._loading.pop(key, None)
+        # A failed background reload has nobody awaiting it.
+        if not task.cancelled():
+            task.exception()
+
+    async def _fill(self, key: Any, ttl: Optional[float]) -> Any:
+        started = time.monotonic()
+        try:
+            value = await self.loader(key)
+        except Exception as e:
+            self.load_errors += 1
+            log(
+                f"Cache {self.name} failed to load {key!r}: {e!r}",
+                level="WARNING",
+                event="cache_load_error",
+                cache=self.name
+            )
+            raise
+        self.loads += 1
+        self._load_latency.record(time.monotonic() - started)
+        self.put(key, value, ttl)
+        return value
+
+_caches: Dict[str, TtlLruCache] = {}
+
+def create_cache(name: str, loader: Loader, **kwargs: Any) -> TtlLruCache:
+    cache = TtlLruCache(name, loader, **kwargs)
+    _caches[name] = cache
+    return cache
+
+def get_cache(name: str) -> Optional[TtlLruCache]:
+    return _caches.get(name)
+
+def get_caches() -> Dict[str, TtlLruCache]:
+    return dict(_caches)
+
+def close_caches() -> None:
+    for cache in _caches.values():
+        cache.clear()
+    _caches.clear()
@@ -0,0 +1,114 @@
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def cpu_quota(root: str = CGROUP_ROOT) -> Optional[float]:
+    # cgroup v2 exposes "<quota> <period>" (quota may be "max"); v1 splits it
+    # across two files with -1 meaning unlimited.
+    cpu_max = _read(os.path.join(root, "cpu.max"))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    quota = _read(os.path.join(root, "cpu", "cpu.cfs_quota_us"))
+    period = _read(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def effective_cpu_count(root: str = CGROUP_ROOT) -> int:
+    cpus = available_cpus()
+    quota = cpu_quota(root)
+    if quota is not None:
+        cpus = min(cpus, math.floor(quota))
+    return max(1, cpus)
+
+def memory_limit(root: str = CGROUP_ROOT) -> Optional[int]:
+    # Bytes, or None when unlimited. v1 reports "unlimited" as a huge number
+    # rounded down to the page size.
+    limit = _read(os.path.join(root, "memory.max"))
+    if limit:
+        return None if limit == "max" else int(limit)
+
+    limit = _read(os.path.join(root, "memory", "memory.limit_in_bytes"))
+    if limit and int(limit) < 1 << 60:
+        return int(limit)
+    return None
+
+def memory_usage(root: str = CGROUP_ROOT) -> Optional[int]:
+    # Working set as the OOM killer sees it: usage minus page cache the
+    # kernel can drop (inactive_file), like kubelet and docker stats report.
+    usage = _read(os.path.join(root, "memory.current"))
+    stat_path = os.path.join(root, "memory.stat")
+    if usage is None:
+        usage = _read(os.path.join(root, "memory", "memory.usage_in_bytes"))
+        stat_path = os.path.join(root, "memory", "memory.stat")
+    if usage is None:
+        return None
+
+    inactive = 0
+    for line in (_read(stat_path) or "").splitlines():
+        name, _, value = line.partition(" ")
+        if name in ("inactive_file", "total_inactive_file"):
+            inactive = int(value)
+    return max(0, int(usage) - inactive)
+
+def cpu_usage(root: str = CGROUP_ROOT) -> Optional[float]:
+    # CPU seconds used by everything in the cgroup since it started.
+    for line in (_read(os.path.join(root, "cpu.stat")) or "").splitlines():
+        name, _, value = line.partition(" ")
+        if name == "usage_usec":
+            return int(value) / 1_000_000
+
+    usage = _read(os.path.join(root, "cpuacct", "cpuacct.usage"))
+    return int(usage) / 1_000_000_000 if usage else None
+
+def process_rss() -> Optional[int]:
+    statm = _read("/proc/self/statm")
+    if not statm:
+        return None
+    return int(statm.split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+class UsageSampler:
+    # CPU in ECS CPU units (1024 per vCPU) averaged since the previous sample,
+    # and the memory working set in MiB: the figures Container Insights
+    # reports as CpuUtilized and MemoryUtilized. Outside a container the
+    # process's own CPU time and RSS stand in.
+
+    def __init__(self, root: str = CGROUP_ROOT) -> None:
+        self.root = root
+        self._last: Optional[Tuple[float, float]] = None
+
+    def sample(self) -> Dict[str, float]:
+        now = time.monotonic()
+        cpu = cpu_usage(self.root)
+        in_cgroup = cpu is not None
+        if cpu is None:
+            cpu = time.process_time()
+
+        usage: Dict[str, float] = {}
+        if self._last is not None and now > self._last[1]:
+            usage["cpu_units"] = (cpu - self._last[0]) / (now - self._last[1]) * 1024
+        self._last = (cpu, now)
+        memory = memory_usage(self.root) if in_cgroup else process_rss()
+        if memory is not None:
+            usage["memory_mib"] = memory / 2**20
+        return usage
@@ -0,0 +1,280 @@
+import json
+import os
+import pickle
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+class MemoryCheckpointBackend:
+
+    def __init__(self) -> None:
+        self.snapshot: Optional[bytes] = None
+        self.logs: Dict[int, bytearray] = {}
+        self.syncs = 0
+
+    def read_snapshot(self) -> Optional[bytes]:
+        return self.snapshot
+
+    def write_snapshot(self, data: bytes) -> None:
+        self.snapshot = data
+
+    def read_log(self, generation: int) -> bytes:
+        return bytes(self.logs.get(generation, b""))
+
+    def append(self, generation: int, data: bytes) -> None:
+        self.logs.setdefault(generation, bytearray()).extend(data)
+
+    def sync(self) -> None:
+        self.syncs += 1
+
+    def log_size(self, generation: int) -> int:
+        return len(self.logs.get(generation, b""))
+
+    def truncate_log(self, generation: int, size: int) -> None:
+        if generation in self.logs:
+            del self.logs[generation][size:]
+
+    def remove_log(self, generation: int) -> None:
+        self.logs.pop(generation, None)
+
+    def close(self) -> None:
+        pass
+
+class FileCheckpointBackend:
+    # Works on any POSIX filesystem. The store assumes one writer, so each
+    # process needs a directory of its own; on ECS that is the task's own
+    # storage, which goes away with the task.
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._snapshot_path = os.path.join(directory, "snapshot.pkl")
+        self._log_file = None
+        self._log_generation: Optional[int] = None
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"log.{generation}")
+
+    def read_snapshot(self) -> Optional[bytes]:
+        try:
+            with open(self._snapshot_path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write_snapshot(self, data: bytes) -> None:
+        tmp_path = f"{self._snapshot_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def read_log(self, generation: int) -> bytes:
+        try:
+            with open(self._log_path(generation), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return b""
+
+    def append(self, generation: int, data: bytes) -> None:
+        if self._log_generation != generation:
+            self.close()
+            self._log_file = open(self._log_path(generation), "ab")
+            self._log_generation = generation
+        self._log_file.write(data)
+
+    def sync(self) -> None:
+        if self._log_file is not None:
+            self._log_file.flush()
+            os.fsync(self._log_file.fileno())
+
+    def log_size(self, generation: int) -> int:
+        try:
+            return os.path.getsize(self._log_path(generation))
+        except FileNotFoundError:
+            return 0
+
+    def truncate_log(self, generation: int, size: int) -> None:
+        if self._log_generation == generation:
+            self.close()
+        try:
+            with open(self._log_path(generation), "r+b") as f:
+                f.truncate(size)
+                f.flush()
+                os.fsync(f.fileno())
+        except FileNotFoundError:
+            pass
+
+    def remove_log(self, generation: int) -> None:
+        if self._log_generation == generation:
+            self.close()
+        try:
+            os.remove(self._log_path(generation))
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+            self._log_generation = None
+
+CHECKPOINT_BACKENDS: Dict[str, Callable[..., Any]] = {
+    "memory": lambda directory: MemoryCheckpointBackend(),
+    "file": FileCheckpointBackend
+}
+
+def create_checkpoint_backend(name: str, directory: str) -> Any:
+    if name not in CHECKPOINT_BACKENDS:
+        raise ValueError(f"Unknown checkpoint backend: {name}. Available: {list(CHECKPOINT_BACKENDS.keys())}")
+    return CHECKPOINT_BACKENDS[name](directory)
+
+class CheckpointStore:
+    # Updates change in-memory state and queue a tuple; flush() appends the
+    # whole queue as one JSON line to the current log generation and fsyncs
+    # once per batch. Compaction writes a pickled snapshot for the next
+    # generation before the old log is removed, so a crash at any point
+    # recovers to either the old or the new generation, never a mix.
+
+    def __init__(self, backend: Any, compact_bytes: int = 16 * 1024 * 1024) -> None:
+        self.backend = backend
+        self.compact_bytes = compact_bytes
+        self.cursors: Dict[str, Any] = {}
+        self.counters: Dict[str, int] = {}
+        self.sets: Dict[str, Set[str]] = {}
+        self.generation = 0
+        self.recovered_entries = 0
+        self._pending: List[Tuple[str, str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def recover(self) -> None:
+        snapshot = self.backend.read_snapshot()
+        if snapshot is not None:
+            state = pickle.loads(snapshot)
+            self.generation = state["generation"]
+            self.cursors = state["cursors"]
+            self.counters = state["counters"]
+            self.sets = state["sets"]
+
+        self.recovered_entries = 0
+        data = self.backend.read_log(self.generation)
+        good = 0
+        while good < len(data):
+            end = data.find(b"\n", good)
+            if end < 0:
+                break
+            line = data[good:end]
+            if line:
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    break
+                for op, name, value in batch:
+                    self._apply(op, name, value)
+                self.recovered_entries += len(batch)
+            good = end + 1
+
+        if good < len(data):
+            # A crash mid-append leaves a torn last batch; it was never
+            # acknowledged by fsync, and every batch before it is intact. Cut it
+            # off before appending again, or the next batch would be glued onto
+            # it and lost along with everything after it on the next recovery.
+            self.backend.truncate_log(self.generation, good)
+
+    def _apply(self, op: str, name: str, value: Any) -> None:
+        if op == "cursor":
+            self.cursors[name] = value
+        elif op == "incr":
+            self.counters[name] = self.counters.get(name, 0) + value
+        elif op == "add":
+            self.sets.setdefault(name, set()).add(value)
+        elif op == "discard":
+            self.sets.get(name, set()).discard(value)
+
+    def set_cursor(self, name: str, value: Any) -> None:
+        with self._lock:
+            self.cursors[name] = value
+            self._pending.append(("cursor", name, value))
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        with self._lock:
+            value = self.counters.get(name, 0) + amount
+            self.counters[name] = value
+            self._pending.append(("incr", name, amount))
+        return value
+
+    def add(self, set_name: str, key: str) -> bool:
+        with self._lock:
+            members = self.sets.get(set_name)
+            if members is None:
+                members = self.sets[set_name] = set()
+            if key in members:
+                return False
+            members.add(key)
+            self._pending.append(("add", set_name, key))
+        return True
+
+    def discard(self, set_name: str, key: str) -> None:
+        with self._lock:
+            members = self.sets.get(set_name)
+            if members is not None and key in members:
+                members.discard(key)
+                self._pending.append(("discard", set_name, key))
+
+    def contains(self, set_name: str, key: str) -> bool:
+        return key in self.sets.get(set_name, ())
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                self.backend.append(self.generation, (_encode(pending) + "\n").encode("utf-8"))
+                self.backend.sync()
+
+            if self.backend.log_size(self.generation) >= self.compact_bytes:
+                self._compact()
+            return len(pending)
+
+    def _compact(self) -> None:
+        with self._lock:
+            state = {
+                "generation": self.generation + 1,
+                "cursors": dict(self.cursors),
+                "counters": dict(self.counters),
+                "sets": {name: set(members) for name, members in self.sets.items()}
+            }
+            # Updates queued before the copy are already in the snapshot;
+            # later ones stay queued for the new generation's log.
+            self._pending = []
+
+        self.backend.write_snapshot(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+        old_generation = self.generation
+        self.generation = state["generation"]
+        self.backend.remove_log(old_generation)
+
+    def close(self) -> None:
+        self.flush()
+        self.backend.close()
+
+class CheckpointOffsetStore:
+    # Lets ingestion keep its resume offset in the checkpoint store instead
+    # of a separate offset file.
+
+    def __init__(self, store: CheckpointStore, name: str) -> None:
+        self.store = store
+        self.name = name
+
+    def load(self) -> int:
+        return int(self.store.cursors.get(self.name, 0))
+
+    def save(self, offset: int) -> None:
+        self.store.set_cursor(self.name, offset)
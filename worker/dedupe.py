@@ -0,0 +1,467 @@
+import asyncio
+import functools
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from worker.dynamodb import DynamoClient, create_dynamo_client
+from worker.logwriter import log
+from worker.metrics import get_metrics
+
+MIB = 1024 * 1024
+# Measured cost of one key in MemoryDedupeStore: the key string, its
+# timestamp and the OrderedDict entry.
+ENTRY_BYTES = 200
+
+def bloom_bits(capacity: int, error_rate: float) -> int:
+    return max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+
+def bloom_error_rate(capacity: int, bits: int, hashes: int) -> float:
+    return (1 - math.exp(-hashes * capacity / bits)) ** hashes
+
+class GenerationalBloomFilter:
+    # A Bloom filter cannot forget, so keys go into the newest of
+    # `generations` equal filters. The newest is retired for a fresh one once
+    # it holds capacity keys or is slice_seconds old, and the oldest is then
+    # dropped, so every key is remembered for at least the window. Under a
+    # higher key rate the filters simply turn over faster instead of filling
+    # up, and memory stays fixed. Probe positions come from blake2b rather
+    # than hash(), which is salted per process, so a key probes the same bits
+    # in every task and across restarts.
+
+    def __init__(
+        self,
+        window_keys: int,
+        window_seconds: float,
+        error_rate: float = 0.001,
+        generations: int = 4,
+        max_bytes: Optional[int] = None,
+        clock: Callable[[], float] = time.time
+    ) -> None:
+        if generations < 2:
+            raise ValueError(f"Need at least 2 generations, got {generations}")
+
+        self.generations = generations
+        self.capacity = max(1, math.ceil(window_keys / (generations - 1)))
+        self.slice_seconds = window_seconds / (generations - 1)
+        # Lookups probe every generation, so their false positives add up.
+        bits = bloom_bits(self.capacity, error_rate / generations)
+        if max_bytes is not None:
+            bits = max(64, min(bits, max_bytes * 8 // generations))
+        self.bits = bits
+        self.hashes = max(1, round(bits / self.capacity * math.log(2)))
+        self.error_rate = min(1.0, generations * bloom_error_rate(self.capacity, bits, self.hashes))
+        self._clock = clock
+        self._filters: List[bytearray] = [bytearray((bits + 7) // 8)]
+        self._count = 0
+        self._started = clock()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._filters[0]) * self.generations
+
+    def _positions(self, key: str) -> List[int]:
+        h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        bits = self.bits
+        return [(h1 + i * h2) % bits for i in range(self.hashes)]
+
+    def __contains__(self, key: str) -> bool:
+        positions = self._positions(key)
+        for bits in reversed(self._filters):
+            for position in positions:
+                if not bits[position >> 3] & (1 << (position & 7)):
+                    break
+            else:
+                return True
+        return False
+
+    def add(self, key: str, at: Optional[float] = None) -> None:
+        at = self._clock() if at is None else at
+        slices = int((at - self._started) // self.slice_seconds) if self.slice_seconds > 0 else 0
+        if slices > 0:
+            self._rotate(min(slices, self.generations), at)
+        elif self._count >= self.capacity:
+            self._rotate(1, at)
+
+        bits = self._filters[-1]
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def _rotate(self, times: int, at: float) -> None:
+        for _ in range(times):
+            self._filters.append(bytearray(len(self._filters[0])))
+        del self._filters[:-self.generations]
+        self._count = 0
+        self._started = at
+
+class MemoryDedupeStore:
+    # Completed keys in recency order, bounded by max_keys. Lost on restart,
+    # so it only catches redeliveries within one run.
+    blocking = False
+    shared = False
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def contains(self, key: str, since: float) -> bool:
+        at = self._seen.get(key)
+        return at is not None and at >= since
+
+    def add_many(self, items: Iterable[Tuple[str, float]]) -> None:
+        for key, at in items:
+            self._seen[key] = at
+            self._seen.move_to_end(key)
+        while len(self._seen) > self.max_keys:
+            self._seen.popitem(last=False)
+
+    def expire(self, since: float, keep: int) -> None:
+        while self._seen and (len(self._seen) > keep or next(iter(self._seen.values())) < since):
+            self._seen.popitem(last=False)
+
+    def keys(self, since: float) -> Iterator[Tuple[str, float]]:
+        return ((key, at) for key, at in list(self._seen.items()) if at >= since)
+
+    def close(self) -> None:
+        self._seen.clear()
+
+class SqliteDedupeStore:
+    # The whole window on disk rather than in memory. The file is local to
+    # the process's machine: on Fargate that is the task's ephemeral storage,
+    # gone when the task stops and not shared with other tasks, so like the
+    # memory store it only catches duplicates this task has seen. Rows are
+    # replaced on every completion, so rowid order is recency order and the
+    # count window is a range delete.
+    blocking = True
+    shared = False
+
+    def __init__(self, path: str, busy_timeout: float = 5.0) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, seen_at REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS seen_at ON seen (seen_at)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def contains(self, key: str, since: float) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM seen WHERE key = ? AND seen_at >= ?", (key, since)).fetchone()
+        return row is not None
+
+    def add_many(self, items: Iterable[Tuple[str, float]]) -> None:
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO seen (key, seen_at) VALUES (?, ?)", items)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def expire(self, since: float, keep: int) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM seen WHERE seen_at < ?", (since,))
+            self._db.execute("DELETE FROM seen WHERE rowid <= (SELECT MAX(rowid) FROM seen) - ?", (keep,))
+
+    def keys(self, since: float, batch: int = 10000) -> Iterator[Tuple[str, float]]:
+        # In rowid batches, so a large window is never all in memory at once.
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT rowid, key, seen_at FROM seen WHERE rowid > ? AND seen_at >= ? ORDER BY rowid LIMIT ?",
+                    (last, since, batch)
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, key, at in rows:
+                yield key, at
+            last = rows[-1][0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+class DynamoDedupeStore:
+    # The window in a DynamoDB table (named by path) that every task shares,
+    # so a replay is caught whichever task it lands on. Claiming is a
+    # conditional put that only succeeds while no live item holds the key: a
+    # claim lives claim_seconds, long enough to finish the request and flush,
+    # and a completed key the whole window. The table's TTL on expires_at
+    # clears old items, but only within a day or two, so the condition checks
+    # the time itself. The window is by time only; there is no count cap.
+    blocking = True
+    shared = True
+
+    def __init__(
+        self,
+        table: str,
+        window_seconds: float = 86400.0,
+        claim_seconds: float = 300.0,
+        client: Optional[DynamoClient] = None
+    ) -> None:
+        self.table = table
+        self.window_seconds = window_seconds
+        self.claim_seconds = claim_seconds
+        self.client = client or create_dynamo_client()
+
+    def claim(self, key: str, now: float) -> bool:
+        return self.client.put_item(
+            self.table,
+            {"pk": key, "state": "claimed", "seen_at": now, "expires_at": math.ceil(now + self.claim_seconds)},
+            condition="attribute_not_exists(pk) OR expires_at < :now",
+            values={":now": now}
+        )
+
+    def release(self, key: str) -> None:
+        # Only a claim; a key another task has completed stays.
+        self.client.delete_item(
+            self.table,
+            {"pk": key},
+            condition="#state = :claimed",
+            names={"#state": "state"},
+            values={":claimed": "claimed"}
+        )
+
+    def contains(self, key: str, since: float) -> bool:
+        item = self.client.get_item(self.table, {"pk": key})
+        return item is not None and item["state"] == "done" and item["seen_at"] >= since
+
+    def add_many(self, items: Iterable[Tuple[str, float]]) -> None:
+        self.client.put_many(self.table, [
+            {"pk": key, "state": "done", "seen_at": at, "expires_at": math.ceil(at + self.window_seconds)}
+            for key, at in items
+        ])
+
+    def expire(self, since: float, keep: int) -> None:
+        pass
+
+    def keys(self, since: float) -> Iterator[Tuple[str, float]]:
+        # Nothing to preload: claims go to the table, not the local filter.
+        return iter(())
+
+    def close(self) -> None:
+        self.client.close()
+
+DEDUPE_STORES: Dict[str, Callable[..., Any]] = {
+    "memory": lambda path, max_keys, **options: MemoryDedupeStore(max_keys),
+    "sqlite": lambda path, max_keys, **options: SqliteDedupeStore(path),
+    "dynamodb": lambda path, max_keys, **options: DynamoDedupeStore(path, **options)
+}
+
+class DedupeIndex:
+    # Answers "did this key already complete within the window?". The Bloom
+    # filter settles most new keys without touching the store; its positives
+    # are confirmed there, so a false positive costs one lookup, never a
+    # dropped request. Keys being processed are held in memory, so a
+    # concurrent duplicate is caught as well. Only completed keys are
+    # recorded, which leaves failed requests free to be retried, and they
+    # reach the store in batches on flush().
+    #
+    # A shared store also holds keys other tasks completed, which this
+    # task's filter has never seen, so there every claim goes to the store.
+
+    def __init__(
+        self,
+        store: Any,
+        bloom: GenerationalBloomFilter,
+        window_keys: int = 1_000_000,
+        window_seconds: float = 86400.0,
+        clock: Callable[[], float] = time.time
+    ) -> None:
+        self.store = store
+        self.filter = bloom
+        self.window_keys = window_keys
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._in_flight: Set[str] = set()
+        self._pending: Dict[str, float] = {}
+        self._flushing: Dict[str, float] = {}
+        self._releasing: Set[asyncio.Future] = set()
+        self.lookups = 0
+        self.duplicates = 0
+        self.false_positives = 0
+        metrics = get_metrics()
+        self._duplicate_metric = metrics.counter("DedupeDuplicates")
+        self._false_positive_metric = metrics.counter("DedupeFalsePositives")
+
+    async def claim(self, key: str) -> bool:
+        # True if the caller should process key; it must then call complete()
+        # or release().
+        self.lookups += 1
+        if key in self._in_flight or key in self._pending or key in self._flushing:
+            self._duplicate()
+            return False
+
+        self._in_flight.add(key)
+        if self.store.shared:
+            try:
+                claimed = await asyncio.to_thread(self.store.claim, key, self._clock())
+            except BaseException:
+                self._in_flight.discard(key)
+                raise
+            if not claimed:
+                self._in_flight.discard(key)
+                self._duplicate()
+            return claimed
+
+        if key in self.filter:
+            since = self._clock() - self.window_seconds
+            if self.store.blocking:
+                seen = await asyncio.to_thread(self.store.contains, key, since)
+            else:
+                seen = self.store.contains(key, since)
+            if seen:
+                self._in_flight.discard(key)
+                self._duplicate()
+                return False
+            self.false_positives += 1
+            self._false_positive_metric.inc()
+        return True
+
+    def _duplicate(self) -> None:
+        self.duplicates += 1
+        self._duplicate_metric.inc()
+
+    def complete(self, key: str) -> None:
+        self._in_flight.discard(key)
+        now = self._clock()
+        self._pending[key] = now
+        self.filter.add(key, now)
+
+    def release(self, key: str) -> None:
+        self._in_flight.discard(key)
+        if self.store.shared:
+            # Right away, so a redelivery on any task can claim the key again.
+            release = asyncio.ensure_future(asyncio.to_thread(self.store.release, key))
+            self._releasing.add(release)
+            release.add_done_callback(functools.partial(self._released, key))
+
+    def _released(self, key: str, release: asyncio.Future) -> None:
+        self._releasing.discard(release)
+        if not release.cancelled() and release.exception() is not None:
+            log(
+                f"Could not release dedupe claim on {key}, it expires on its own: {release.exception()!r}",
+                level="WARNING",
+                event="dedupe_error",
+                dedupe_key=key
+            )
+
+    async def flush(self) -> None:
+        # Keys stay visible in _flushing until the store has them.
+        self._flushing, self._pending = self._pending, {}
+        since = self._clock() - self.window_seconds
+        try:
+            if self.store.blocking:
+                await asyncio.to_thread(self._write, self._flushing, since)
+            else:
+                self._write(self._flushing, since)
+        except BaseException:
+            self._pending = {**self._flushing, **self._pending}
+            raise
+        finally:
+            self._flushing = {}
+
+    def _write(self, pending: Dict[str, float], since: float) -> None:
+        if pending:
+            self.store.add_many(pending.items())
+        self.store.expire(since, self.window_keys)
+
+    async def load(self) -> int:
+        # Refills the filter from the store, when its file outlives a
+        # previous run (local runs keep it in the working directory).
+        since = self._clock() - self.window_seconds
+
+        def fill() -> int:
+            count = 0
+            for key, at in self.store.keys(since):
+                self.filter.add(key, at)
+                count += 1
+            return count
+
+        return await asyncio.to_thread(fill) if self.store.blocking else fill()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._releasing:
+            await asyncio.wait(set(self._releasing))
+        if self.store.blocking:
+            await asyncio.to_thread(self.store.close)
+        else:
+            self.store.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lookups": self.lookups,
+            "duplicates": self.duplicates,
+            "false_positives": self.false_positives,
+            "in_flight": len(self._in_flight),
+            "filter_bytes": self.filter.nbytes,
+            "filter_error_rate": self.filter.error_rate
+        }
+
+def create_dedupe_index(
+    store_name: str,
+    path: str,
+    memory_bytes: int,
+    window_keys: int = 1_000_000,
+    window_seconds: float = 86400.0,
+    error_rate: float = 0.001,
+    claim_seconds: float = 300.0
+) -> DedupeIndex:
+    if store_name not in DEDUPE_STORES:
+        raise ValueError(f"Unknown dedupe store: {store_name}. Available: {list(DEDUPE_STORES.keys())}")
+
+    # The in-memory store shares the budget with the filter; sqlite keeps its
+    # keys on disk, so the filter may use all of it. Claims on the shared
+    # DynamoDB store never consult the filter, so it gets none.
+    budgets = {"memory": memory_bytes // 2, "dynamodb": 0}
+    bloom = GenerationalBloomFilter(
+        window_keys,
+        window_seconds,
+        error_rate=error_rate,
+        max_bytes=budgets.get(store_name, memory_bytes)
+    )
+    max_keys = min(window_keys, max(1, (memory_bytes - bloom.nbytes) // ENTRY_BYTES))
+    index = DedupeIndex(
+        DEDUPE_STORES[store_name](path, max_keys, window_seconds=window_seconds, claim_seconds=claim_seconds),
+        bloom,
+        window_keys=window_keys,
+        window_seconds=window_seconds
+    )
+
+    if index.store.shared:
+        detail = f"every claim checked in the shared {store_name} store"
+    else:
+        detail = f"filter {index.filter.nbytes / MIB:.1f}MiB, error rate {index.filter.error_rate:.2%}, {store_name} store"
+    log(
+        f"Dedupe index over {window_keys} keys / {window_seconds:.0f}s in {memory_bytes / MIB:.1f}MiB ({detail})",
+        event="dedupe_start",
+        store=store_name,
+        window_keys=window_keys,
+        window_seconds=window_seconds,
+        filter_bytes=index.filter.nbytes,
+        filter_error_rate=index.filter.error_rate
+    )
+    if store_name == "memory" and max_keys < window_keys:
+        log(
+            f"The memory budget holds only {max_keys} of the {window_keys} keys in the window; "
+            f"older keys are forgotten early (use the sqlite store to keep them all)",
+            level="WARNING",
+            event="dedupe_start"
+        )
+    return index
@@ -0,0 +1,262 @@
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from worker.sqs import CredentialProvider, sign_v4
+
+TARGET_PREFIX = "DynamoDB_20120810"
+MAX_WRITE_BATCH = 25
+# Worth another try after a pause; anything else goes back to the caller.
+RETRYABLE = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "InternalServerError",
+    "ServiceUnavailable"
+}
+
+class DynamoError(Exception):
+
+    def __init__(self, code: str, message: str, status: int = 0) -> None:
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.status = status
+
+def encode_value(value: Any) -> Dict[str, Any]:
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float)):
+        return {"N": repr(value)}
+    return {"S": str(value)}
+
+def decode_value(value: Dict[str, Any]) -> Any:
+    (kind, data), = value.items()
+    if kind == "N":
+        return float(data) if any(c in data for c in ".eE") else int(data)
+    if kind == "NULL":
+        return None
+    return data
+
+def encode_item(item: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    return {name: encode_value(value) for name, value in item.items()}
+
+def decode_item(item: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return {name: decode_value(value) for name, value in item.items()}
+
+class DynamoClient:
+    # The few DynamoDB JSON calls the shared stores need, over a small pool of
+    # keep-alive connections like SqsClient. Calls block, so async callers run
+    # them on threads. Without an endpoint_url it uses the regional endpoint,
+    # which the VPC's DynamoDB gateway endpoint routes.
+
+    def __init__(
+        self,
+        region: str,
+        endpoint_url: str = "",
+        max_connections: int = 8,
+        timeout: float = 10,
+        retries: int = 3,
+        credentials: Optional[CredentialProvider] = None
+    ) -> None:
+        parts = urlsplit(endpoint_url or f"https://dynamodb.{region}.amazonaws.com")
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported DynamoDB endpoint: {endpoint_url}")
+
+        self.host = parts.netloc
+        self.region = region
+        self.timeout = timeout
+        self.retries = retries
+        self.credentials = credentials or CredentialProvider()
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.requests = 0
+        self.connections_opened = 0
+
+    def call(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        # Throttling and server errors are retried with backoff; the signature
+        # carries a timestamp, so each attempt is signed afresh.
+        body = json.dumps(params).encode()
+        error: Optional[DynamoError] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(min(0.05 * 2 ** attempt, 2.0))
+            headers = {
+                "content-type": "application/x-amz-json-1.0",
+                "host": self.host,
+                "x-amz-target": f"{TARGET_PREFIX}.{action}"
+            }
+            credentials = self.credentials.get()
+            if credentials is not None:
+                sign_v4(headers, body, self.region, "dynamodb", credentials, datetime.now(timezone.utc))
+            try:
+                with self._slots:
+                    status, data = self._send(headers, body)
+            except (http.client.HTTPException, OSError):
+                if attempt == self.retries:
+                    raise
+                continue
+
+            self.requests += 1
+            try:
+                payload = json.loads(data) if data else {}
+            except ValueError:
+                payload = {}
+            if status == 200:
+                return payload
+            code = payload.get("__type", "").rpartition("#")[2] or f"HTTP{status}"
+            error = DynamoError(code, payload.get("message", payload.get("Message", "")), status)
+            if status < 500 and code not in RETRYABLE:
+                raise error
+        raise error
+
+    def _send(self, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            return self._exchange(self._connect(), headers, body)
+
+        try:
+            return self._exchange(connection, headers, body)
+        except (http.client.HTTPException, OSError):
+            return self._exchange(self._connect(), headers, body)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        self.connections_opened += 1
+        return self._connection_class(self.host, timeout=self.timeout)
+
+    def _exchange(self, connection: http.client.HTTPConnection, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        try:
+            connection.request("POST", "/", body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._idle.put(connection)
+        return response.status, data
+
+    def _conditional(self, action: str, params: Dict[str, Any]) -> bool:
+        # False when the condition did not hold.
+        try:
+            self.call(action, params)
+        except DynamoError as e:
+            if e.code == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+    def put_item(
+        self,
+        table: str,
+        item: Dict[str, Any],
+        condition: str = "",
+        names: Optional[Dict[str, str]] = None,
+        values: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        params = _expression_params(condition, names, values)
+        return self._conditional("PutItem", {"TableName": table, "Item": encode_item(item), **params})
+
+    def update_item(
+        self,
+        table: str,
+        key: Dict[str, Any],
+        update: str,
+        condition: str = "",
+        names: Optional[Dict[str, str]] = None,
+        values: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        params = _expression_params(condition, names, values)
+        return self._conditional(
+            "UpdateItem",
+            {"TableName": table, "Key": encode_item(key), "UpdateExpression": update, **params}
+        )
+
+    def delete_item(
+        self,
+        table: str,
+        key: Dict[str, Any],
+        condition: str = "",
+        names: Optional[Dict[str, str]] = None,
+        values: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        params = _expression_params(condition, names, values)
+        return self._conditional("DeleteItem", {"TableName": table, "Key": encode_item(key), **params})
+
+    def get_item(self, table: str, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        item = self.call("GetItem", {"TableName": table, "Key": encode_item(key), "ConsistentRead": True}).get("Item")
+        return decode_item(item) if item else None
+
+    def scan(
+        self,
+        table: str,
+        condition: str = "",
+        names: Optional[Dict[str, str]] = None,
+        values: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        params = {
+            "TableName": table,
+            "ConsistentRead": True,
+            **_expression_params(condition, names, values, kind="FilterExpression")
+        }
+        while True:
+            page = self.call("Scan", params)
+            for item in page.get("Items", []):
+                yield decode_item(item)
+            if not page.get("LastEvaluatedKey"):
+                return
+            params["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+    def put_many(self, table: str, items: List[Dict[str, Any]]) -> None:
+        # Unconditional puts, MAX_WRITE_BATCH at a time; items the service
+        # leaves unprocessed under load are sent again after a pause.
+        for start in range(0, len(items), MAX_WRITE_BATCH):
+            requests = [{"PutRequest": {"Item": encode_item(item)}} for item in items[start:start + MAX_WRITE_BATCH]]
+            for attempt in range(self.retries + 1):
+                unprocessed = self.call("BatchWriteItem", {"RequestItems": {table: requests}}).get("UnprocessedItems", {})
+                requests = unprocessed.get(table, [])
+                if not requests:
+                    break
+                if attempt == self.retries:
+                    raise DynamoError("UnprocessedItems", f"{len(requests)} writes to {table} left unprocessed")
+                time.sleep(min(0.05 * 2 ** attempt, 2.0))
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+def _expression_params(
+    condition: str,
+    names: Optional[Dict[str, str]],
+    values: Optional[Dict[str, Any]],
+    kind: str = "ConditionExpression"
+) -> Dict[str, Any]:
+    params: Dict[str, Any] = {}
+    if condition:
+        params[kind] = condition
+    if names:
+        params["ExpressionAttributeNames"] = names
+    if values:
+        params["ExpressionAttributeValues"] = encode_item(values)
+    return params
+
+def create_dynamo_client(region: Optional[str] = None) -> DynamoClient:
+    # AWS_ENDPOINT_URL_DYNAMODB points at a local stand-in, as it does for the
+    # AWS SDKs.
+    region = region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
+    return DynamoClient(region, endpoint_url=os.getenv("AWS_ENDPOINT_URL_DYNAMODB", ""))
@@ -0,0 +1,288 @@
+import argparse
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+# A stand-in for the slice of the DynamoDB JSON protocol the shared dedupe and
+# lease stores use, so several local workers can share them without AWS:
+#
+#   python3 -m worker.dynamodb_local --port 8000
+#   AWS_ENDPOINT_URL_DYNAMODB=http://127.0.0.1:8000 DEDUPE_STORE=dynamodb python3 app.py
+#
+# Tables are created on first use, keyed by "pk" unless CreateTable says
+# otherwise. Expressions cover comparisons, attribute_exists /
+# attribute_not_exists, AND / OR / NOT and parentheses; updates cover SET to
+# a value and REMOVE.
+
+DEFAULT_KEY = "pk"
+ERROR_PREFIX = "com.amazonaws.dynamodb.v20120810#"
+
+Response = Tuple[int, Dict[str, Any]]
+Item = Dict[str, Dict[str, Any]]
+
+_TOKEN = re.compile(r"\s*(<>|<=|>=|=|<|>|\(|\)|,|[#:]?[A-Za-z_][A-Za-z0-9_]*)")
+
+def _error(code: str, message: str) -> Response:
+    return 400, {"__type": f"{ERROR_PREFIX}{code}", "message": message}
+
+def _tokens(expression: str) -> List[str]:
+    tokens = []
+    position = 0
+    while position < len(expression.rstrip()):
+        match = _TOKEN.match(expression, position)
+        if match is None:
+            raise ValueError(f"Unsupported expression near {expression[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+def _compare(left: Optional[Dict[str, Any]], op: str, right: Optional[Dict[str, Any]]) -> bool:
+    if left is None or right is None:
+        return op == "<>" and left != right
+    if op == "=":
+        return left == right
+    if op == "<>":
+        return left != right
+    (left_kind, a), = left.items()
+    (right_kind, b), = right.items()
+    if left_kind != right_kind or left_kind not in ("N", "S"):
+        return False
+    if left_kind == "N":
+        a, b = float(a), float(b)
+    return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+class _Condition:
+    # Recursive descent over the tokens, evaluated against one item.
+
+    def __init__(self, expression: str, names: Dict[str, str], values: Item, item: Optional[Item]) -> None:
+        self.tokens = _tokens(expression)
+        self.index = 0
+        self.names = names
+        self.values = values
+        self.item = item or {}
+
+    def evaluate(self) -> bool:
+        result = self._or()
+        if self.index != len(self.tokens):
+            raise ValueError(f"Unexpected {self.tokens[self.index]!r} in condition")
+        return result
+
+    def _peek(self) -> str:
+        return self.tokens[self.index] if self.index < len(self.tokens) else ""
+
+    def _take(self, expected: Optional[str] = None) -> str:
+        token = self._peek()
+        if not token or (expected is not None and token.upper() != expected):
+            raise ValueError(f"Expected {expected or 'more'} in condition, got {token!r}")
+        self.index += 1
+        return token
+
+    def _or(self) -> bool:
+        result = self._and()
+        while self._peek().upper() == "OR":
+            self._take()
+            right = self._and()
+            result = result or right
+        return result
+
+    def _and(self) -> bool:
+        result = self._not()
+        while self._peek().upper() == "AND":
+            self._take()
+            right = self._not()
+            result = result and right
+        return result
+
+    def _not(self) -> bool:
+        if self._peek().upper() == "NOT":
+            self._take()
+            return not self._not()
+        return self._primary()
+
+    def _primary(self) -> bool:
+        token = self._take()
+        if token == "(":
+            result = self._or()
+            self._take(")")
+            return result
+        if token in ("attribute_exists", "attribute_not_exists"):
+            self._take("(")
+            name = self._name(self._take())
+            self._take(")")
+            return (name in self.item) == (token == "attribute_exists")
+        left = self._operand(token)
+        op = self._take()
+        if op not in ("=", "<>", "<", "<=", ">", ">="):
+            raise ValueError(f"Unsupported comparator {op!r}")
+        return _compare(left, op, self._operand(self._take()))
+
+    def _name(self, token: str) -> str:
+        return self.names[token] if token.startswith("#") else token
+
+    def _operand(self, token: str) -> Optional[Dict[str, Any]]:
+        if token.startswith(":"):
+            return self.values[token]
+        return self.item.get(self._name(token))
+
+def matches(expression: str, names: Dict[str, str], values: Item, item: Optional[Item]) -> bool:
+    return not expression or _Condition(expression, names, values, item).evaluate()
+
+def apply_update(expression: str, names: Dict[str, str], values: Item, item: Item) -> None:
+    action = ""
+    tokens = _tokens(expression)
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token.upper() in ("SET", "REMOVE"):
+            action = token.upper()
+            index += 1
+            continue
+        name = names[token] if token.startswith("#") else token
+        if action == "SET":
+            if tokens[index + 1] != "=" or not tokens[index + 2].startswith(":"):
+                raise ValueError(f"Unsupported SET clause at {token!r}")
+            item[name] = values[tokens[index + 2]]
+            index += 3
+        elif action == "REMOVE":
+            item.pop(name, None)
+            index += 1
+        else:
+            raise ValueError(f"Unsupported update expression {expression!r}")
+        if index < len(tokens) and tokens[index] == ",":
+            index += 1
+
+class LocalDynamo:
+
+    def __init__(self) -> None:
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _table(self, name: str, key: str = DEFAULT_KEY) -> Dict[str, Any]:
+        if name not in self.tables:
+            self.tables[name] = {"key": key, "items": {}}
+        return self.tables[name]
+
+    def dispatch(self, action: str, params: Dict[str, Any]) -> Response:
+        with self._lock:
+            self.requests += 1
+            return self._dispatch(action, params)
+
+    def _dispatch(self, action: str, params: Dict[str, Any]) -> Response:
+        if action == "CreateTable":
+            key = next(entry["AttributeName"] for entry in params["KeySchema"] if entry["KeyType"] == "HASH")
+            self._table(params["TableName"], key)
+            return 200, {"TableDescription": {"TableName": params["TableName"], "TableStatus": "ACTIVE"}}
+
+        if action == "BatchWriteItem":
+            for name, requests in params["RequestItems"].items():
+                table = self._table(name)
+                for request in requests:
+                    if "PutRequest" in request:
+                        item = request["PutRequest"]["Item"]
+                        table["items"][json.dumps(item[table["key"]], sort_keys=True)] = item
+                    else:
+                        key = request["DeleteRequest"]["Key"]
+                        table["items"].pop(json.dumps(key[table["key"]], sort_keys=True), None)
+            return 200, {"UnprocessedItems": {}}
+
+        table = self._table(params["TableName"])
+        names = params.get("ExpressionAttributeNames", {})
+        values = params.get("ExpressionAttributeValues", {})
+
+        if action == "Scan":
+            condition = params.get("FilterExpression", "")
+            items = [item for item in table["items"].values() if matches(condition, names, values, item)]
+            return 200, {"Items": items, "Count": len(items)}
+
+        key_value = (params["Item"] if action == "PutItem" else params["Key"])[table["key"]]
+        slot = json.dumps(key_value, sort_keys=True)
+        current = table["items"].get(slot)
+
+        if action == "GetItem":
+            return 200, {"Item": current} if current is not None else {}
+        if not matches(params.get("ConditionExpression", ""), names, values, current):
+            return _error("ConditionalCheckFailedException", "The conditional request failed")
+        if action == "PutItem":
+            table["items"][slot] = params["Item"]
+            return 200, {}
+        if action == "DeleteItem":
+            table["items"].pop(slot, None)
+            return 200, {}
+        if action == "UpdateItem":
+            item = dict(current or {table["key"]: key_value})
+            apply_update(params["UpdateExpression"], names, values, item)
+            table["items"][slot] = item
+            return 200, {}
+        return _error("UnknownOperationException", f"Unsupported action {action}")
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+            action = self.headers.get("X-Amz-Target", "").rpartition(".")[2]
+            status, payload = self.server.dynamo.dispatch(action, params)
+        except (ValueError, KeyError, TypeError, StopIteration) as e:
+            status, payload = _error("ValidationException", str(e))
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-amz-json-1.0")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+class LocalDynamoServer:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.dynamo = LocalDynamo()
+        self._server = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.dynamo = self.dynamo
+        self.host, self.port = self._server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "LocalDynamoServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-dynamodb", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local DynamoDB stand-in for the shared stores")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = LocalDynamoServer(args.host, args.port)
+    print(f"Local DynamoDB listening, AWS_ENDPOINT_URL_DYNAMODB={server.endpoint_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import asyncio
+import ctypes
+import functools
+import os
+import struct
+from typing import Any, Optional
+
+from worker.logwriter import log
+
+# inotify(7) flags
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_EVENT = struct.Struct("iIII")
+
+@functools.lru_cache(maxsize=None)
+def _libc() -> Optional[Any]:
+    try:
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class FileWatcher:
+    # Sets `changed` when the file is written, created or moved into place,
+    # so a follower can sleep long while idle and still look as soon as
+    # something is appended. Watches the directory, since the file may not
+    # exist yet or may be replaced. Linux only: create() returns None
+    # elsewhere and callers poll alone. Network filesystems (EFS, NFS) do not
+    # report writes made from other hosts, so there the poll ceiling still
+    # bounds how late a change is seen.
+
+    def __init__(self, path: str, fd: int) -> None:
+        self.path = path
+        self.name = os.path.basename(path).encode()
+        self.changed = asyncio.Event()
+        self.events = 0
+        self._fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._read)
+
+    @classmethod
+    def create(cls, path: str) -> Optional["FileWatcher"]:
+        libc = _libc()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            log(f"Not watching {path}: inotify_init1 failed ({os.strerror(ctypes.get_errno())})", level="WARNING")
+            return None
+        directory = os.path.dirname(os.path.abspath(path))
+        if libc.inotify_add_watch(fd, directory.encode(), WATCH_MASK) < 0:
+            log(f"Not watching {path}: inotify_add_watch failed ({os.strerror(ctypes.get_errno())})", level="WARNING")
+            os.close(fd)
+            return None
+        return cls(path, fd)
+
+    def _read(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            log(f"Stopped watching {self.path}: {e}", level="WARNING")
+            self.close()
+            return
+
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            # An overflowed queue may have dropped our file's events.
+            if name == self.name or mask & IN_Q_OVERFLOW:
+                self.events += 1
+                self.changed.set()
+
+    def close(self) -> None:
+        if self._fd < 0:
+            return
+        asyncio.get_running_loop().remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = -1
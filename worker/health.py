@@ -0,0 +1,171 @@
+import asyncio
+import json
+import socket
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from worker.logwriter import log
+
+Response = Tuple[int, Dict[str, Any]]
+RouteHandler = Callable[[Dict[str, str]], Awaitable[Response]]
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    500: "Internal Server Error",
+    503: "Service Unavailable"
+}
+
+class HealthState:
+    # Liveness: the heartbeat keeps ticking. Readiness: every registered check
+    # passes. /healthz also fails until the task has been ready once, so ECS
+    # only reports a new task HEALTHY after warm-up.
+
+    def __init__(self, max_tick_age: float) -> None:
+        self.max_tick_age = max_tick_age
+        self.started = time.monotonic()
+        self.last_tick: Optional[float] = None
+        self.ever_ready = False
+        self._checks: Dict[str, bool] = {}
+
+    def mark_tick(self) -> None:
+        self.last_tick = time.monotonic()
+
+    def set_check(self, name: str, ok: bool) -> None:
+        self._checks[name] = ok
+        if self.ready:
+            self.ever_ready = True
+
+    def tick_age(self) -> Optional[float]:
+        if self.last_tick is None:
+            return None
+        return time.monotonic() - self.last_tick
+
+    @property
+    def live(self) -> bool:
+        age = self.tick_age()
+        return age is not None and age <= self.max_tick_age
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._checks) and all(self._checks.values())
+
+    def liveness(self) -> Response:
+        age = self.tick_age()
+        ok = self.live and self.ever_ready
+        return (200 if ok else 503), {
+            "status": "ok" if ok else "unhealthy",
+            "last_tick_age_seconds": None if age is None else round(age, 3),
+            "max_tick_age_seconds": self.max_tick_age,
+            "started": self.ever_ready,
+            "uptime_seconds": round(time.monotonic() - self.started, 3)
+        }
+
+    def readiness(self) -> Response:
+        ok = self.ready and self.live
+        return (200 if ok else 503), {
+            "status": "ready" if ok else "not_ready",
+            "live": self.live,
+            "checks": dict(self._checks)
+        }
+
+class HealthServer:
+
+    def __init__(self, state: HealthState, host: str = "127.0.0.1", port: int = 8080) -> None:
+        self.state = state
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._routes: Dict[str, RouteHandler] = {
+            "/healthz": self._liveness,
+            "/readyz": self._readiness
+        }
+
+    def add_route(self, path: str, handler: RouteHandler) -> None:
+        self._routes[path] = handler
+
+    async def _liveness(self, query: Dict[str, str]) -> Response:
+        return self.state.liveness()
+
+    async def _readiness(self, query: Dict[str, str]) -> Response:
+        return self.state.readiness()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log(f"Health endpoint listening on {self.host}:{self.port}", event="health_start", port=self.port)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+            method, target = parts[0], parts[1]
+            path, _, query_string = target.partition("?")
+            query = dict(item.partition("=")[::2] for item in query_string.split("&") if item)
+
+            handler = self._routes.get(path)
+            if handler is None:
+                status, body = 404, {"error": f"no route for {path}"}
+            elif method != "GET":
+                status, body = 405, {"error": f"{method} not allowed"}
+            else:
+                try:
+                    status, body = await handler(query)
+                except Exception as e:
+                    status, body = 500, {"error": str(e)}
+
+            payload = json.dumps(body).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+def probe(
+    url_path: str = "/healthz",
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    timeout: float = 3.0,
+    quiet: bool = False
+) -> int:
+    # Used by the container health check; plain sockets keep it cheap to start.
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as conn:
+            conn.sendall(f"GET {url_path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+            status_line = conn.makefile("rb").readline().decode("latin-1").split()
+    except OSError as e:
+        if not quiet:
+            print(f"Health probe failed: {e}")
+        return 1
+
+    if len(status_line) >= 2 and status_line[1] == "200":
+        return 0
+    if not quiet:
+        print(f"Health probe returned {' '.join(status_line[1:]) or 'nothing'}")
+    return 1
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "/healthz"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+    sys.exit(probe(path, port=port))
@@ -0,0 +1,462 @@
+import asyncio
+import json
+import random
+import ssl
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from worker.logwriter import log
+from worker.metrics import get_metrics
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+RETRY_STATUSES = (429, 502, 503, 504)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class HttpError(Exception):
+    pass
+
+class CircuitOpenError(HttpError):
+    pass
+
+class HttpResponse:
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+class TokenBucket:
+    # rate tokens per second, up to burst banked while idle.
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Need rate > 0 and burst >= 1, got {rate} and {burst}")
+
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        # Callers queue on the lock, so tokens are handed out in arrival order.
+        async with self._lock:
+            self._refill()
+            waited = 0.0
+            if self._tokens < 1:
+                waited = (1 - self._tokens) / self.rate
+                await asyncio.sleep(waited)
+                self._refill()
+            self._tokens -= 1
+            return waited
+
+class CircuitBreaker:
+    # Opens after failure_threshold consecutive failures and fails calls fast
+    # for reset_timeout; then lets one trial call through to decide whether to
+    # close again.
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def abandon(self) -> None:
+        # A trial call was cancelled before it could tell us anything.
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self._opened_at = self._clock()
+
+class _Connection:
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        self.writer.close()
+
+class HostPool:
+    # At most `limit` requests in flight to one host, each on a keep-alive
+    # connection reused most-recently-used first.
+
+    def __init__(self, host: str, port: int, tls: bool, limit: int, idle_timeout: float, keep_alive: bool = True) -> None:
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+        self._ssl = ssl.create_default_context() if tls else None
+        self._slots = asyncio.Semaphore(limit)
+        self._idle: Deque[_Connection] = deque()
+        self.connections_opened = 0
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self._ssl)
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    def _take_idle(self) -> Optional[_Connection]:
+        now = time.monotonic()
+        while self._idle:
+            connection = self._idle.pop()
+            if now - connection.last_used < self.idle_timeout and not connection.reader.at_eof():
+                return connection
+            connection.close()
+        return None
+
+    def _put_back(self, connection: _Connection, reusable: bool) -> None:
+        if reusable and self.keep_alive:
+            connection.last_used = time.monotonic()
+            self._idle.append(connection)
+        else:
+            connection.close()
+
+    async def exchange(self, request: bytes, method: str, replay: bool) -> HttpResponse:
+        async with self._slots:
+            connection = self._take_idle()
+            if connection is not None:
+                try:
+                    return await self._exchange_on(connection, request, method)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # Most likely the server closed the idle connection, but the
+                    # request may have reached it all the same; only a request
+                    # that is safe to repeat is sent again on a new one.
+                    if not replay:
+                        raise
+            return await self._exchange_on(await self._connect(), request, method)
+
+    async def _exchange_on(self, connection: _Connection, request: bytes, method: str) -> HttpResponse:
+        try:
+            connection.writer.write(request)
+            await connection.writer.drain()
+            response, reusable = await _read_response(connection.reader, method)
+        except BaseException:
+            connection.close()
+            raise
+        self._put_back(connection, reusable)
+        return response
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop().close()
+
+async def _read_response(reader: asyncio.StreamReader, method: str) -> Tuple[HttpResponse, bool]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise asyncio.IncompleteReadError(b"", None)
+    version, _, rest = status_line.decode("latin-1").partition(" ")
+    status = int(rest[:3])
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    reusable = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        body = b""
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        parts = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                break
+            parts.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        body = b"".join(parts)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        reusable = False
+    return HttpResponse(status, headers, body), reusable
+
+class HttpClient:
+    # One per process (get_http_client). Per endpoint (the host unless the
+    # caller names one): a token bucket, a circuit breaker and a latency
+    # histogram. Identical GETs in flight at the same time share one request.
+
+    def __init__(
+        self,
+        max_per_host: int = 10,
+        timeout: float = 10.0,
+        retries: int = 3,
+        backoff_base: float = 0.1,
+        backoff_max: float = 2.0,
+        retry_after_max: float = 30.0,
+        rate_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0,
+        idle_timeout: float = 30.0,
+        keep_alive: bool = True
+    ) -> None:
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # A server's Retry-After is honoured up to this; a longer wait is not
+        # waited out, the response goes back to the caller instead.
+        self.retry_after_max = retry_after_max
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.idle_timeout = idle_timeout
+        self.keep_alive = keep_alive
+        self._pools: Dict[Tuple[str, int, bool], HostPool] = {}
+        self._limiters = {
+            endpoint: TokenBucket(rate, burst) for endpoint, (rate, burst) in (rate_limits or {}).items()
+        }
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._inflight: Dict[Tuple[Any, ...], asyncio.Task] = {}
+        self.requests_sent = 0
+        self.coalesced = 0
+        self._retries_metric = get_metrics().counter("HttpRetries")
+        self._rejected_metric = get_metrics().counter("HttpCircuitOpenRejections")
+
+    @property
+    def connections_opened(self) -> int:
+        return sum(pool.connections_opened for pool in self._pools.values())
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(self.breaker_failures, self.breaker_reset)
+        return breaker
+
+    def _pool(self, host: str, port: int, tls: bool) -> HostPool:
+        pool = self._pools.get((host, port, tls))
+        if pool is None:
+            pool = HostPool(host, port, tls, self.max_per_host, self.idle_timeout, self.keep_alive)
+            self._pools[(host, port, tls)] = pool
+        return pool
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, endpoint: Optional[str] = None) -> HttpResponse:
+        key = ("GET", url, tuple(sorted((headers or {}).items())), endpoint)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.request("GET", url, headers=headers, endpoint=endpoint))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        # Shielded so one caller giving up does not cancel the others' request.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Tuple[Any, ...], task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        # Retrieve the outcome so an error nobody awaited any more is not
+        # reported as never retrieved.
+        if not task.cancelled():
+            task.exception()
+
+    async def post(
+        self,
+        url: str,
+        json_body: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        endpoint: Optional[str] = None,
+        retry: bool = False
+    ) -> HttpResponse:
+        return await self.request("POST", url, headers=headers, json_body=json_body, endpoint=endpoint, retry=retry)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: bytes = b"",
+        json_body: Any = None,
+        endpoint: Optional[str] = None,
+        retry: Optional[bool] = None
+    ) -> HttpResponse:
+        parts = urlsplit(url)
+        tls = parts.scheme == "https"
+        host = parts.hostname or ""
+        port = parts.port or (443 if tls else 80)
+        endpoint = endpoint or parts.netloc
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers = {"Content-Type": "application/json", **(headers or {})}
+        request = _encode_request(method, parts, headers or {}, body, self.keep_alive)
+
+        pool = self._pool(host, port, tls)
+        breaker = self.breaker(endpoint)
+        limiter = self._limiters.get(endpoint)
+        latency = get_metrics().histogram(f"HttpLatency.{endpoint}")
+        attempts = self.retries + 1 if retry else 1
+        started = time.monotonic()
+
+        attempt = 0
+        error: Optional[BaseException] = None
+        while True:
+            if not breaker.allow():
+                self._rejected_metric.inc()
+                raise CircuitOpenError(f"Circuit for {endpoint} is open") from error
+
+            error = None
+            response: Optional[HttpResponse] = None
+            try:
+                if limiter is not None:
+                    await limiter.acquire()
+                self.requests_sent += 1
+                response = await asyncio.wait_for(pool.exchange(request, method, retry), timeout=self.timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                error = e
+            except BaseException:
+                # Cancelled, or failed in a way that says nothing about the
+                # endpoint: a half-open trial must not stay marked as running.
+                breaker.abandon()
+                raise
+
+            # 429 means the endpoint is up but throttling; it does not count
+            # towards opening the circuit.
+            if response is None or response.status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            retryable = response is None or response.status in RETRY_STATUSES
+            delay = self._backoff(attempt, response) if retryable and attempt + 1 < attempts else None
+            if delay is None:
+                latency.record(time.monotonic() - started)
+                if response is None:
+                    raise HttpError(f"{method} {url} failed: {error!r}") from error
+                return response
+
+            self._retries_metric.inc()
+            log(
+                f"Retrying {method} {endpoint} in {delay:.2f}s after "
+                f"{response.status if response is not None else repr(error)}",
+                level="WARNING",
+                event="http_retry",
+                endpoint=endpoint,
+                attempt=attempt + 1
+            )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, response: Optional[HttpResponse]) -> Optional[float]:
+        # Full jitter, unless the server said how long to wait. None: the
+        # server asked for longer than retry_after_max, so give up now.
+        if response is not None:
+            retry_after = _retry_after_seconds(response.headers.get("retry-after", ""))
+            if retry_after is not None:
+                return retry_after if retry_after <= self.retry_after_max else None
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def close(self) -> None:
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+def _retry_after_seconds(value: str) -> Optional[float]:
+    # Either delay-seconds or an HTTP date.
+    value = value.strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def _encode_request(method: str, parts: Any, headers: Dict[str, str], body: bytes, keep_alive: bool) -> bytes:
+    target = parts.path or "/"
+    if parts.query:
+        target = f"{target}?{parts.query}"
+    lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}"]
+    names = {name.lower() for name in headers}
+    if "user-agent" not in names:
+        lines.append("User-Agent: hcm-poc-worker")
+    if body or method in ("POST", "PUT", "PATCH"):
+        lines.append(f"Content-Length: {len(body)}")
+    if not keep_alive:
+        lines.append("Connection: close")
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    # "payroll.example.com=50:100,hr-api=20" -> {endpoint: (rate, burst)}; the
+    # burst defaults to the rate.
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        endpoint, _, value = item.partition("=")
+        rate, _, burst = value.partition(":")
+        limits[endpoint.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+_client: Optional[HttpClient] = None
+
+def configure_http_client(**kwargs: Any) -> HttpClient:
+    global _client
+    _client = HttpClient(**kwargs)
+    return _client
+
+def get_http_client() -> HttpClient:
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,154 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# A local stand-in for a downstream HR/payroll API, to exercise HttpClient
+# without the real services:
+#
+#   python3 -m worker.http_stub --port 9380
+#
+#   GET  /ok?delay_ms=20&size=512   200 after a delay, with a padded JSON body
+#   GET  /status/503                that status
+#   GET  /flaky?fail=2&key=k        503 (Retry-After: 0) for the first `fail`
+#                                   requests with this key, then 200
+#   POST /echo                      the request body back
+#   GET  /employees/<id>            a reference record (also /org_units/,
+#                                   /pay_grades/); ids starting "missing" 404
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+REFERENCE_KINDS = ("employees", "org_units", "pay_grades")
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self) -> None:
+        self._respond(self.server.stub.handle("GET", self.path, b""))
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        self._respond(self.server.stub.handle("POST", self.path, self.rfile.read(length)))
+
+    def _respond(self, response: Response) -> None:
+        status, headers, body = response
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+class _StubServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops SYNs when a pool opens its
+    # connections in a burst, and each drop costs a 1s retransmit.
+    request_queue_size = 128
+    daemon_threads = True
+
+class HttpStub:
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def handle(self, method: str, path: str, body: bytes) -> Response:
+        with self._lock:
+            self.requests += 1
+            count = self.requests
+        parts = urlsplit(path)
+        query = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        json_headers = {"Content-Type": "application/json"}
+
+        if parts.path == "/ok":
+            delay_ms = float(query.get("delay_ms", 0))
+            if delay_ms:
+                time.sleep(delay_ms / 1000)
+            payload = {"path": parts.path, "request": count, "padding": "x" * int(query.get("size", 0))}
+            return 200, json_headers, json.dumps(payload).encode()
+
+        if parts.path.startswith("/status/"):
+            status = int(parts.path.rpartition("/")[2])
+            return status, json_headers, json.dumps({"status": status}).encode()
+
+        if parts.path == "/flaky":
+            key = query.get("key", "")
+            with self._lock:
+                seen = self._failures.get(key, 0)
+                self._failures[key] = seen + 1
+            if seen < int(query.get("fail", 1)):
+                return 503, {"Retry-After": "0", **json_headers}, b'{"error": "unavailable"}'
+            return 200, json_headers, json.dumps({"attempts": seen + 1}).encode()
+
+        kind, _, key = parts.path.strip("/").partition("/")
+        if kind in REFERENCE_KINDS and key and method == "GET":
+            if key.startswith("missing"):
+                return 404, json_headers, b'{"error": "not found"}'
+            return 200, json_headers, json.dumps({"id": key, "kind": kind, "name": f"{kind}-{key}"}).encode()
+
+        if parts.path == "/echo" and method == "POST":
+            return 200, {"Content-Type": "application/octet-stream"}, body
+
+        return 404, json_headers, b'{"error": "not found"}'
+
+class HttpStubServer:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.stub = HttpStub()
+        self._server = _StubServer((host, port), _StubHandler)
+        self._server.stub = self.stub
+        self._server.lock = threading.Lock()
+        self._server.connections = 0
+        self.host, self.port = self._server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def connections(self) -> int:
+        return self._server.connections
+
+    def url(self, path: str) -> str:
+        return f"http://{self.host}:{self.port}{path}"
+
+    def start(self) -> "HttpStubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="http-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stub of a downstream HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9380)
+    args = parser.parse_args()
+
+    server = HttpStubServer(args.host, args.port)
+    print(f"HTTP stub listening on {server.url('/')}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import asyncio
+import functools
+import json
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from worker.filewatch import FileWatcher
+from worker.logwriter import log
+from worker.polling import AdaptivePoller
+from worker.scheduler import SchedulerStopped, TaskScheduler
+
+# A handler may return a future that resolves once the record's results are
+# written; the record only counts as done after that.
+RecordHandler = Callable[[Any], Awaitable[Any]]
+
+class JsonlReader:
+    # Reads fixed-size chunks and yields (record, end_offset) pairs, so memory
+    # stays at one chunk plus one line however large the file is.
+
+    def __init__(self, path: str, start_offset: int = 0, chunk_size: int = 1024 * 1024) -> None:
+        self.path = path
+        self.start_offset = start_offset
+        self.chunk_size = chunk_size
+        self.records = 0
+        self.malformed = 0
+        self.torn_tail = False
+        # End of the last complete line read, including skipped ones.
+        self.position = start_offset
+
+    def __iter__(self) -> Iterator[Tuple[Any, int]]:
+        with open(self.path, "rb") as f:
+            f.seek(self.start_offset)
+            position = self.start_offset
+            remainder = b""
+
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+
+                lines = (remainder + chunk).split(b"\n")
+                remainder = lines.pop()
+
+                for line in lines:
+                    line_start = position
+                    position += len(line) + 1
+                    self.position = position
+                    record = self._parse(line, line_start)
+                    if record is not None:
+                        yield record, position
+
+            if remainder.strip():
+                try:
+                    record = json.loads(remainder)
+                except ValueError:
+                    # A writer may still be appending this line; leave the offset
+                    # before it so the next run reads it again once it is complete.
+                    self.torn_tail = True
+                    log(
+                        f"Stopping before incomplete last line in {self.path} at offset {position}",
+                        level="WARNING",
+                        offset=position
+                    )
+                    return
+                self.records += 1
+                self.position = position + len(remainder)
+                yield record, self.position
+
+    def _parse(self, line: bytes, offset: int) -> Any:
+        if not line.strip():
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            self.malformed += 1
+            log(f"Skipping malformed line in {self.path} at offset {offset}: {e}", level="WARNING", offset=offset)
+            return None
+        self.records += 1
+        return record
+
+class OffsetTracker:
+    # Records finish out of order; only the prefix that is fully done is safe
+    # to resume from. A record whose results are still being written is done
+    # once they are.
+
+    def __init__(self, start_offset: int = 0) -> None:
+        self.committed = start_offset
+        self.saved = start_offset
+        # End of the last record handed out: where reading carries on.
+        self.position = start_offset
+        self.completed = 0
+        self.unwritten: Set[asyncio.Future] = set()
+        self._pending: Deque[List[Any]] = deque()
+        self._by_offset: Dict[int, List[Any]] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def begin(self, end_offset: int) -> None:
+        entry = [end_offset, False]
+        self._pending.append(entry)
+        self._by_offset[end_offset] = entry
+        self.position = end_offset
+
+    def complete(self, end_offset: int) -> None:
+        self._by_offset.pop(end_offset)[1] = True
+        self.completed += 1
+        self._advance()
+
+    def complete_when(self, end_offset: int, durable: asyncio.Future) -> None:
+        if durable.done():
+            self._written(end_offset, durable)
+            return
+        self.unwritten.add(durable)
+        durable.add_done_callback(self.unwritten.discard)
+        durable.add_done_callback(functools.partial(self._written, end_offset))
+
+    def _written(self, end_offset: int, durable: asyncio.Future) -> None:
+        # A record whose results were lost stays pending, like a cancelled one.
+        if not durable.cancelled() and durable.exception() is None:
+            self.complete(end_offset)
+
+    def skip(self, end_offset: int) -> None:
+        # Lines with no record in them, e.g. malformed ones after the last
+        # record: done as soon as everything before them is.
+        if end_offset <= self.position:
+            return
+        self._pending.append([end_offset, True])
+        self.position = end_offset
+        self._advance()
+
+    def save(self, offset_store: "OffsetStore") -> None:
+        self._compact()
+        if self.committed != self.saved:
+            offset_store.save(self.committed)
+            self.saved = self.committed
+
+    def _advance(self) -> None:
+        while self._pending and self._pending[0][1]:
+            self.committed = self._pending.popleft()[0]
+
+    def _compact(self) -> None:
+        # Behind a record that failed, finished ones pile up for as long as
+        # a follower runs; only the last of each finished run is needed.
+        compacted: Deque[List[Any]] = deque()
+        for entry in self._pending:
+            if entry[1] and compacted and compacted[-1][1]:
+                compacted[-1] = entry
+            else:
+                compacted.append(entry)
+        self._pending = compacted
+
+class OffsetStore:
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(self) -> int:
+        try:
+            with open(self.path, "r") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            log(f"Ignoring unreadable offset file {self.path}", level="WARNING")
+            return 0
+
+    def save(self, offset: int) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+async def ingest_jsonl(
+    path: str,
+    scheduler: TaskScheduler,
+    handler: RecordHandler,
+    offset_store: OffsetStore,
+    chunk_size: int = 1024 * 1024,
+    commit_every: int = 1000,
+    stop: Optional[asyncio.Event] = None,
+    tracker: Optional[OffsetTracker] = None
+) -> JsonlReader:
+    # stop ends this ingestion alone, e.g. when its shard is handed over,
+    # while the scheduler keeps running. With a tracker (follow_jsonl), reading
+    # carries on where the last call stopped and results still being written
+    # are not waited for: they complete on the tracker, which the caller saves.
+    def stopping() -> bool:
+        return scheduler.stopping or (stop is not None and stop.is_set())
+
+    following = tracker is not None
+    if tracker is None:
+        start_offset = offset_store.load()
+        if start_offset > os.path.getsize(path):
+            log(f"Offset {start_offset} is past the end of {path}, starting from the beginning", level="WARNING")
+            start_offset = 0
+        tracker = OffsetTracker(start_offset)
+    start_offset = tracker.position
+
+    reader = JsonlReader(path, start_offset=start_offset, chunk_size=chunk_size)
+    in_flight: Set[asyncio.Task] = set()
+    completed = tracker.completed
+
+    async def process(record: Any, end_offset: int) -> None:
+        # A record that failed or was cancelled stays pending, so the saved
+        # offset never moves past it and a restart reads it again.
+        durable = await handler(record)
+        if isinstance(durable, asyncio.Future):
+            tracker.complete_when(end_offset, durable)
+        else:
+            tracker.complete(end_offset)
+
+    log(f"Ingesting {path} from offset {start_offset}", event="ingest_start", offset=start_offset)
+
+    try:
+        previous_offset = start_offset
+        for count, (record, end_offset) in enumerate(reader, start=1):
+            if stopping():
+                break
+
+            # submit() blocks while the scheduler is full, which pauses reading.
+            try:
+                task = await scheduler.submit(
+                    process, record, end_offset, name="ingest", size=end_offset - previous_offset
+                )
+            except SchedulerStopped:
+                break
+            previous_offset = end_offset
+            tracker.begin(end_offset)
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+            if count % commit_every == 0:
+                await asyncio.sleep(0)
+                tracker.save(offset_store)
+
+        if in_flight:
+            await asyncio.wait(set(in_flight))
+        if not following and tracker.unwritten:
+            await asyncio.wait(set(tracker.unwritten))
+        if not stopping():
+            # Skipped lines after the last record would otherwise be re-read
+            # on every resume.
+            tracker.skip(reader.position)
+    finally:
+        tracker.save(offset_store)
+
+    log(
+        f"Ingested {tracker.completed - completed} records from {path}",
+        event="ingest_done",
+        records=tracker.completed - completed,
+        unwritten=len(tracker.unwritten),
+        read=reader.records,
+        malformed=reader.malformed,
+        torn_tail=reader.torn_tail,
+        offset=tracker.committed
+    )
+    return reader
+
+async def follow_jsonl(
+    path: str,
+    scheduler: TaskScheduler,
+    handler: RecordHandler,
+    offset_store: OffsetStore,
+    poller: AdaptivePoller,
+    chunk_size: int = 1024 * 1024,
+    stop: Optional[asyncio.Event] = None,
+    watch: bool = True
+) -> None:
+    # Keeps ingesting whatever is appended to the file. A look that finds new
+    # records is followed straight away by the next; empty looks back off, and
+    # a file watcher, where there is one, ends the wait once the file changes.
+    # Records are acked as their results get written, not within the look, so
+    # output batching never holds up picking up new lines.
+    def stopping() -> bool:
+        return scheduler.stopping or (stop is not None and stop.is_set())
+
+    tracker = OffsetTracker(offset_store.load())
+    watcher = FileWatcher.create(path) if watch else None
+    last_size = -1
+    try:
+        while not stopping():
+            found = 0
+            if watcher is not None:
+                watcher.changed.clear()
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size < tracker.position:
+                log(f"{path} is shorter than offset {tracker.position}, starting from the beginning", level="WARNING")
+                tracker = OffsetTracker(0)
+            # An unchanged size means nothing new, even if an incomplete last
+            # line keeps it ahead of the offset.
+            if size != last_size and size != tracker.position:
+                reader = await ingest_jsonl(
+                    path, scheduler, handler, offset_store, chunk_size=chunk_size, stop=stop, tracker=tracker
+                )
+                found = reader.records
+            last_size = size
+            tracker.save(offset_store)
+
+            mode = poller.mode
+            delay = poller.record(found)
+            if poller.mode != mode:
+                log(
+                    f"Intake is {poller.mode}, next look in {delay:.1f}s",
+                    event="intake_mode",
+                    mode=poller.mode,
+                    interval=delay
+                )
+            if delay <= 0:
+                continue
+            if watcher is None:
+                await _wait_stopped(scheduler, stop, delay)
+                continue
+            # A change ends the wait, but not before min_interval, so a burst
+            # of appends is picked up in a few looks rather than one per line.
+            await _wait_stopped(scheduler, stop, min(delay, poller.min_interval))
+            if delay > poller.min_interval and not stopping():
+                await _wait_stopped(scheduler, stop, delay - poller.min_interval, watcher.changed)
+
+        # At shutdown the output is closed before intake is waited for, so
+        # these resolve (or fail) promptly.
+        if tracker.unwritten:
+            await asyncio.wait(set(tracker.unwritten))
+    finally:
+        if watcher is not None:
+            watcher.close()
+        tracker.save(offset_store)
+
+async def _wait_stopped(
+    scheduler: TaskScheduler,
+    stop: Optional[asyncio.Event],
+    timeout: float,
+    changed: Optional[asyncio.Event] = None
+) -> None:
+    events = [event for event in (stop, changed) if event is not None]
+    if not events:
+        await scheduler.wait_stopped(timeout=timeout)
+        return
+
+    waiters = {asyncio.ensure_future(scheduler.wait_stopped()), *(asyncio.ensure_future(event.wait()) for event in events)}
+    await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    for waiter in waiters:
+        waiter.cancel()
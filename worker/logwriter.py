@@ -0,0 +1,146 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, List, Optional, TextIO
+
+_encode = json.JSONEncoder(separators=(",", ":"), default=str).encode
+
+class LogWriter:
+    # Callers only append to an in-memory batch; a background thread turns
+    # each batch into a single write() so the event loop never waits on stdout.
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        max_batch_bytes: int = 64 * 1024,
+        flush_interval: float = 0.5,
+        max_pending_lines: int = 50000
+    ) -> None:
+        self._stream = stream
+        self.max_batch_bytes = max_batch_bytes
+        self.flush_interval = flush_interval
+        self.max_pending_lines = max_pending_lines
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+        self._ts_second = -1
+        self._ts_text = ""
+
+        self.lines_written = 0
+        self.batches_written = 0
+        self.dropped = 0
+
+    def _timestamp(self) -> str:
+        now = int(time.time())
+        if now != self._ts_second:
+            self._ts_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+            self._ts_second = now
+        return self._ts_text
+
+    def log(self, message: str, level: str = "INFO", **fields: Any) -> None:
+        record = {"time": self._timestamp(), "level": level, "message": message}
+        if fields:
+            record.update(fields)
+        self.write_line(_encode(record))
+
+    def write_line(self, line: str) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            if len(self._pending) >= self.max_pending_lines:
+                self.dropped += 1
+                return
+            self._pending.append(line)
+            self._pending_bytes += len(line) + 1
+            full = self._pending_bytes >= self.max_batch_bytes
+
+        if self._thread is None:
+            self._start()
+        if full:
+            self._wakeup.set()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None or self._closed:
+                return
+            self._thread = threading.Thread(target=self._flush_loop, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending and not self.dropped:
+                return
+            lines = self._pending
+            self._pending = []
+            self._pending_bytes = 0
+            dropped = self.dropped
+            self.dropped = 0
+
+        if dropped:
+            lines.append(_encode({
+                "time": self._timestamp(),
+                "level": "WARNING",
+                "message": f"Log writer dropped {dropped} lines, queue full"
+            }))
+
+        stream = self._stream if self._stream is not None else sys.stdout
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+        except (OSError, ValueError):
+            return
+
+        self.lines_written += len(lines)
+        self.batches_written += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self.flush()
+
+_writer: Optional[LogWriter] = None
+_writer_lock = threading.Lock()
+
+def get_log_writer() -> LogWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = LogWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+def log(message: str, level: str = "INFO", **fields: Any) -> None:
+    get_log_writer().log(message, level, **fields)
+
+def close_log_writer() -> None:
+    if _writer is not None:
+        _writer.close()
+
+def _reset_after_fork() -> None:
+    global _writer, _writer_lock
+    _writer = None
+    _writer_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,222 @@
+import asyncio
+import ctypes
+import functools
+import gc
+import os
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from worker.cgroup import memory_limit, memory_usage, process_rss
+from worker.logwriter import log
+from worker.metrics import get_metrics
+from worker.scheduler import TaskScheduler
+
+NORMAL = "normal"
+SHRINK = "shrink"
+THROTTLE = "throttle"
+PAUSE = "pause"
+LEVELS = (NORMAL, SHRINK, THROTTLE, PAUSE)
+TOP_ALLOCATIONS = 10
+
+@functools.lru_cache(maxsize=None)
+def _malloc_trim() -> Optional[Callable[[int], int]]:
+    try:
+        return ctypes.CDLL("libc.so.6").malloc_trim
+    except (OSError, AttributeError):
+        return None
+
+def release_heap() -> None:
+    # glibc keeps freed heap memory for reuse, so RSS stays at its peak until
+    # it is trimmed; cycles are collected first so there is more to return.
+    gc.collect()
+    trim = _malloc_trim()
+    if trim is not None:
+        trim(0)
+
+def top_allocations(limit: int = TOP_ALLOCATIONS) -> List[Dict[str, Any]]:
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+    ))
+    return [
+        {
+            "site": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            "size_kib": round(stat.size / 1024, 1),
+            "count": stat.count
+        }
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+class MemoryGovernor:
+    # Compares the working set with the memory limit each check and steps
+    # through graduated responses as it grows:
+    #
+    #   shrink    >= shrink_at    caches cut to cache_shrink of their budget
+    #   throttle  >= throttle_at  intake limited to throttle_fraction of
+    #                             max_concurrency, top allocation sites logged
+    #   pause     >= pause_at     intake stopped until usage falls
+    #
+    # A level is left only once usage is hysteresis below where it started,
+    # so the response does not flap around a threshold.
+    #
+    # Levels only react between checks, too late for a burst of large records.
+    # So at every level intake is also held to a byte budget: the headroom
+    # left below pause_at, divided by record_expansion (decoded records and
+    # their copies take several times their raw size).
+
+    def __init__(
+        self,
+        scheduler: TaskScheduler,
+        limit_bytes: int,
+        usage: Callable[[], Optional[int]],
+        shrink_at: float = 0.70,
+        throttle_at: float = 0.80,
+        pause_at: float = 0.90,
+        hysteresis: float = 0.05,
+        throttle_fraction: float = 0.25,
+        cache_shrink: float = 0.5,
+        record_expansion: float = 4.0,
+        trace_allocations: bool = False,
+        caches: Optional[Callable[[], Dict[str, Any]]] = None
+    ) -> None:
+        if not 0 < shrink_at <= throttle_at <= pause_at < 1:
+            raise ValueError(f"Need 0 < shrink_at <= throttle_at <= pause_at < 1, got {shrink_at}, {throttle_at}, {pause_at}")
+
+        self.scheduler = scheduler
+        self.limit_bytes = limit_bytes
+        self._usage = usage
+        self.thresholds = {SHRINK: shrink_at, THROTTLE: throttle_at, PAUSE: pause_at}
+        self.hysteresis = hysteresis
+        self.throttle_fraction = throttle_fraction
+        self.cache_shrink = cache_shrink
+        self.record_expansion = record_expansion
+        self.trace_allocations = trace_allocations
+        self._caches = caches or (lambda: {})
+        self._cache_budgets: Dict[str, int] = {}
+        self.level = NORMAL
+        self.used_bytes = 0
+        self.peak_bytes = 0
+        self.escalations = 0
+        metrics = get_metrics()
+        self._used_gauge = metrics.gauge("MemoryUsedPercent", "Percent")
+        self._level_gauge = metrics.gauge("MemoryPressureLevel")
+        used = usage()
+        if used is not None:
+            self.used_bytes = used
+            self._update_budget()
+
+    @property
+    def used_fraction(self) -> float:
+        return self.used_bytes / self.limit_bytes
+
+    def _level_for(self, fraction: float) -> str:
+        current = LEVELS.index(self.level)
+        level = NORMAL
+        for index, name in enumerate(LEVELS[1:], start=1):
+            threshold = self.thresholds[name]
+            # Staying at or above the current level only needs the lower bar.
+            if fraction >= threshold or (index <= current and fraction >= threshold - self.hysteresis):
+                level = name
+        return level
+
+    async def check(self) -> str:
+        used = await asyncio.to_thread(self._usage)
+        if used is None:
+            return self.level
+        self.used_bytes = used
+        self.peak_bytes = max(self.peak_bytes, used)
+        self._used_gauge.set(round(self.used_fraction * 100, 1))
+        self._update_budget()
+
+        level = self._level_for(self.used_fraction)
+        if level != self.level:
+            await self._apply(self.level, level)
+        if self.level == PAUSE and self.scheduler.throttled_in_flight == 0:
+            await self._unstick()
+        self._level_gauge.set(LEVELS.index(self.level))
+        return self.level
+
+    def _update_budget(self) -> None:
+        # Usage less what intake holds is the baseline; intake gets the rest.
+        expansion = self.record_expansion
+        baseline = max(0, self.used_bytes - self.scheduler.bytes_in_flight * expansion)
+        headroom = self.limit_bytes * self.thresholds[PAUSE] - baseline
+        self.scheduler.set_byte_limit(max(0, int(headroom / expansion)))
+
+    async def _unstick(self) -> None:
+        # Paused with nothing in flight, usage can only fall if the heap is
+        # given back. If it still stays high, the rest is not intake's doing:
+        # let one record through at a time rather than stall for good.
+        await asyncio.to_thread(release_heap)
+        used = await asyncio.to_thread(self._usage)
+        if used is not None:
+            self.used_bytes = used
+        level = self._level_for(self.used_fraction)
+        if level != PAUSE:
+            await self._apply(PAUSE, level)
+        elif self.scheduler.limit == 0:
+            self.scheduler.set_limit(1)
+            log(
+                f"Memory still at {self.used_fraction:.0%} with no intake in flight, admitting one record at a time",
+                level="WARNING",
+                event="memory_pressure",
+                pressure=PAUSE,
+                used_bytes=self.used_bytes
+            )
+
+    async def _apply(self, old: str, new: str) -> None:
+        rising = LEVELS.index(new) > LEVELS.index(old)
+        self.level = new
+        if rising:
+            self.escalations += 1
+        log(
+            f"Memory at {self.used_fraction:.0%} of {self.limit_bytes / 2**20:.0f}MiB, "
+            f"pressure {'up' if rising else 'down'} to {new}",
+            level="WARNING" if rising else "INFO",
+            event="memory_pressure",
+            pressure=new,
+            used_bytes=self.used_bytes,
+            limit_bytes=self.limit_bytes
+        )
+
+        rank = LEVELS.index(new)
+        self._resize_caches(self.cache_shrink if rank >= LEVELS.index(SHRINK) else 1.0)
+        if rank >= LEVELS.index(PAUSE):
+            self.scheduler.set_limit(0)
+        elif rank >= LEVELS.index(THROTTLE):
+            self.scheduler.set_limit(max(1, int(self.scheduler.max_concurrency * self.throttle_fraction)))
+        else:
+            self.scheduler.set_limit(self.scheduler.max_concurrency)
+
+        if self.trace_allocations:
+            # Tracing from the first sign of pressure shows what is growing.
+            if rank >= LEVELS.index(SHRINK) and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            elif new == NORMAL and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+        if rising and new in (THROTTLE, PAUSE):
+            await asyncio.to_thread(release_heap)
+            if tracemalloc.is_tracing():
+                sites = await asyncio.to_thread(top_allocations)
+                log(
+                    f"Top allocation sites at {self.used_fraction:.0%} memory",
+                    level="WARNING",
+                    event="memory_top_allocations",
+                    sites=sites
+                )
+
+    def _resize_caches(self, fraction: float) -> None:
+        for name, cache in self._caches().items():
+            budget = self._cache_budgets.setdefault(name, cache.max_bytes)
+            cache.resize(int(budget * fraction))
+
+def create_memory_governor(scheduler: TaskScheduler, limit_mib: float = 0, **kwargs: Any) -> Optional[MemoryGovernor]:
+    # Inside a container the cgroup gives both the limit and the usage; a
+    # limit_mib without one (e.g. local runs) is checked against RSS.
+    cgroup_limit = memory_limit()
+    limit = int(limit_mib * 2**20) or cgroup_limit
+    if not limit:
+        return None
+    usage = memory_usage if cgroup_limit else process_rss
+    return MemoryGovernor(scheduler, limit, usage, **kwargs)
@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from worker.logwriter import LogWriter, get_log_writer
+
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+MAX_METRICS_PER_DIRECTIVE = 100
+MAX_VALUES_PER_METRIC = 100
+
+class Counter:
+
+    def __init__(self, name: str, unit: str = "Count") -> None:
+        self.name = name
+        self.unit = unit
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def collect(self) -> Optional[Any]:
+        value = self.value
+        self.value = 0
+        return value
+
+class Gauge:
+
+    def __init__(self, name: str, unit: str = "None") -> None:
+        self.name = name
+        self.unit = unit
+        self.value: Optional[float] = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def collect(self) -> Optional[Any]:
+        return self.value
+
+class Histogram:
+    # HDR-style log-linear buckets over integer microseconds: 2**sub_bucket_bits
+    # linear buckets per power of two, so relative error stays under
+    # 1 / 2**sub_bucket_bits at any magnitude and record() is one dict update.
+
+    def __init__(self, name: str, unit: str = "Milliseconds", sub_bucket_bits: int = 5) -> None:
+        self.name = name
+        self.unit = unit
+        self._sub_bits = sub_bucket_bits
+        self._bits = sub_bucket_bits + 1
+        self._linear_limit = 1 << self._bits
+        self._counts: Dict[int, int] = {}
+
+    def record(self, seconds: float) -> None:
+        value = int(seconds * 1_000_000)
+        if value < self._linear_limit:
+            index = value if value > 0 else 0
+        else:
+            shift = value.bit_length() - self._bits
+            index = (shift << self._sub_bits) + (value >> shift)
+        counts = self._counts
+        counts[index] = counts.get(index, 0) + 1
+
+    def _bucket_micros(self, index: int) -> float:
+        if index < self._linear_limit:
+            return float(index)
+        shift = (index >> self._sub_bits) - 1
+        mantissa = index - (shift << self._sub_bits)
+        return (mantissa + 0.5) * (1 << shift)
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts.values())
+
+    def snapshot(self) -> List[Tuple[float, int]]:
+        return [(self._bucket_micros(index), count) for index, count in sorted(self._counts.items())]
+
+    def percentile(self, q: float) -> float:
+        buckets = self.snapshot()
+        target = q * sum(count for _, count in buckets)
+        seen = 0
+        for micros, count in buckets:
+            seen += count
+            if seen >= target:
+                return micros / 1_000_000
+        return 0.0
+
+    def collect(self) -> Optional[Any]:
+        buckets = self.snapshot()
+        self._counts = {}
+        if not buckets:
+            return None
+
+        # EMF accepts at most 100 distinct values per metric; merge neighbours
+        # (count-weighted) until the distribution fits.
+        while len(buckets) > MAX_VALUES_PER_METRIC:
+            merged = []
+            for i in range(0, len(buckets), 2):
+                pair = buckets[i:i + 2]
+                total = sum(count for _, count in pair)
+                merged.append((sum(value * count for value, count in pair) / total, total))
+            buckets = merged
+
+        divisor = 1000.0 if self.unit == "Milliseconds" else 1_000_000.0 if self.unit == "Seconds" else 1.0
+        return {
+            "Values": [round(micros / divisor, 6) for micros, _ in buckets],
+            "Counts": [count for _, count in buckets]
+        }
+
+class MetricsRegistry:
+    # Observations aggregate in memory; flush() turns an interval into one
+    # CloudWatch Embedded Metric Format line on stdout, which the awslogs
+    # driver ships and CloudWatch extracts into metrics.
+
+    def __init__(
+        self,
+        namespace: str,
+        dimensions: Optional[Dict[str, str]] = None,
+        writer: Optional[LogWriter] = None
+    ) -> None:
+        self.namespace = namespace
+        self.dimensions = dict(dimensions or {})
+        self._writer = writer
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls: type, name: str, unit: str) -> Any:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, cls(name, unit))
+        if not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as {type(metric).__name__}")
+        return metric
+
+    def counter(self, name: str, unit: str = "Count") -> Counter:
+        return self._get(Counter, name, unit)
+
+    def gauge(self, name: str, unit: str = "None") -> Gauge:
+        return self._get(Gauge, name, unit)
+
+    def histogram(self, name: str, unit: str = "Milliseconds") -> Histogram:
+        return self._get(Histogram, name, unit)
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        document: Dict[str, Any] = dict(self.dimensions)
+        definitions = []
+        for name, metric in list(self._metrics.items()):
+            value = metric.collect()
+            if value is None:
+                continue
+            document[name] = value
+            definitions.append({"Name": name, "Unit": metric.unit})
+
+        if not definitions:
+            return None
+
+        document["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": self.namespace,
+                    "Dimensions": [list(self.dimensions)],
+                    "Metrics": definitions[i:i + MAX_METRICS_PER_DIRECTIVE]
+                }
+                for i in range(0, len(definitions), MAX_METRICS_PER_DIRECTIVE)
+            ]
+        }
+        writer = self._writer if self._writer is not None else get_log_writer()
+        writer.write_line(_encode(document))
+        return document
+
+_registry: Optional[MetricsRegistry] = None
+
+def configure_metrics(namespace: str, dimensions: Dict[str, str], writer: Optional[LogWriter] = None) -> MetricsRegistry:
+    global _registry
+    _registry = MetricsRegistry(namespace, dimensions, writer)
+    return _registry
+
+def get_metrics() -> MetricsRegistry:
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry("HCM/POC")
+    return _registry
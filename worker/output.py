@@ -0,0 +1,398 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from worker.logwriter import log
+from worker.metrics import get_metrics
+
+MIB = 1024 * 1024
+# S3 rejects parts below 5MiB, except the last part of an upload.
+MIN_PART_BYTES = 5 * MIB
+OUTPUT_FORMATS = ("jsonl", "parquet")
+OUTPUT_CODECS = ("gzip", "zstd", "none")
+EXTENSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+_encode = json.JSONEncoder(separators=(",", ":"), default=str).encode
+
+class OutputBatchFailed(Exception):
+    pass
+
+class _Uncompressed:
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+def _compressor(codec: str) -> Any:
+    if codec == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if codec == "zstd":
+        # Not in the base image; only imported when asked for.
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    if codec == "none":
+        return _Uncompressed()
+    raise ValueError(f"Unknown output codec: {codec}. Available: {list(OUTPUT_CODECS)}")
+
+class _JsonlEncoder:
+    # One compressed stream per batch, fed a buffer of lines at a time.
+
+    def __init__(self, codec: str) -> None:
+        self.extension = f"jsonl{EXTENSIONS[codec]}"
+        self._compressor = _compressor(codec)
+
+    def encode(self, lines: List[bytes]) -> bytes:
+        return self._compressor.compress(b"".join(lines))
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _ParquetEncoder:
+    # Parquet needs the whole batch to settle on one schema, so records are
+    # held until the batch completes and written as a single row group.
+
+    def __init__(self, codec: str) -> None:
+        # Optional, like zstd.
+        import pyarrow
+        import pyarrow.parquet
+
+        self.extension = "parquet"
+        self.codec = codec
+        self._pyarrow = pyarrow
+        self._records: List[Any] = []
+
+    def encode(self, records: List[Any]) -> bytes:
+        self._records.extend(records)
+        return b""
+
+    def finish(self) -> bytes:
+        out = self._pyarrow.BufferOutputStream()
+        table = self._pyarrow.Table.from_pylist(self._records)
+        self._pyarrow.parquet.write_table(table, out, compression=self.codec)
+        self._records = []
+        return out.getvalue().to_pybytes()
+
+class _LocalUpload:
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._file = open(f"{path}.partial", "wb")
+
+    def upload_part(self, data: bytes) -> None:
+        self._file.write(data)
+
+    def complete(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(f"{self.path}.partial", self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(f"{self.path}.partial")
+        except FileNotFoundError:
+            pass
+
+class LocalDirectoryBackend:
+    # Stands in for S3 in tests and local runs. Parts go to a .partial file
+    # that takes the object's name only once complete, so a reader never sees
+    # half a batch, as with a multipart upload.
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def start(self, key: str) -> _LocalUpload:
+        return _LocalUpload(os.path.join(self.directory, key))
+
+    def close(self) -> None:
+        pass
+
+class _S3Upload:
+
+    def __init__(self, client: Any, key: str) -> None:
+        self.client = client
+        self.key = key
+        self.upload_id = client.create_multipart_upload(key)
+        self.etags: List[str] = []
+
+    def upload_part(self, data: bytes) -> None:
+        self.etags.append(self.client.upload_part(self.key, self.upload_id, len(self.etags) + 1, data))
+
+    def complete(self) -> None:
+        self.client.complete_multipart_upload(self.key, self.upload_id, self.etags)
+
+    def abort(self) -> None:
+        self.client.abort_multipart_upload(self.key, self.upload_id)
+
+class S3Backend:
+
+    def __init__(self, bucket: str, region: Optional[str] = None, endpoint_url: str = "") -> None:
+        from worker.s3 import S3Client
+
+        region = region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
+        self.client = S3Client(bucket, region, endpoint_url=endpoint_url)
+
+    def start(self, key: str) -> _S3Upload:
+        return _S3Upload(self.client, key)
+
+    def close(self) -> None:
+        self.client.close()
+
+OUTPUT_BACKENDS: Dict[str, Callable[..., Any]] = {
+    "local": lambda location, **kwargs: LocalDirectoryBackend(location),
+    "s3": lambda location, **kwargs: S3Backend(location, **kwargs)
+}
+
+def create_output_backend(name: str, location: str, **kwargs: Any) -> Any:
+    if name not in OUTPUT_BACKENDS:
+        raise ValueError(f"Unknown output backend: {name}. Available: {list(OUTPUT_BACKENDS.keys())}")
+    return OUTPUT_BACKENDS[name](location, **kwargs)
+
+class _Batch:
+
+    def __init__(self, key: str, upload: Any, encoder: Any) -> None:
+        self.key = key
+        self.upload = upload
+        self.encoder = encoder
+        self.pending = bytearray()
+        self.records = 0
+        self.raw_bytes = 0
+        self.parts = 0
+        self.bytes_written = 0
+        self.started = time.monotonic()
+        # One future per buffer flushed into the batch, shared by its records.
+        self.durable: List[asyncio.Future] = []
+
+    def settle(self, error: Optional[BaseException] = None) -> None:
+        for future in self.durable:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+class OutputSink:
+    # Records are buffered as encoded lines. Each full buffer is compressed on
+    # a thread into the current batch, and once part_bytes of compressed
+    # output are pending they are uploaded as the next part of the batch's
+    # multipart upload. A batch completes when batch_bytes of records have
+    # gone into it, when its oldest record is max_age old, or on close.
+    # Writers wait while the buffer is full, so memory stays around two
+    # buffers plus one part (a whole batch for parquet).
+    #
+    # write() returns a future that resolves once the batch holding the record
+    # is complete, or fails if the batch is lost. Callers acknowledge their
+    # input only after that, so a crash never loses results of acked input.
+
+    def __init__(
+        self,
+        backend: Any,
+        prefix: str = "results",
+        fmt: str = "jsonl",
+        codec: str = "gzip",
+        batch_bytes: int = 64 * MIB,
+        buffer_bytes: int = 4 * MIB,
+        part_bytes: int = 8 * MIB,
+        max_age: float = 60.0,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {fmt}. Available: {list(OUTPUT_FORMATS)}")
+        if part_bytes < MIN_PART_BYTES:
+            raise ValueError(f"part_bytes must be at least {MIN_PART_BYTES}, got {part_bytes}")
+
+        self.backend = backend
+        self.prefix = prefix.strip("/")
+        self.format = fmt
+        self.codec = codec
+        self.batch_bytes = batch_bytes
+        self.buffer_bytes = buffer_bytes
+        self.part_bytes = part_bytes
+        self.max_age = max_age
+        self._clock = clock
+        # Unknown codecs and missing optional packages fail here, not mid-run.
+        self._new_encoder()
+
+        # Distinguishes this task's objects from those of other tasks.
+        self._writer_id = uuid.uuid4().hex[:12]
+        self._sequence = 0
+        self._items: List[Any] = []
+        self._buffered = 0
+        self._buffered_records = 0
+        self._durable: Optional[asyncio.Future] = None
+        self._oldest: Optional[float] = None
+        self._batch: Optional[_Batch] = None
+        self._lock = asyncio.Lock()
+        self._closed = False
+        self.records = 0
+        self.batches = 0
+        self.parts = 0
+        self.bytes_written = 0
+
+        metrics = get_metrics()
+        self._records_metric = metrics.counter("OutputRecords")
+        self._batches_metric = metrics.counter("OutputBatches")
+        self._bytes_metric = metrics.counter("OutputBytes", "Bytes")
+        self._flush_latency = metrics.histogram("OutputFlushLatency")
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._buffered + (len(self._batch.pending) if self._batch is not None else 0)
+
+    def _new_encoder(self) -> Any:
+        if self.format == "parquet":
+            return _ParquetEncoder(self.codec)
+        return _JsonlEncoder(self.codec)
+
+    async def write(self, record: Any) -> asyncio.Future:
+        if self._closed:
+            raise RuntimeError("Output sink is closed")
+        line = _encode(record).encode() + b"\n"
+        # A full buffer is flushed before anything more goes in, so concurrent
+        # writers wait here rather than pile up behind the flush.
+        while self._buffered >= self.buffer_bytes:
+            await self._flush(complete=False)
+        self._items.append(record if self.format == "parquet" else line)
+        self._buffered += len(line)
+        self._buffered_records += 1
+        if self._oldest is None:
+            self._oldest = self._clock()
+        if self._durable is None:
+            self._durable = asyncio.get_running_loop().create_future()
+        return self._durable
+
+    async def flush_due(self) -> None:
+        if self._oldest is not None and self._clock() - self._oldest >= self.max_age:
+            await self._flush(complete=True)
+
+    async def close(self) -> None:
+        self._closed = True
+        await self._flush(complete=True)
+        await asyncio.to_thread(self.backend.close)
+
+    async def _flush(self, complete: bool) -> None:
+        async with self._lock:
+            # Another writer may have flushed this buffer while we waited.
+            if not complete and self._buffered < self.buffer_bytes:
+                return
+            items, self._items = self._items, []
+            raw_bytes, self._buffered = self._buffered, 0
+            records, self._buffered_records = self._buffered_records, 0
+            durable, self._durable = self._durable, None
+
+            batch = self._batch
+            if batch is None:
+                if not items:
+                    self._oldest = None
+                    return
+                try:
+                    batch = self._batch = await asyncio.to_thread(self._start_batch)
+                except BaseException as e:
+                    self._oldest = self._clock() if self._items else None
+                    self._fail_records(durable, records, e)
+                    if not isinstance(e, Exception):
+                        raise
+                    return
+            if durable is not None:
+                batch.durable.append(durable)
+            batch.records += records
+            batch.raw_bytes += raw_bytes
+            complete = complete or batch.raw_bytes >= self.batch_bytes
+
+            started = time.monotonic()
+            try:
+                written = await asyncio.to_thread(self._write_batch, batch, items, complete)
+            except BaseException as e:
+                # Only the records' own callers hear about it, through their
+                # futures; the writer that happened to trigger the flush does not.
+                self._batch = None
+                self._oldest = self._clock() if self._items else None
+                log(
+                    f"Output batch {batch.key} failed, {batch.records} records not written: {e!r}",
+                    level="ERROR",
+                    event="output_error",
+                    key=batch.key,
+                    records=batch.records
+                )
+                batch.settle(OutputBatchFailed(f"Output batch {batch.key} failed: {e!r}"))
+                await asyncio.to_thread(self._abort, batch)
+                if not isinstance(e, Exception):
+                    raise
+                return
+            self._flush_latency.record(time.monotonic() - started)
+            self.records += records
+            self.bytes_written += written
+            self._records_metric.inc(records)
+            self._bytes_metric.inc(written)
+            if not complete:
+                return
+
+            self._batch = None
+            self._oldest = self._clock() if self._items else None
+            self.batches += 1
+            self._batches_metric.inc()
+            batch.settle()
+            log(
+                f"Wrote {batch.records} records to {batch.key}",
+                event="output_batch",
+                key=batch.key,
+                records=batch.records,
+                raw_bytes=batch.raw_bytes,
+                bytes=batch.bytes_written,
+                parts=batch.parts,
+                seconds=round(time.monotonic() - batch.started, 3)
+            )
+
+    def _fail_records(self, durable: Optional[asyncio.Future], records: int, error: BaseException) -> None:
+        log(
+            f"Could not start an output batch, {records} records not written: {error!r}",
+            level="ERROR",
+            event="output_error",
+            records=records
+        )
+        if durable is not None and not durable.done():
+            durable.set_exception(OutputBatchFailed(f"Could not start an output batch: {error!r}"))
+
+    def _start_batch(self) -> _Batch:
+        now = datetime.now(timezone.utc)
+        self._sequence += 1
+        encoder = self._new_encoder()
+        key = (
+            f"{self.prefix}/{now:%Y/%m/%d}/"
+            f"{now:%Y%m%dT%H%M%SZ}-{self._writer_id}-{self._sequence:06d}.{encoder.extension}"
+        )
+        return _Batch(key, self.backend.start(key), encoder)
+
+    def _write_batch(self, batch: _Batch, items: List[Any], complete: bool) -> int:
+        written = 0
+        batch.pending += batch.encoder.encode(items)
+        if complete:
+            batch.pending += batch.encoder.finish()
+        while len(batch.pending) >= self.part_bytes or (complete and batch.pending):
+            part = bytes(batch.pending[:self.part_bytes])
+            del batch.pending[:self.part_bytes]
+            batch.upload.upload_part(part)
+            batch.parts += 1
+            batch.bytes_written += len(part)
+            self.parts += 1
+            written += len(part)
+        if complete:
+            batch.upload.complete()
+        return written
+
+    def _abort(self, batch: _Batch) -> None:
+        try:
+            batch.upload.abort()
+        except Exception as e:
+            # The bucket's lifecycle rule cleans up abandoned uploads.
+            log(f"Could not abort upload of {batch.key}: {e!r}", level="WARNING", event="output_error")
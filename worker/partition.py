@@ -0,0 +1,417 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from worker.dynamodb import DynamoClient, create_dynamo_client
+from worker.logwriter import log
+from worker.metrics import get_metrics
+from worker.scheduler import TaskScheduler
+
+ShardRunner = Callable[[int, asyncio.Event], Awaitable[None]]
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+def shard_for(key: Any, shard_count: int) -> int:
+    # Stable across processes and restarts, unlike hash().
+    return _hash64(str(key)) % shard_count
+
+def rendezvous_owner(shard: int, members: Iterable[str]) -> Optional[str]:
+    # Highest-random-weight hashing: a member joining takes about 1/n of the
+    # shards from the others, and a member leaving only moves its own.
+    return max(members, key=lambda member: _hash64(f"{shard}:{member}"), default=None)
+
+def assign_shards(shard_count: int, members: Iterable[str]) -> Dict[int, Optional[str]]:
+    members = list(members)
+    return {shard: rendezvous_owner(shard, members) for shard in range(shard_count)}
+
+def default_owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class SqliteLeaseStore:
+    # Shard leases, per-shard checkpoints and task membership in one SQLite
+    # file. Every write is a single conditional statement, so processes
+    # sharing the file never both hold a lease. Times are wall-clock seconds
+    # since tasks compare them across processes.
+
+    def __init__(self, path: str, busy_timeout: float = 5.0) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases "
+            "(shard INTEGER PRIMARY KEY, owner TEXT, expires REAL NOT NULL DEFAULT 0, checkpoint TEXT)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS members (owner TEXT PRIMARY KEY, expires REAL NOT NULL)")
+
+    def _execute(self, sql: str, params: Tuple[Any, ...] = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, params)
+
+    def ensure_shards(self, shard_count: int) -> None:
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO leases (shard) VALUES (?)", [(s,) for s in range(shard_count)])
+
+    def heartbeat(self, owner: str, ttl: float, now: float) -> None:
+        self._execute("INSERT OR REPLACE INTO members (owner, expires) VALUES (?, ?)", (owner, now + ttl))
+
+    def leave(self, owner: str) -> None:
+        self._execute("DELETE FROM members WHERE owner = ?", (owner,))
+
+    def members(self, now: float) -> List[str]:
+        self._execute("DELETE FROM members WHERE expires < ?", (now,))
+        return [row[0] for row in self._execute("SELECT owner FROM members ORDER BY owner")]
+
+    def leases(self) -> Dict[int, Tuple[Optional[str], float]]:
+        return {shard: (owner, expires) for shard, owner, expires in self._execute("SELECT shard, owner, expires FROM leases")}
+
+    def acquire(self, shard: int, owner: str, ttl: float, now: float) -> bool:
+        cursor = self._execute(
+            "UPDATE leases SET owner = ?, expires = ? WHERE shard = ? AND (owner IS NULL OR owner = ? OR expires < ?)",
+            (owner, now + ttl, shard, owner, now)
+        )
+        return cursor.rowcount == 1
+
+    def renew(self, shards: Iterable[int], owner: str, ttl: float, now: float) -> List[int]:
+        renewed = []
+        for shard in shards:
+            cursor = self._execute(
+                "UPDATE leases SET expires = ? WHERE shard = ? AND owner = ? AND expires >= ?",
+                (now + ttl, shard, owner, now)
+            )
+            if cursor.rowcount == 1:
+                renewed.append(shard)
+        return renewed
+
+    def release(self, shard: int, owner: str) -> None:
+        self._execute("UPDATE leases SET owner = NULL, expires = 0 WHERE shard = ? AND owner = ?", (shard, owner))
+
+    def load_checkpoint(self, shard: int) -> Optional[str]:
+        row = self._execute("SELECT checkpoint FROM leases WHERE shard = ?", (shard,)).fetchone()
+        return row[0] if row else None
+
+    def save_checkpoint(self, shard: int, owner: str, value: str) -> bool:
+        # Fenced: a task that has lost the lease cannot move the checkpoint.
+        cursor = self._execute("UPDATE leases SET checkpoint = ? WHERE shard = ? AND owner = ?", (value, shard, owner))
+        return cursor.rowcount == 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+class DynamoLeaseStore:
+    # The same leases, checkpoints and membership in a DynamoDB table (named by
+    # path) that tasks on different hosts share. Shards are the items
+    # "shard#<n>" and members "member#<owner>". As with SQLite every write is
+    # one conditional request. Member items carry a TTL as well, so tasks that
+    # died are eventually removed and not only skipped.
+
+    def __init__(self, table: str, member_retention: float = 3600.0, client: Optional[DynamoClient] = None) -> None:
+        self.table = table
+        self.member_retention = member_retention
+        self.client = client or create_dynamo_client()
+
+    def ensure_shards(self, shard_count: int) -> None:
+        # Shard items are created by their first acquire.
+        pass
+
+    def heartbeat(self, owner: str, ttl: float, now: float) -> None:
+        self.client.put_item(self.table, {
+            "pk": f"member#{owner}",
+            "kind": "member",
+            "owner": owner,
+            "expires": now + ttl,
+            "expires_at": math.ceil(now + ttl + self.member_retention)
+        })
+
+    def leave(self, owner: str) -> None:
+        self.client.delete_item(self.table, {"pk": f"member#{owner}"})
+
+    def members(self, now: float) -> List[str]:
+        items = self.client.scan(
+            self.table,
+            condition="#kind = :member AND #expires >= :now",
+            names={"#kind": "kind", "#expires": "expires"},
+            values={":member": "member", ":now": now}
+        )
+        return sorted(item["owner"] for item in items)
+
+    def leases(self) -> Dict[int, Tuple[Optional[str], float]]:
+        items = self.client.scan(self.table, condition="#kind = :shard", names={"#kind": "kind"}, values={":shard": "shard"})
+        return {int(item["pk"].partition("#")[2]): (item.get("owner"), item.get("expires", 0)) for item in items}
+
+    def acquire(self, shard: int, owner: str, ttl: float, now: float) -> bool:
+        return self.client.update_item(
+            self.table,
+            {"pk": f"shard#{shard}"},
+            "SET #kind = :shard, #owner = :owner, #expires = :expires",
+            condition="attribute_not_exists(#owner) OR #owner = :owner OR #expires < :now",
+            names={"#kind": "kind", "#owner": "owner", "#expires": "expires"},
+            values={":shard": "shard", ":owner": owner, ":expires": now + ttl, ":now": now}
+        )
+
+    def renew(self, shards: Iterable[int], owner: str, ttl: float, now: float) -> List[int]:
+        return [
+            shard for shard in shards
+            if self.client.update_item(
+                self.table,
+                {"pk": f"shard#{shard}"},
+                "SET #expires = :expires",
+                condition="#owner = :owner AND #expires >= :now",
+                names={"#owner": "owner", "#expires": "expires"},
+                values={":owner": owner, ":expires": now + ttl, ":now": now}
+            )
+        ]
+
+    def release(self, shard: int, owner: str) -> None:
+        self.client.update_item(
+            self.table,
+            {"pk": f"shard#{shard}"},
+            "REMOVE #owner SET #expires = :zero",
+            condition="#owner = :owner",
+            names={"#owner": "owner", "#expires": "expires"},
+            values={":owner": owner, ":zero": 0}
+        )
+
+    def load_checkpoint(self, shard: int) -> Optional[str]:
+        item = self.client.get_item(self.table, {"pk": f"shard#{shard}"})
+        return item.get("checkpoint") if item else None
+
+    def save_checkpoint(self, shard: int, owner: str, value: str) -> bool:
+        return self.client.update_item(
+            self.table,
+            {"pk": f"shard#{shard}"},
+            "SET #checkpoint = :value",
+            condition="#owner = :owner",
+            names={"#owner": "owner", "#checkpoint": "checkpoint"},
+            values={":owner": owner, ":value": value}
+        )
+
+    def close(self) -> None:
+        self.client.close()
+
+LEASE_STORES = {
+    "sqlite": SqliteLeaseStore,
+    "dynamodb": DynamoLeaseStore
+}
+
+def create_lease_store(name: str, path: str) -> Any:
+    if name not in LEASE_STORES:
+        raise ValueError(f"Unknown lease store: {name}. Available: {list(LEASE_STORES.keys())}")
+    return LEASE_STORES[name](path)
+
+class LeaseOffsetStore:
+    # Keeps a shard's ingest offset next to its lease, so whichever task takes
+    # the shard over resumes where the last owner stopped.
+
+    def __init__(self, store: Any, shard: int, owner: str) -> None:
+        self.store = store
+        self.shard = shard
+        self.owner = owner
+
+    def load(self) -> int:
+        return int(self.store.load_checkpoint(self.shard) or 0)
+
+    def save(self, offset: int) -> None:
+        if not self.store.save_checkpoint(self.shard, self.owner, str(offset)):
+            log(
+                f"Not saving offset {offset} for shard {self.shard}, the lease has moved",
+                level="WARNING",
+                event="shard_fenced",
+                shard=self.shard
+            )
+
+class ShardCoordinator:
+    # Each round renews this task's membership and leases, works out which
+    # shards rendezvous hashing gives it among the live members, hands over
+    # the ones it should no longer own and claims the ones it should. A shard
+    # is only released once its runner has finished and saved its offset; a
+    # claim fails until the previous owner has released or its lease expired.
+
+    def __init__(
+        self,
+        store: Any,
+        scheduler: TaskScheduler,
+        run_shard: ShardRunner,
+        shard_count: int,
+        owner: Optional[str] = None,
+        lease_ttl: float = 15.0,
+        clock: Callable[[], float] = time.time
+    ) -> None:
+        if shard_count < 1:
+            raise ValueError(f"shard_count must be >= 1, got {shard_count}")
+
+        self.store = store
+        self.scheduler = scheduler
+        self.run_shard = run_shard
+        self.shard_count = shard_count
+        self.owner = owner or default_owner_id()
+        self.lease_ttl = lease_ttl
+        self.renew_interval = lease_ttl / 3
+        self._clock = clock
+        self.members: List[str] = []
+        self.owned: Set[int] = set()
+        self._runners: Dict[int, Tuple[asyncio.Task, asyncio.Event]] = {}
+        self._handovers: Dict[int, asyncio.Task] = {}
+        self.acquired = 0
+        self.released = 0
+        self.lost = 0
+        self._acquired_metric = get_metrics().counter("ShardsAcquired")
+        self._released_metric = get_metrics().counter("ShardsReleased")
+
+    async def run(self) -> None:
+        await asyncio.to_thread(self.store.ensure_shards, self.shard_count)
+        log(f"Joining shard group as {self.owner}", event="shard_join", owner=self.owner, shards=self.shard_count)
+        try:
+            while not self.scheduler.stopping:
+                try:
+                    await self.step()
+                except Exception as e:
+                    log(f"Shard coordination failed: {e!r}", level="ERROR", event="shard_error")
+                await self.scheduler.wait_stopped(timeout=self.renew_interval)
+        finally:
+            await self.close()
+
+    async def step(self) -> None:
+        now = self._clock()
+        members, renewed = await asyncio.to_thread(self._renew, sorted(self.owned), now)
+        if members != self.members:
+            log(f"Shard group has {len(members)} members", event="shard_members", members=members)
+        self.members = members
+
+        for shard in self.owned - set(renewed):
+            # Expired before renewal (e.g. a long pause); someone else may be
+            # running it already, so stop at once and do not release.
+            self.lost += 1
+            self.owned.discard(shard)
+            self._stop_runner(shard)
+            log(f"Lost the lease on shard {shard}", level="WARNING", event="shard_lost", shard=shard)
+
+        target = {shard for shard in range(self.shard_count) if rendezvous_owner(shard, members) == self.owner}
+        for shard in self.owned - target:
+            if shard not in self._handovers:
+                self._handovers[shard] = asyncio.ensure_future(self._hand_over(shard))
+
+        for shard in sorted(target - self.owned):
+            if await asyncio.to_thread(self.store.acquire, shard, self.owner, self.lease_ttl, now):
+                self.owned.add(shard)
+                self.acquired += 1
+                self._acquired_metric.inc()
+                log(f"Acquired shard {shard}", event="shard_acquired", shard=shard)
+
+        get_metrics().gauge("OwnedShards", "Count").set(len(self.owned))
+        for shard in self.owned:
+            runner = self._runners.get(shard)
+            if shard not in self._handovers and (runner is None or runner[0].done()):
+                self._start_runner(shard)
+
+    def _renew(self, owned: List[int], now: float) -> Tuple[List[str], List[int]]:
+        self.store.heartbeat(self.owner, self.lease_ttl, now)
+        return self.store.members(now), self.store.renew(owned, self.owner, self.lease_ttl, now)
+
+    def _start_runner(self, shard: int) -> None:
+        stop = asyncio.Event()
+        task = asyncio.ensure_future(self.run_shard(shard, stop))
+        task.add_done_callback(lambda done: self._runner_done(shard, done))
+        self._runners[shard] = (task, stop)
+
+    def _runner_done(self, shard: int, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            log(
+                f"Shard {shard} stopped with {task.exception()!r}, restarting next round",
+                level="ERROR",
+                event="shard_error",
+                shard=shard
+            )
+
+    def _stop_runner(self, shard: int) -> Optional[asyncio.Task]:
+        runner = self._runners.pop(shard, None)
+        if runner is None:
+            return None
+        task, stop = runner
+        stop.set()
+        return task
+
+    async def _hand_over(self, shard: int) -> None:
+        task = self._stop_runner(shard)
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+        if shard in self.owned:
+            await asyncio.to_thread(self.store.release, shard, self.owner)
+            self.owned.discard(shard)
+            self.released += 1
+            self._released_metric.inc()
+            log(f"Released shard {shard}", event="shard_released", shard=shard)
+        self._handovers.pop(shard, None)
+
+    async def close(self) -> None:
+        for shard in list(self.owned):
+            if shard not in self._handovers:
+                self._handovers[shard] = asyncio.ensure_future(self._hand_over(shard))
+        await asyncio.gather(*self._handovers.values(), return_exceptions=True)
+        await asyncio.to_thread(self.store.leave, self.owner)
+        log(f"Left shard group as {self.owner}", event="shard_leave", owner=self.owner)
+
+def split_jsonl(source: str, pattern: str, shard_count: int, key: str) -> Dict[int, int]:
+    # Appends each record of source to pattern.format(shard=...) by the hash
+    # of its key field; returns records written per shard.
+    outputs: Dict[int, Any] = {}
+    counts: Dict[int, int] = {}
+    try:
+        with open(source, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                shard = shard_for(record.get(key) if isinstance(record, dict) else record, shard_count)
+                if shard not in outputs:
+                    outputs[shard] = open(pattern.format(shard=shard), "ab")
+                outputs[shard].write(line if line.endswith(b"\n") else line + b"\n")
+                counts[shard] = counts.get(shard, 0) + 1
+    finally:
+        for output in outputs.values():
+            output.close()
+    return counts
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shard lease tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split = commands.add_parser("split", help="split a JSONL file into per-shard files")
+    split.add_argument("source")
+    split.add_argument("pattern", help="output path with {shard}, e.g. requests-{shard}.jsonl")
+    split.add_argument("--shards", type=int, required=True)
+    split.add_argument("--key", default="request_id")
+    show = commands.add_parser("leases", help="print shard owners and live members")
+    show.add_argument("store", help="path of the SQLite lease store, or the DynamoDB table name")
+    show.add_argument("--backend", default="sqlite", choices=list(LEASE_STORES))
+    args = parser.parse_args()
+
+    if args.command == "split":
+        counts = split_jsonl(args.source, args.pattern, args.shards, args.key)
+        print(json.dumps({str(shard): count for shard, count in sorted(counts.items())}))
+        return
+
+    store = create_lease_store(args.backend, args.store)
+    now = time.time()
+    print(json.dumps({
+        "members": store.members(now),
+        "leases": {
+            str(shard): {"owner": owner, "expires_in": round(expires - now, 1) if owner else None}
+            for shard, (owner, expires) in sorted(store.leases().items())
+        }
+    }, indent=2))
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from worker.ticker import percentile
+
+DRAINING = "draining"
+BACKING_OFF = "backing_off"
+IDLE = "idle"
+# Numeric codes for the IntakeMode gauge.
+MODE_CODES: Dict[str, int] = {DRAINING: 0, BACKING_OFF: 1, IDLE: 2}
+
+class AdaptivePoller:
+    # How long intake waits before looking for work again. A look that hit its
+    # batch limit is followed straight away by the next one; a look that found
+    # some work waits min_interval; each empty look multiplies the wait by
+    # factor, up to max_interval. A file watcher, where there is one, ends the
+    # wait early once something arrives, so the ceiling only bounds how often
+    # an idle intake checks for work it was not told about.
+
+    def __init__(self, min_interval: float = 2.0, max_interval: float = 30.0, factor: float = 4.0) -> None:
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError(f"Need 0 < min_interval <= max_interval, got {min_interval} and {max_interval}")
+        if factor < 1:
+            raise ValueError(f"factor must be >= 1, got {factor}")
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        # Start out as if work is waiting, so intake looks right away.
+        self.mode = DRAINING
+        self.interval = 0.0
+        self.wakeups = 0
+        self.idle_wakeups = 0
+
+    @property
+    def mode_code(self) -> int:
+        return MODE_CODES[self.mode]
+
+    def record(self, found: int, more: bool = False) -> float:
+        # Returns how long to wait before the next look. more: the look stopped
+        # at its batch limit, so more work is probably waiting.
+        self.wakeups += 1
+        if more:
+            self.mode = DRAINING
+            self.interval = 0.0
+            return self.interval
+
+        if found > 0:
+            self.interval = self.min_interval
+        else:
+            self.idle_wakeups += 1
+            self.interval = min(max(self.interval * self.factor, self.min_interval), self.max_interval)
+        self.mode = IDLE if self.interval >= self.max_interval else BACKING_OFF
+        return self.interval
+
+def simulate(
+    arrivals: List[float],
+    next_interval: Callable[[int], float],
+    duration: float,
+    look_cost: float = 0.002,
+    item_cost: float = 0.005,
+    wake_after: Optional[float] = None
+) -> Dict[str, Any]:
+    # Replays sorted arrival times against a poll loop on a virtual clock. Each
+    # look takes everything that has arrived, then waits next_interval(found).
+    # With wake_after, a watcher ends the wait when something arrives, but no
+    # sooner than wake_after after the look, as follow_jsonl does.
+    latencies = []
+    looks = 0
+    idle_looks = 0
+    index = 0
+    now = 0.0
+    while now < duration:
+        found = 0
+        while index < len(arrivals) and arrivals[index] <= now:
+            latencies.append(now - arrivals[index])
+            index += 1
+            found += 1
+        looks += 1
+        if not found:
+            idle_looks += 1
+        done = now + look_cost + item_cost * found
+        delay = next_interval(found)
+        now = done + delay
+        if wake_after is not None and index < len(arrivals):
+            now = min(now, max(arrivals[index], done + min(wake_after, delay)))
+
+    latencies.sort()
+    return {
+        "items": len(latencies),
+        "latency_mean_s": sum(latencies) / len(latencies) if latencies else 0.0,
+        "latency_p50_s": percentile(latencies, 0.50),
+        "latency_p99_s": percentile(latencies, 0.99),
+        "latency_max_s": latencies[-1] if latencies else 0.0,
+        "wakeups_per_hour": looks * 3600 / duration,
+        "idle_wakeups_per_hour": idle_looks * 3600 / duration
+    }
@@ -0,0 +1,133 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from worker.cgroup import effective_cpu_count
+
+def _apply_chunk(func: Callable[[Any], Any], chunk: List[Any]) -> List[Any]:
+    return [func(item) for item in chunk]
+
+class ProcessPool:
+    # Items travel to workers in chunks so pickling and IPC are paid once per
+    # chunk rather than once per record.
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        chunk_size: int = 256,
+        linger: float = 0.01,
+        ordered: bool = True,
+        start_method: str = "spawn"
+    ) -> None:
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be >= 1, got {chunk_size}")
+
+        self.workers = workers or effective_cpu_count()
+        self.chunk_size = chunk_size
+        self.linger = linger
+        self.ordered = ordered
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(start_method)
+        )
+        self._buffers: Dict[Callable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Callable, asyncio.TimerHandle] = {}
+        self._tail: Optional[asyncio.Future] = None
+        self._resolvers: Set[asyncio.Task] = set()
+
+    async def map(self, func: Callable[[Any], Any], items: Iterable[Any], ordered: Optional[bool] = None) -> AsyncIterator[Any]:
+        loop = asyncio.get_running_loop()
+        ordered = self.ordered if ordered is None else ordered
+        max_in_flight = self.workers * 2
+        in_flight: List[asyncio.Future] = []
+
+        def chunks() -> Iterable[List[Any]]:
+            chunk: List[Any] = []
+            for item in items:
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        for chunk in chunks():
+            in_flight.append(loop.run_in_executor(self._executor, _apply_chunk, func, chunk))
+            if len(in_flight) < max_in_flight:
+                continue
+
+            if ordered:
+                for result in await in_flight.pop(0):
+                    yield result
+            else:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    in_flight.remove(future)
+                    for result in future.result():
+                        yield result
+
+        if ordered:
+            for future in in_flight:
+                for result in await future:
+                    yield result
+        else:
+            for future in asyncio.as_completed(in_flight):
+                for result in await future:
+                    yield result
+
+    async def submit(self, func: Callable[[Any], Any], item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        buffer = self._buffers.setdefault(func, [])
+        buffer.append((item, future))
+
+        if len(buffer) >= self.chunk_size:
+            self._flush(func)
+        elif func not in self._timers:
+            self._timers[func] = asyncio.get_running_loop().call_later(self.linger, self._flush, func)
+
+        return await future
+
+    def _flush(self, func: Callable[[Any], Any]) -> None:
+        timer = self._timers.pop(func, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._buffers.pop(func, [])
+        if not batch:
+            return
+
+        loop = asyncio.get_running_loop()
+        chunk_future = loop.run_in_executor(self._executor, _apply_chunk, func, [item for item, _ in batch])
+        previous = self._tail if self.ordered else None
+        resolver = loop.create_task(self._resolve(chunk_future, [future for _, future in batch], previous))
+        self._resolvers.add(resolver)
+        resolver.add_done_callback(self._resolvers.discard)
+        self._tail = resolver
+
+    async def _resolve(self, chunk_future: asyncio.Future, futures: List[asyncio.Future], previous: Optional[asyncio.Future]) -> None:
+        try:
+            results = await chunk_future
+            error = None
+        except Exception as e:
+            results = []
+            error = e
+
+        # In ordered mode a chunk's callers are released only after every
+        # earlier chunk's callers, so completion order matches submit order.
+        if previous is not None and not previous.done():
+            await asyncio.wait([previous])
+
+        for index, future in enumerate(futures):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[index])
+
+    async def close(self) -> None:
+        for func in list(self._buffers):
+            self._flush(func)
+        if self._resolvers:
+            await asyncio.wait(set(self._resolvers))
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
@@ -0,0 +1,195 @@
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from worker.logwriter import log
+
+PROFILE_MODES = ("sample", "cprofile")
+# awslogs sends each line as one event and Docker splits lines over 16KiB, so
+# output is logged in chunks that stay below that once JSON-escaped.
+LOG_CHUNK_BYTES = 12 * 1024
+TOP_STACKS = 20
+
+class ProfileBusy(RuntimeError):
+    pass
+
+class StackSampler:
+    # Every interval, records the stack of every other thread as one
+    # collapsed line (root;...;leaf), the format flamegraph.pl and speedscope
+    # read. It runs on its own thread and only reads sys._current_frames(),
+    # so the profiled code is not instrumented at all.
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._labels: Dict[Any, str] = {}
+
+    def _label(self, code: Any) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def sample_once(self) -> None:
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            self.stacks[";".join(reversed(labels))] += 1
+        self.samples += 1
+
+    def run(self, seconds: float) -> None:
+        deadline = time.monotonic() + seconds
+        next_sample = time.monotonic()
+        while next_sample < deadline:
+            self.sample_once()
+            next_sample += self.interval
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (e.g. GIL contention); skip rather than burst.
+                next_sample = time.monotonic()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class Profiler:
+    # One profile at a time, for at most max_seconds. Nothing is loaded or
+    # running between profiles.
+
+    def __init__(self, output_dir: str = "", interval: float = 0.01, max_seconds: float = 60.0) -> None:
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.running = False
+        self.completed = 0
+
+    async def run(self, seconds: float, mode: str = "sample") -> Dict[str, Any]:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}. Available: {list(PROFILE_MODES)}")
+        if self.running:
+            raise ProfileBusy("A profile is already running")
+        seconds = min(max(seconds, 0.1), self.max_seconds)
+
+        self.running = True
+        try:
+            profile_id = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+            log(f"Profiling for {seconds:.1f}s ({mode})", event="profile_start", profile_id=profile_id, mode=mode)
+            started = time.monotonic()
+            if mode == "sample":
+                text, summary = await self._sample(seconds)
+            else:
+                text, summary = await self._cprofile(seconds)
+            summary.update(profile_id=profile_id, mode=mode, seconds=round(time.monotonic() - started, 3))
+        finally:
+            self.running = False
+
+        if self.output_dir:
+            summary["path"] = await asyncio.to_thread(self._write, profile_id, mode, text)
+        summary["parts"] = self._log_chunks(profile_id, text)
+        self.completed += 1
+        log(f"Profile {profile_id} done", event="profile_done", **{k: v for k, v in summary.items() if k != "top"})
+        return summary
+
+    async def _sample(self, seconds: float) -> Any:
+        sampler = StackSampler(self.interval)
+        # A dedicated thread rather than the default executor, which may be
+        # busy with the very work being profiled.
+        done = asyncio.get_running_loop().create_future()
+
+        def target() -> None:
+            try:
+                sampler.run(seconds)
+            finally:
+                done.get_loop().call_soon_threadsafe(done.set_result, None)
+
+        threading.Thread(target=target, name="profiler", daemon=True).start()
+        await done
+        top = [{"stack": stack, "samples": count} for stack, count in sampler.stacks.most_common(TOP_STACKS)]
+        return sampler.collapsed(), {"samples": sampler.samples, "stacks": len(sampler.stacks), "top": top}
+
+    async def _cprofile(self, seconds: float) -> Any:
+        # Deterministic and far more costly than sampling; it only sees the
+        # event loop thread, which is where all the asyncio work runs.
+        import cProfile
+        import pstats
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(60)
+        top = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in sorted(
+            stats.stats.items(), key=lambda item: item[1][3], reverse=True
+        )[:TOP_STACKS]:
+            top.append({
+                "function": f"{name} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "total_s": round(total, 6),
+                "cumulative_s": round(cumulative, 6)
+            })
+        return out.getvalue(), {"functions": len(stats.stats), "top": top}
+
+    def _write(self, profile_id: str, mode: str, text: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile-{profile_id}.{'collapsed' if mode == 'sample' else 'pstats.txt'}")
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def _log_chunks(self, profile_id: str, text: str) -> int:
+        chunks: List[str] = []
+        current: List[str] = []
+        size = 0
+        for line in text.splitlines(keepends=True):
+            while len(line) > LOG_CHUNK_BYTES:
+                # A single very deep stack; split it rather than drop it.
+                chunks.append(line[:LOG_CHUNK_BYTES])
+                line = line[LOG_CHUNK_BYTES:]
+            if size + len(line) > LOG_CHUNK_BYTES and current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            current.append(line)
+            size += len(line)
+        if current:
+            chunks.append("".join(current))
+
+        for part, chunk in enumerate(chunks, start=1):
+            log(
+                f"Profile {profile_id} part {part}/{len(chunks)}",
+                event="profile_output",
+                profile_id=profile_id,
+                part=part,
+                parts=len(chunks),
+                data=chunk
+            )
+        return len(chunks)
+
+_profiler: Optional[Profiler] = None
+
+def get_profiler(**kwargs: Any) -> Profiler:
+    # kwargs only apply to the first call, which creates the profiler.
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(**kwargs)
+    return _profiler
@@ -0,0 +1,183 @@
+import hashlib
+import http.client
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from worker.sqs import CredentialProvider, sign_v4
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+class S3Error(Exception):
+
+    def __init__(self, code: str, message: str, status: int = 0) -> None:
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.status = status
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+def _xml_text(data: bytes, name: str) -> str:
+    # S3 responses are namespaced; match on the local name only.
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError:
+        return ""
+    for element in root.iter():
+        if element.tag.rpartition("}")[2] == name:
+            return element.text or ""
+    return ""
+
+class S3Client:
+    # Just the multipart upload calls the output sink needs, over a small pool
+    # of keep-alive connections like SqsClient. Without an endpoint_url it uses
+    # the bucket's regional virtual-hosted endpoint, which the VPC's S3 gateway
+    # endpoint routes without leaving the AWS network; an endpoint_url (e.g. a
+    # local S3-compatible server) is addressed path-style.
+
+    def __init__(
+        self,
+        bucket: str,
+        region: str,
+        endpoint_url: str = "",
+        max_connections: int = 4,
+        timeout: float = 60,
+        retries: int = 3,
+        credentials: Optional[CredentialProvider] = None
+    ) -> None:
+        if endpoint_url:
+            parts = urlsplit(endpoint_url)
+            if parts.scheme not in ("http", "https"):
+                raise ValueError(f"Unsupported S3 endpoint: {endpoint_url}")
+            scheme, self.host, self._base_path = parts.scheme, parts.netloc, f"/{bucket}"
+        else:
+            scheme, self.host, self._base_path = "https", f"{bucket}.s3.{region}.amazonaws.com", ""
+
+        self.bucket = bucket
+        self.region = region
+        self.timeout = timeout
+        self.retries = retries
+        self.credentials = credentials or CredentialProvider()
+        self._connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.requests = 0
+        self.connections_opened = 0
+
+    def request(self, method: str, key: str, query: Dict[str, str], body: bytes = b"") -> Response:
+        path = f"{self._base_path}/{_quote(key, safe='/-_.~')}"
+        canonical_query = "&".join(f"{_quote(name)}={_quote(value)}" for name, value in sorted(query.items()))
+        target = f"{path}?{canonical_query}" if canonical_query else path
+        payload_hash = hashlib.sha256(body).hexdigest()
+
+        # Throttling (503 SlowDown) and server errors are retried with backoff;
+        # the signature carries a timestamp, so each attempt is signed afresh.
+        for attempt in range(self.retries + 1):
+            headers = {"host": self.host, "x-amz-content-sha256": payload_hash}
+            credentials = self.credentials.get()
+            if credentials is not None:
+                sign_v4(
+                    headers,
+                    body,
+                    self.region,
+                    "s3",
+                    credentials,
+                    datetime.now(timezone.utc),
+                    method=method,
+                    path=path,
+                    query=canonical_query,
+                    payload_hash=payload_hash
+                )
+            try:
+                with self._slots:
+                    status, response_headers, data = self._send(method, target, headers, body)
+            except (http.client.HTTPException, OSError):
+                if attempt == self.retries:
+                    raise
+            else:
+                self.requests += 1
+                if status < 500 or attempt == self.retries:
+                    break
+            time.sleep(min(0.1 * 2 ** attempt, 5.0))
+
+        if status >= 300:
+            raise S3Error(_xml_text(data, "Code") or f"HTTP{status}", _xml_text(data, "Message"), status)
+        return status, response_headers, data
+
+    def _send(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Response:
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            return self._exchange(self._connect(), method, target, headers, body)
+
+        try:
+            return self._exchange(connection, method, target, headers, body)
+        except (http.client.HTTPException, OSError):
+            return self._exchange(self._connect(), method, target, headers, body)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        self.connections_opened += 1
+        return self._connection_class(self.host, timeout=self.timeout)
+
+    def _exchange(
+        self,
+        connection: http.client.HTTPConnection,
+        method: str,
+        target: str,
+        headers: Dict[str, str],
+        body: bytes
+    ) -> Response:
+        try:
+            connection.request(method, target, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._idle.put(connection)
+        return response.status, {name.lower(): value for name, value in response.getheaders()}, data
+
+    def create_multipart_upload(self, key: str) -> str:
+        _, _, data = self.request("POST", key, {"uploads": ""})
+        upload_id = _xml_text(data, "UploadId")
+        if not upload_id:
+            raise S3Error("InvalidResponse", f"no UploadId for {key}")
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        _, headers, _ = self.request("PUT", key, {"partNumber": str(part_number), "uploadId": upload_id}, data)
+        return headers.get("etag", "")
+
+    def complete_multipart_upload(self, key: str, upload_id: str, etags: List[str]) -> None:
+        body = "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in enumerate(etags, start=1)
+        )
+        _, _, data = self.request(
+            "POST",
+            key,
+            {"uploadId": upload_id},
+            f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode()
+        )
+        # A failed completion can still come back as 200, with an error body.
+        if _xml_text(data, "Code"):
+            raise S3Error(_xml_text(data, "Code"), _xml_text(data, "Message"), 200)
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        self.request("DELETE", key, {"uploadId": upload_id})
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,191 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from worker.logwriter import log
+from worker.ticker import SKIP, Ticker
+
+JobFunc = Callable[..., Awaitable[Any]]
+
+class SchedulerStopped(Exception):
+    pass
+
+class TaskScheduler:
+
+    def __init__(self, max_concurrency: int = 200) -> None:
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be >= 1, got {max_concurrency}")
+
+        self.max_concurrency = max_concurrency
+        # Slots for throttled submissions (intake) only. Periodic jobs are not
+        # throttled and take no slot, so a saturated or paused intake never
+        # holds up the heartbeat, metrics or the memory governor.
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # A lower, adjustable cap for throttled submissions.
+        self.limit = max_concurrency
+        self._throttled = 0
+        # Optional cap on the summed size of throttled jobs in flight; one job
+        # is always admitted when none are running, however large.
+        self.byte_limit: Optional[int] = None
+        self.bytes_in_flight = 0
+        self._capacity = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+        self._periodic: List[asyncio.Task] = []
+        self.tickers: Dict[str, Ticker] = {}
+        self._stopping = asyncio.Event()
+        self.completed = 0
+        self.failed = 0
+        self.waiting = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def throttled_in_flight(self) -> int:
+        return self._throttled
+
+    @property
+    def backlog(self) -> int:
+        return len(self._tasks) + self.waiting
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def set_limit(self, limit: int) -> None:
+        # 0 pauses throttled submissions until the limit is raised again.
+        self.limit = max(0, min(limit, self.max_concurrency))
+        self._capacity.set()
+
+    def set_byte_limit(self, limit: Optional[int]) -> None:
+        self.byte_limit = limit
+        self._capacity.set()
+
+    def _admits(self, size: int) -> bool:
+        if self._throttled >= self.limit:
+            return False
+        if self.byte_limit is None or self._throttled == 0:
+            return True
+        return self.bytes_in_flight + size <= self.byte_limit
+
+    async def submit(
+        self,
+        func: JobFunc,
+        *args: Any,
+        name: str = "job",
+        throttled: bool = True,
+        size: int = 0
+    ) -> asyncio.Task:
+        if self._stopping.is_set():
+            raise SchedulerStopped(f"Scheduler is stopping, rejected {name}")
+
+        # Waiting here is the backpressure: callers cannot outrun max_concurrency.
+        self.waiting += 1
+        try:
+            if throttled:
+                while not self._admits(size) and not self._stopping.is_set():
+                    self._capacity.clear()
+                    await self._capacity.wait()
+                self._throttled += 1
+                self.bytes_in_flight += size
+                try:
+                    await self._semaphore.acquire()
+                except BaseException:
+                    self._release_throttled(throttled, size)
+                    raise
+        finally:
+            self.waiting -= 1
+        if self._stopping.is_set():
+            if throttled:
+                self._semaphore.release()
+            self._release_throttled(throttled, size)
+            raise SchedulerStopped(f"Scheduler is stopping, rejected {name}")
+
+        task = asyncio.create_task(self._run_job(func, args, name, throttled, size), name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _release_throttled(self, throttled: bool, size: int = 0) -> None:
+        if throttled:
+            self._throttled -= 1
+            self.bytes_in_flight -= size
+            self._capacity.set()
+
+    async def _run_job(self, func: JobFunc, args: tuple, name: str, throttled: bool = True, size: int = 0) -> Any:
+        try:
+            result = await func(*args)
+            self.completed += 1
+            return result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            log(f"Job {name} failed: {e}", level="ERROR", job=name)
+        finally:
+            if throttled:
+                self._semaphore.release()
+            self._release_throttled(throttled, size)
+
+    def add_periodic(self, name: str, func: JobFunc, interval: float, policy: str = SKIP) -> Ticker:
+        ticker = Ticker(interval, policy=policy)
+        self.tickers[name] = ticker
+        self._periodic.append(
+            asyncio.create_task(self._periodic_loop(name, func, ticker), name=f"periodic-{name}")
+        )
+        return ticker
+
+    async def _periodic_loop(self, name: str, func: JobFunc, ticker: Ticker) -> None:
+        async def timed() -> Any:
+            started = time.monotonic()
+            try:
+                return await func()
+            finally:
+                ticker.record_duration(time.monotonic() - started)
+
+        while not self._stopping.is_set():
+            delay = ticker.delay()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            ticker.fire()
+            try:
+                task = await self.submit(timed, name=name, throttled=False)
+            except SchedulerStopped:
+                break
+            # A run slower than the interval never overlaps the next one; the
+            # ticks it missed are skipped or caught up by the policy.
+            await asyncio.wait({task})
+
+    async def run(self) -> None:
+        await self._stopping.wait()
+
+    async def wait_stopped(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._capacity.set()
+
+    async def drain(self, timeout: float) -> bool:
+        for task in self._periodic:
+            task.cancel()
+        await asyncio.gather(*self._periodic, return_exceptions=True)
+        self._periodic.clear()
+
+        if not self._tasks:
+            return True
+
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return not pending
@@ -0,0 +1,95 @@
+import os
+from typing import Dict, Any
+
+def get_settings() -> Dict[str, Any]:
+    tick_interval = float(os.getenv("TICK_INTERVAL_SECONDS", "10"))
+    return {
+        "environment": os.getenv("ENVIRONMENT", "unknown"),
+        "project_name": os.getenv("PROJECT_NAME", "unknown"),
+        "tick_interval": tick_interval,
+        "tick_policy": os.getenv("TICK_MISSED_POLICY", "skip"),
+        "loop_lag_probe_interval": float(os.getenv("LOOP_LAG_PROBE_SECONDS", "0.5")),
+        "loop_lag_warn_ms": float(os.getenv("LOOP_LAG_WARN_MS", "100")),
+        "stats_interval": float(os.getenv("STATS_INTERVAL_SECONDS", "60")),
+        "metrics_namespace": os.getenv("METRICS_NAMESPACE", "HCM/POC"),
+        "metrics_interval": float(os.getenv("METRICS_INTERVAL_SECONDS", "60")),
+        "max_concurrency": int(os.getenv("MAX_CONCURRENCY", "200")),
+        "health_host": os.getenv("HEALTH_HOST", "127.0.0.1"),
+        "health_port": int(os.getenv("HEALTH_PORT", "8080")),
+        "health_max_tick_age": float(os.getenv("HEALTH_MAX_TICK_AGE_SECONDS", str(tick_interval * 3))),
+        "shutdown_timeout": float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "25")),
+        "ingest_path": os.getenv("INGEST_PATH", "requests.jsonl"),
+        "ingest_offset_path": os.getenv("INGEST_OFFSET_PATH", ""),
+        "ingest_chunk_bytes": int(os.getenv("INGEST_CHUNK_BYTES", str(1024 * 1024))),
+        "ingest_follow": os.getenv("INGEST_FOLLOW", "true").lower() == "true",
+        "ingest_watch": os.getenv("INGEST_WATCH", "true").lower() == "true",
+        "intake_poll_min": float(os.getenv("INTAKE_POLL_MIN_SECONDS", "2")),
+        "intake_poll_max": float(os.getenv("INTAKE_POLL_MAX_SECONDS", "30")),
+        "intake_poll_backoff": float(os.getenv("INTAKE_POLL_BACKOFF", "4")),
+        "sqs_queue_url": os.getenv("SQS_QUEUE_URL", ""),
+        "sqs_batch_size": int(os.getenv("SQS_BATCH_SIZE", "10")),
+        "sqs_wait_seconds": int(os.getenv("SQS_WAIT_SECONDS", "20")),
+        "sqs_visibility_timeout": int(os.getenv("SQS_VISIBILITY_TIMEOUT_SECONDS", "30")),
+        "sqs_pollers": int(os.getenv("SQS_POLLERS", "2")),
+        "sqs_max_connections": int(os.getenv("SQS_MAX_CONNECTIONS", "8")),
+        "sqs_delete_interval": float(os.getenv("SQS_DELETE_INTERVAL_SECONDS", "0.5")),
+        "http_max_per_host": int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "10")),
+        "http_timeout": float(os.getenv("HTTP_TIMEOUT_SECONDS", "10")),
+        "http_retries": int(os.getenv("HTTP_RETRIES", "3")),
+        "http_retry_after_max": float(os.getenv("HTTP_RETRY_AFTER_MAX_SECONDS", "30")),
+        "http_rate_limits": os.getenv("HTTP_RATE_LIMITS", ""),
+        "http_breaker_failures": int(os.getenv("HTTP_BREAKER_FAILURES", "5")),
+        "http_breaker_reset": float(os.getenv("HTTP_BREAKER_RESET_SECONDS", "30")),
+        "partition_shards": int(os.getenv("PARTITION_SHARDS", "0")),
+        "partition_store": os.getenv("PARTITION_STORE", "sqlite"),
+        "partition_store_path": os.getenv("PARTITION_STORE_PATH", "leases.db"),
+        "partition_lease_ttl": float(os.getenv("PARTITION_LEASE_TTL_SECONDS", "15")),
+        "partition_owner": os.getenv("PARTITION_OWNER", ""),
+        "reference_api_url": os.getenv("REFERENCE_API_URL", ""),
+        "cache_memory_mib": float(os.getenv("CACHE_MEMORY_MIB", "0")),
+        "cache_memory_fraction": float(os.getenv("CACHE_MEMORY_FRACTION", "0.15")),
+        "cache_ttl": float(os.getenv("CACHE_TTL_SECONDS", "300")),
+        "cache_stale_ttl": float(os.getenv("CACHE_STALE_SECONDS", "60")),
+        "cache_warm_path": os.getenv("CACHE_WARM_PATH", ""),
+        "cache_warm_timeout": float(os.getenv("CACHE_WARM_TIMEOUT_SECONDS", "20")),
+        "output_bucket": os.getenv("OUTPUT_BUCKET", ""),
+        "output_dir": os.getenv("OUTPUT_DIR", ""),
+        "output_s3_endpoint": os.getenv("OUTPUT_S3_ENDPOINT", ""),
+        "output_prefix": os.getenv("OUTPUT_PREFIX", "results"),
+        "output_format": os.getenv("OUTPUT_FORMAT", "jsonl"),
+        "output_codec": os.getenv("OUTPUT_CODEC", "gzip"),
+        "output_batch_mib": float(os.getenv("OUTPUT_BATCH_MIB", "64")),
+        "output_buffer_mib": float(os.getenv("OUTPUT_BUFFER_MIB", "4")),
+        "output_part_mib": float(os.getenv("OUTPUT_PART_MIB", "8")),
+        "output_max_age": float(os.getenv("OUTPUT_MAX_AGE_SECONDS", "60")),
+        "dedupe_enabled": os.getenv("DEDUPE_ENABLED", "true").lower() == "true",
+        "dedupe_store": os.getenv("DEDUPE_STORE", "memory"),
+        "dedupe_path": os.getenv("DEDUPE_PATH", "dedupe.db"),
+        "dedupe_key": os.getenv("DEDUPE_KEY", "request_id"),
+        "dedupe_window_keys": int(os.getenv("DEDUPE_WINDOW_KEYS", "1000000")),
+        "dedupe_window_seconds": float(os.getenv("DEDUPE_WINDOW_SECONDS", "86400")),
+        "dedupe_error_rate": float(os.getenv("DEDUPE_ERROR_RATE", "0.001")),
+        "dedupe_memory_mib": float(os.getenv("DEDUPE_MEMORY_MIB", "0")),
+        "dedupe_memory_fraction": float(os.getenv("DEDUPE_MEMORY_FRACTION", "0.10")),
+        "dedupe_flush_interval": float(os.getenv("DEDUPE_FLUSH_SECONDS", "1")),
+        "dedupe_claim_seconds": float(os.getenv("DEDUPE_CLAIM_SECONDS", "300")),
+        "memory_limit_mib": float(os.getenv("MEMORY_LIMIT_MIB", "0")),
+        "memory_check_interval": float(os.getenv("MEMORY_CHECK_SECONDS", "1")),
+        "memory_shrink_at": float(os.getenv("MEMORY_SHRINK_AT", "0.70")),
+        "memory_throttle_at": float(os.getenv("MEMORY_THROTTLE_AT", "0.80")),
+        "memory_pause_at": float(os.getenv("MEMORY_PAUSE_AT", "0.90")),
+        "memory_tracemalloc": os.getenv("MEMORY_TRACEMALLOC", "true").lower() == "true",
+        "profile_seconds": float(os.getenv("PROFILE_SECONDS", "10")),
+        "profile_max_seconds": float(os.getenv("PROFILE_MAX_SECONDS", "60")),
+        "profile_mode": os.getenv("PROFILE_MODE", "sample"),
+        "profile_interval": float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10")) / 1000,
+        "profile_dir": os.getenv("PROFILE_DIR", ""),
+        "checkpoint_backend": os.getenv("CHECKPOINT_BACKEND", "file"),
+        "checkpoint_dir": os.getenv("CHECKPOINT_DIR", ".checkpoint"),
+        "checkpoint_sync_interval": float(os.getenv("CHECKPOINT_SYNC_SECONDS", "1")),
+        "checkpoint_compact_bytes": int(os.getenv("CHECKPOINT_COMPACT_BYTES", str(16 * 1024 * 1024))),
+        "execution_mode": os.getenv("EXECUTION_MODE", "async"),
+        "pool_workers": int(os.getenv("POOL_WORKERS", "0")),
+        "pool_chunk_size": int(os.getenv("POOL_CHUNK_SIZE", "256")),
+        "pool_ordered": os.getenv("POOL_ORDERED", "true").lower() == "true"
+    }
@@ -0,0 +1,27 @@
+import asyncio
+import signal
+import time
+from typing import Callable, Iterable
+
+SHUTDOWN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+class Deadline:
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.expires = self.started + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+def install_signal_handlers(
+    on_signal: Callable[[str], None],
+    signals: Iterable[signal.Signals] = SHUTDOWN_SIGNALS
+) -> None:
+    loop = asyncio.get_running_loop()
+    for sig in signals:
+        loop.add_signal_handler(sig, on_signal, sig.name)
@@ -0,0 +1,630 @@
+import asyncio
+import functools
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from worker.logwriter import log
+from worker.metrics import get_metrics
+from worker.polling import DRAINING, AdaptivePoller
+from worker.scheduler import SchedulerStopped, TaskScheduler
+
+# A handler may return a future that resolves once the message's results are
+# written; the message is deleted only after that.
+MessageHandler = Callable[[Any], Awaitable[Any]]
+
+MAX_BATCH = 10
+CONTAINER_CREDENTIALS_HOST = "169.254.170.2"
+
+class SqsError(Exception):
+
+    def __init__(self, code: str, message: str, status: int = 0) -> None:
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.status = status
+
+class CredentialProvider:
+    # Static keys from the environment, otherwise the task role through the ECS
+    # container credentials endpoint, refreshed a few minutes before expiry.
+
+    def __init__(self, refresh_margin: float = 300) -> None:
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._credentials: Optional[Dict[str, str]] = None
+        self._expires_at = 0.0
+
+    def get(self) -> Optional[Dict[str, str]]:
+        with self._lock:
+            if self._expires_at - self.refresh_margin < time.time():
+                self._credentials, self._expires_at = self._load()
+            return self._credentials
+
+    def _load(self) -> Tuple[Optional[Dict[str, str]], float]:
+        if os.getenv("AWS_ACCESS_KEY_ID") and os.getenv("AWS_SECRET_ACCESS_KEY"):
+            return {
+                "access_key": os.environ["AWS_ACCESS_KEY_ID"],
+                "secret_key": os.environ["AWS_SECRET_ACCESS_KEY"],
+                "token": os.getenv("AWS_SESSION_TOKEN", "")
+            }, float("inf")
+
+        relative_uri = os.getenv("AWS_CONTAINER_CREDENTIALS_RELATIVE_URI")
+        if not relative_uri:
+            # Nothing to sign with; the local stand-in accepts unsigned requests.
+            return None, float("inf")
+
+        connection = http.client.HTTPConnection(CONTAINER_CREDENTIALS_HOST, timeout=2)
+        try:
+            connection.request("GET", relative_uri)
+            response = connection.getresponse()
+            data = response.read()
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise SqsError("CredentialsError", f"container credentials endpoint returned {response.status}")
+
+        body = json.loads(data)
+        expires_at = datetime.fromisoformat(body["Expiration"].replace("Z", "+00:00")).timestamp()
+        return {
+            "access_key": body["AccessKeyId"],
+            "secret_key": body["SecretAccessKey"],
+            "token": body.get("Token", "")
+        }, expires_at
+
+@functools.lru_cache(maxsize=8)
+def _signing_key(secret_key: str, date: str, region: str, service: str) -> bytes:
+    key = f"AWS4{secret_key}".encode()
+    for part in (date, region, service, "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return key
+
+def sign_v4(
+    headers: Dict[str, str],
+    body: bytes,
+    region: str,
+    service: str,
+    credentials: Dict[str, str],
+    now: datetime,
+    method: str = "POST",
+    path: str = "/",
+    query: str = "",
+    payload_hash: Optional[str] = None
+) -> None:
+    # Signs a request in place. Header names must already be lower case, and
+    # path and query must already be in canonical (URI-encoded) form.
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = amz_date[:8]
+    headers["x-amz-date"] = amz_date
+    if credentials["token"]:
+        headers["x-amz-security-token"] = credentials["token"]
+
+    signed_headers = sorted(headers)
+    canonical_request = "\n".join([
+        method,
+        path,
+        query,
+        "".join(f"{name}:{headers[name].strip()}\n" for name in signed_headers),
+        ";".join(signed_headers),
+        payload_hash or hashlib.sha256(body).hexdigest()
+    ])
+    scope = f"{date}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256",
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest()
+    ])
+    signature = hmac.new(
+        _signing_key(credentials["secret_key"], date, region, service),
+        string_to_sign.encode(),
+        hashlib.sha256
+    ).hexdigest()
+    headers["authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={credentials['access_key']}/{scope}, "
+        f"SignedHeaders={';'.join(signed_headers)}, Signature={signature}"
+    )
+
+class SqsClient:
+    # Speaks the SQS JSON protocol over a small pool of keep-alive connections.
+    # Calls block, so they run on threads; the pool lets concurrent pollers and
+    # batch calls share connections instead of paying a TLS handshake each time.
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        region: str,
+        max_connections: int = 8,
+        timeout: float = 30,
+        credentials: Optional[CredentialProvider] = None
+    ) -> None:
+        parts = urlsplit(endpoint_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported SQS endpoint: {endpoint_url}")
+
+        self.endpoint_url = f"{parts.scheme}://{parts.netloc}"
+        self.host = parts.netloc
+        self.region = region
+        self.timeout = timeout
+        self.credentials = credentials or CredentialProvider()
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.requests = 0
+        self.connections_opened = 0
+
+    def call(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        body = json.dumps(params).encode()
+        headers = {
+            "content-type": "application/x-amz-json-1.0",
+            "host": self.host,
+            "x-amz-target": f"AmazonSQS.{action}"
+        }
+        credentials = self.credentials.get()
+        if credentials is not None:
+            sign_v4(headers, body, self.region, "sqs", credentials, datetime.now(timezone.utc))
+
+        with self._slots:
+            status, data = self._send(headers, body)
+        self.requests += 1
+
+        try:
+            payload = json.loads(data) if data else {}
+        except ValueError:
+            payload = {}
+        if status != 200:
+            code = payload.get("__type", "").rpartition("#")[2] or f"HTTP{status}"
+            raise SqsError(code, payload.get("message", payload.get("Message", "")), status)
+        return payload
+
+    def _send(self, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            return self._exchange(self._connect(), headers, body)
+
+        try:
+            return self._exchange(connection, headers, body)
+        except (http.client.HTTPException, OSError):
+            # The other end may have closed the idle connection, which only
+            # shows up on first use; retry once on a fresh one.
+            return self._exchange(self._connect(), headers, body)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        self.connections_opened += 1
+        return self._connection_class(self.host, timeout=self.timeout)
+
+    def _exchange(self, connection: http.client.HTTPConnection, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        try:
+            connection.request("POST", "/", body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._idle.put(connection)
+        return response.status, data
+
+    def receive_messages(
+        self,
+        queue_url: str,
+        max_messages: int = MAX_BATCH,
+        wait_seconds: int = 20,
+        visibility_timeout: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        params: Dict[str, Any] = {
+            "QueueUrl": queue_url,
+            "MaxNumberOfMessages": max_messages,
+            "WaitTimeSeconds": wait_seconds,
+            "MessageSystemAttributeNames": ["ApproximateReceiveCount"]
+        }
+        if visibility_timeout is not None:
+            params["VisibilityTimeout"] = visibility_timeout
+        return self.call("ReceiveMessage", params).get("Messages", [])
+
+    def send_message_batch(self, queue_url: str, bodies: List[str]) -> List[Dict[str, Any]]:
+        entries = [{"Id": str(i), "MessageBody": body} for i, body in enumerate(bodies)]
+        return self._batch("SendMessageBatch", queue_url, entries)
+
+    def delete_message_batch(self, queue_url: str, receipt_handles: List[str]) -> List[Dict[str, Any]]:
+        entries = [{"Id": str(i), "ReceiptHandle": handle} for i, handle in enumerate(receipt_handles)]
+        return self._batch("DeleteMessageBatch", queue_url, entries)
+
+    def change_visibility_batch(self, queue_url: str, receipt_handles: List[str], timeout: int) -> List[Dict[str, Any]]:
+        entries = [
+            {"Id": str(i), "ReceiptHandle": handle, "VisibilityTimeout": timeout}
+            for i, handle in enumerate(receipt_handles)
+        ]
+        return self._batch("ChangeMessageVisibilityBatch", queue_url, entries)
+
+    def get_queue_attributes(self, queue_url: str, names: List[str]) -> Dict[str, str]:
+        return self.call("GetQueueAttributes", {"QueueUrl": queue_url, "AttributeNames": names}).get("Attributes", {})
+
+    def _batch(self, action: str, queue_url: str, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if len(entries) > MAX_BATCH:
+            raise ValueError(f"{action} takes at most {MAX_BATCH} entries, got {len(entries)}")
+        return self.call(action, {"QueueUrl": queue_url, "Entries": entries}).get("Failed", [])
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_clients: Dict[Tuple[str, str], SqsClient] = {}
+_clients_lock = threading.Lock()
+
+def get_sqs_client(queue_url: str, region: Optional[str] = None, max_connections: int = 8) -> SqsClient:
+    # One client per endpoint for the whole process.
+    parts = urlsplit(queue_url)
+    endpoint_url = f"{parts.scheme}://{parts.netloc}"
+    region = region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
+
+    with _clients_lock:
+        client = _clients.get((endpoint_url, region))
+        if client is None:
+            client = SqsClient(endpoint_url, region, max_connections=max_connections)
+            _clients[(endpoint_url, region)] = client
+        return client
+
+def close_sqs_clients() -> None:
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+class QueueConsumer:
+    # Long-polls in batches, keeps messages invisible while they wait for a
+    # scheduler slot or run, and deletes finished ones in batches. A message
+    # whose handler fails is left alone: it reappears after the visibility
+    # timeout and the queue's redrive policy sets it aside after a few tries.
+    # A message whose results are still being written keeps its lease until
+    # they are, and is left alone the same way if the write fails.
+
+    def __init__(
+        self,
+        client: SqsClient,
+        queue_url: str,
+        scheduler: TaskScheduler,
+        handler: MessageHandler,
+        batch_size: int = MAX_BATCH,
+        wait_seconds: int = 20,
+        visibility_timeout: int = 30,
+        pollers: int = 1,
+        delete_interval: float = 0.5,
+        poller: Optional[AdaptivePoller] = None
+    ) -> None:
+        if not 1 <= batch_size <= MAX_BATCH:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH}, got {batch_size}")
+        if pollers < 1:
+            raise ValueError(f"pollers must be >= 1, got {pollers}")
+
+        self.client = client
+        self.queue_url = queue_url
+        self.scheduler = scheduler
+        self.handler = handler
+        self.batch_size = batch_size
+        self.wait_seconds = wait_seconds
+        self.visibility_timeout = visibility_timeout
+        self.pollers = pollers
+        self.delete_interval = delete_interval
+        # A long poll already waits for work, so the poller's interval is not
+        # used here; its mode decides whether the extra pollers run.
+        self.poller = poller or AdaptivePoller()
+        self._busy = asyncio.Event()
+        if self.poller.mode == DRAINING:
+            self._busy.set()
+        self._executor = ThreadPoolExecutor(max_workers=pollers + 4, thread_name_prefix="sqs")
+        # receipt handle -> monotonic time the message becomes visible again
+        self._leases: Dict[str, float] = {}
+        self._deletes: List[str] = []
+        self._abandoned: List[str] = []
+        # receipt handle -> future of its results being written
+        self._unwritten: Dict[str, asyncio.Future] = {}
+        self._delete_ready = asyncio.Event()
+        self._closing = False
+        self.received = 0
+        self.deleted = 0
+        self.failed = 0
+        self.extended = 0
+        self.released = 0
+        self.polls = 0
+        self.empty_polls = 0
+
+        metrics = get_metrics()
+        self._received_metric = metrics.counter("QueueMessagesReceived")
+        self._deleted_metric = metrics.counter("QueueMessagesDeleted")
+        self._empty_metric = metrics.counter("QueueEmptyReceives")
+
+    async def _call(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def run(self) -> None:
+        log(
+            f"Consuming {self.queue_url} with {self.pollers} poller(s)",
+            event="queue_start",
+            queue_url=self.queue_url,
+            pollers=self.pollers,
+            batch_size=self.batch_size
+        )
+        in_flight: Set[asyncio.Task] = set()
+        helpers = [
+            asyncio.create_task(self._extend_loop(), name="queue-extend"),
+            asyncio.create_task(self._delete_loop(), name="queue-delete")
+        ]
+
+        try:
+            await asyncio.gather(*(self._poll_loop(index, in_flight) for index in range(self.pollers)))
+            if in_flight:
+                await asyncio.wait(set(in_flight))
+            if self._unwritten:
+                await asyncio.wait(set(self._unwritten.values()))
+        finally:
+            # Cancelled at the shutdown deadline (e.g. a Spot interruption):
+            # whatever is still running is handed back to the queue now rather
+            # than after the visibility timeout, so other tasks pick it up.
+            unfinished = [task for task in in_flight if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+            for handle in list(self._unwritten):
+                self._leases.pop(handle, None)
+                self._abandoned.append(handle)
+            self._unwritten.clear()
+            if self._abandoned:
+                handles, self._abandoned = self._abandoned, []
+                await self._call(self._release_now, handles)
+
+            # Let a delete flush that is already running finish, then send the rest.
+            self._closing = True
+            self._delete_ready.set()
+            helpers[0].cancel()
+            await asyncio.gather(*helpers, return_exceptions=True)
+            await self._flush_deletes()
+            self._executor.shutdown(wait=False)
+
+        log(
+            f"Consumed {self.deleted} messages from {self.queue_url}",
+            event="queue_done",
+            received=self.received,
+            deleted=self.deleted,
+            failed=self.failed,
+            extended=self.extended,
+            released=self.released,
+            polls=self.polls,
+            empty_polls=self.empty_polls
+        )
+
+    async def _poll_loop(self, index: int, in_flight: Set[asyncio.Task]) -> None:
+        backoff = 0.0
+        while not self.scheduler.stopping:
+            if index > 0 and not self._busy.is_set():
+                # Only the first poller runs while the queue is idle.
+                await self._wait_busy()
+                continue
+
+            try:
+                messages = await self._receive()
+            except (SqsError, OSError, http.client.HTTPException) as e:
+                backoff = min(max(backoff * 2, 1.0), 20.0)
+                log(f"Receive from {self.queue_url} failed, retrying in {backoff:.0f}s: {e}", level="WARNING", event="queue_error")
+                await self.scheduler.wait_stopped(timeout=backoff)
+                continue
+            backoff = 0.0
+
+            for position, message in enumerate(messages):
+                # submit() blocks while the scheduler is full; the leases keep the
+                # waiting messages invisible in the meantime.
+                try:
+                    task = await self.scheduler.submit(
+                        self._process, message, name="queue", size=len(message["Body"])
+                    )
+                except SchedulerStopped:
+                    await self._release(messages[position:])
+                    return
+                except asyncio.CancelledError:
+                    # Still waiting for a slot at the shutdown deadline.
+                    for waiting in messages[position:]:
+                        self._leases.pop(waiting["ReceiptHandle"], None)
+                        self._abandoned.append(waiting["ReceiptHandle"])
+                    raise
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+    async def _wait_busy(self) -> None:
+        busy = asyncio.ensure_future(self._busy.wait())
+        stopped = asyncio.ensure_future(self.scheduler.wait_stopped())
+        await asyncio.wait({busy, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        busy.cancel()
+        stopped.cancel()
+
+    def _record_receive(self, found: int) -> None:
+        mode = self.poller.mode
+        self.poller.record(found, more=found == self.batch_size)
+        if self.poller.mode == DRAINING:
+            self._busy.set()
+        else:
+            self._busy.clear()
+        if self.poller.mode != mode:
+            log(f"Queue intake is {self.poller.mode}", event="intake_mode", mode=self.poller.mode)
+
+    async def _receive(self) -> List[Dict[str, Any]]:
+        state = {"returned": False, "abandoned": False}
+        lock = threading.Lock()
+
+        def receive() -> Tuple[List[Dict[str, Any]], float]:
+            messages = self.client.receive_messages(
+                self.queue_url,
+                max_messages=self.batch_size,
+                wait_seconds=self.wait_seconds,
+                visibility_timeout=self.visibility_timeout
+            )
+            received_at = time.monotonic()
+            with lock:
+                state["returned"] = True
+                abandoned = state["abandoned"]
+            if abandoned:
+                self._release_now([message["ReceiptHandle"] for message in messages])
+                return [], received_at
+            return messages, received_at
+
+        poll = asyncio.ensure_future(self._call(receive))
+        stopped = asyncio.ensure_future(self.scheduler.wait_stopped())
+        await asyncio.wait({poll, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        self.polls += 1
+
+        if not poll.done():
+            # Stopping mid long-poll: don't hold shutdown for the rest of the
+            # wait. Whatever the poll still returns goes straight back.
+            with lock:
+                state["abandoned"] = True
+                returned = state["returned"]
+            if returned:
+                messages, _ = await poll
+                await self._release(messages)
+            return []
+
+        stopped.cancel()
+        messages, received_at = poll.result()
+        for message in messages:
+            self._leases[message["ReceiptHandle"]] = received_at + self.visibility_timeout
+        self.received += len(messages)
+        self._received_metric.inc(len(messages))
+        self._record_receive(len(messages))
+        if not messages:
+            self.empty_polls += 1
+            self._empty_metric.inc()
+        return messages
+
+    async def _process(self, message: Dict[str, Any]) -> None:
+        handle = message["ReceiptHandle"]
+        try:
+            record = json.loads(message["Body"])
+            durable = await self.handler(record)
+        except asyncio.CancelledError:
+            self._leases.pop(handle, None)
+            self._abandoned.append(handle)
+            raise
+        except Exception:
+            self._leases.pop(handle, None)
+            self.failed += 1
+            raise
+
+        if isinstance(durable, asyncio.Future) and not durable.done():
+            self._unwritten[handle] = durable
+            durable.add_done_callback(functools.partial(self._written, handle))
+        else:
+            self._settle(handle, durable)
+
+    def _written(self, handle: str, durable: asyncio.Future) -> None:
+        # Gone already if run() handed the message back at shutdown.
+        if self._unwritten.pop(handle, None) is durable:
+            self._settle(handle, durable)
+
+    def _settle(self, handle: str, durable: Any) -> None:
+        self._leases.pop(handle, None)
+        if isinstance(durable, asyncio.Future) and (durable.cancelled() or durable.exception() is not None):
+            self.failed += 1
+            return
+        self._deletes.append(handle)
+        if len(self._deletes) >= MAX_BATCH:
+            self._delete_ready.set()
+
+    async def _delete_loop(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._delete_ready.wait(), timeout=self.delete_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._delete_ready.clear()
+            await self._flush_deletes()
+
+    async def _flush_deletes(self) -> None:
+        if not self._deletes:
+            return
+
+        handles, self._deletes = self._deletes, []
+        batches = [handles[i:i + MAX_BATCH] for i in range(0, len(handles), MAX_BATCH)]
+        results = await asyncio.gather(
+            *(self._call(self.client.delete_message_batch, self.queue_url, batch) for batch in batches),
+            return_exceptions=True
+        )
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                # Put them back for the next flush; if that never comes they are
+                # redelivered after the visibility timeout.
+                log(f"Delete batch failed, will retry: {result}", level="WARNING", event="queue_error")
+                self._deletes.extend(batch)
+                continue
+            for failure in result:
+                log(f"Delete failed: {failure.get('Code')} {failure.get('Message', '')}", level="WARNING", event="queue_error")
+            deleted = len(batch) - len(result)
+            self.deleted += deleted
+            self._deleted_metric.inc(deleted)
+
+    async def _extend_loop(self) -> None:
+        # Extend anything within half a visibility timeout of reappearing, so a
+        # slow job is not handed to another task while it is still running.
+        interval = max(self.visibility_timeout / 4, 0.5)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            due = [handle for handle, until in self._leases.items() if until - now < self.visibility_timeout / 2]
+            if due:
+                await self._extend(due)
+
+    async def _extend(self, handles: List[str]) -> None:
+        batches = [handles[i:i + MAX_BATCH] for i in range(0, len(handles), MAX_BATCH)]
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(
+                self._call(self.client.change_visibility_batch, self.queue_url, batch, self.visibility_timeout)
+                for batch in batches
+            ),
+            return_exceptions=True
+        )
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                log(f"Visibility extension failed: {result}", level="WARNING", event="queue_error")
+                continue
+            failed = {batch[int(failure["Id"])] for failure in result}
+            for handle in batch:
+                if handle not in self._leases:
+                    continue
+                if handle in failed:
+                    # The receipt is no longer valid, the message has already
+                    # reappeared; there is nothing left to protect.
+                    self._leases.pop(handle, None)
+                else:
+                    self._leases[handle] = started + self.visibility_timeout
+                    self.extended += 1
+
+    async def _release(self, messages: List[Dict[str, Any]]) -> None:
+        handles = [message["ReceiptHandle"] for message in messages]
+        for handle in handles:
+            self._leases.pop(handle, None)
+        if handles:
+            await self._call(self._release_now, handles)
+
+    def _release_now(self, handles: List[str]) -> None:
+        # Visibility 0 makes unstarted messages available to other tasks at once
+        # instead of after the visibility timeout.
+        for i in range(0, len(handles), MAX_BATCH):
+            batch = handles[i:i + MAX_BATCH]
+            try:
+                self.client.change_visibility_batch(self.queue_url, batch, 0)
+                self.released += len(batch)
+            except (SqsError, OSError, http.client.HTTPException) as e:
+                log(f"Releasing messages failed: {e}", level="WARNING", event="queue_error")
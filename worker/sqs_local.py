@@ -0,0 +1,293 @@
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# A stand-in for the slice of the SQS JSON protocol the worker uses, so the
+# consumer can run and be benchmarked without AWS:
+#
+#   python3 -m worker.sqs_local --port 9324 --seed 1000
+#   SQS_QUEUE_URL=http://127.0.0.1:9324/000000000000/local python3 app.py
+
+ACCOUNT_ID = "000000000000"
+
+Response = Tuple[int, Dict[str, Any]]
+
+def _error(code: str, message: str) -> Response:
+    return 400, {"__type": f"com.amazonaws.sqs#{code}", "message": message}
+
+class LocalQueue:
+
+    def __init__(self, name: str, visibility_timeout: int = 30) -> None:
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self._messages: Dict[str, Dict[str, Any]] = {}
+        self._ready: Deque[str] = deque()
+        # (visible_at, message_id, receipt) for messages that are out on a receive
+        self._invisible: List[Tuple[float, str, str]] = []
+        self._receipts = itertools.count(1)
+        self._condition = threading.Condition()
+
+    def send(self, body: str) -> str:
+        message_id = str(uuid.uuid4())
+        with self._condition:
+            self._messages[message_id] = {"body": body, "receipt": None, "visible_at": 0.0, "receive_count": 0}
+            self._ready.append(message_id)
+            self._condition.notify()
+        return message_id
+
+    def _expire(self, now: float) -> None:
+        while self._invisible and self._invisible[0][0] <= now:
+            _, message_id, receipt = heapq.heappop(self._invisible)
+            message = self._messages.get(message_id)
+            if message is not None and message["receipt"] == receipt and message["visible_at"] <= now:
+                message["receipt"] = None
+                self._ready.append(message_id)
+
+    def receive(self, max_messages: int, wait_seconds: float, visibility_timeout: Optional[int]) -> List[Dict[str, Any]]:
+        timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+        deadline = time.monotonic() + wait_seconds
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if self._ready or now >= deadline:
+                    break
+                wake_at = min(deadline, self._invisible[0][0]) if self._invisible else deadline
+                self._condition.wait(wake_at - now)
+
+            received = []
+            while self._ready and len(received) < max_messages:
+                message_id = self._ready.popleft()
+                message = self._messages.get(message_id)
+                if message is None or message["receipt"] is not None:
+                    continue
+                receipt = f"{message_id}#{next(self._receipts)}"
+                message["receipt"] = receipt
+                message["visible_at"] = now + timeout
+                message["receive_count"] += 1
+                heapq.heappush(self._invisible, (message["visible_at"], message_id, receipt))
+                received.append({
+                    "MessageId": message_id,
+                    "ReceiptHandle": receipt,
+                    "MD5OfBody": hashlib.md5(message["body"].encode()).hexdigest(),
+                    "Body": message["body"],
+                    "Attributes": {"ApproximateReceiveCount": str(message["receive_count"])}
+                })
+            return received
+
+    def _current(self, receipt: str) -> Optional[Dict[str, Any]]:
+        message = self._messages.get(receipt.partition("#")[0])
+        if message is None or message["receipt"] != receipt:
+            return None
+        return message
+
+    def delete(self, receipt: str) -> bool:
+        with self._condition:
+            message_id = receipt.partition("#")[0]
+            if message_id not in self._messages:
+                # Already deleted; SQS treats this as success too.
+                return True
+            if self._current(receipt) is None:
+                return False
+            del self._messages[message_id]
+            return True
+
+    def change_visibility(self, receipt: str, timeout: int) -> bool:
+        with self._condition:
+            message = self._current(receipt)
+            if message is None:
+                return False
+            message["visible_at"] = time.monotonic() + timeout
+            heapq.heappush(self._invisible, (message["visible_at"], receipt.partition("#")[0], receipt))
+            if timeout == 0:
+                self._condition.notify()
+            return True
+
+    def attributes(self) -> Dict[str, str]:
+        with self._condition:
+            self._expire(time.monotonic())
+            visible = sum(1 for message in self._messages.values() if message["receipt"] is None)
+            return {
+                "ApproximateNumberOfMessages": str(visible),
+                "ApproximateNumberOfMessagesNotVisible": str(len(self._messages) - visible),
+                "VisibilityTimeout": str(self.visibility_timeout)
+            }
+
+    def purge(self) -> None:
+        with self._condition:
+            self._messages.clear()
+            self._ready.clear()
+            self._invisible.clear()
+
+class LocalSqs:
+
+    def __init__(self, visibility_timeout: int = 30) -> None:
+        self.visibility_timeout = visibility_timeout
+        self.queues: Dict[str, LocalQueue] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def get_queue(self, name: str) -> LocalQueue:
+        with self._lock:
+            if name not in self.queues:
+                self.queues[name] = LocalQueue(name, self.visibility_timeout)
+            return self.queues[name]
+
+    def dispatch(self, action: str, params: Dict[str, Any]) -> Response:
+        self.requests += 1
+        if action == "CreateQueue":
+            self.get_queue(params["QueueName"])
+            return 200, {"QueueUrl": params["QueueName"]}
+
+        queue_url = params.get("QueueUrl", "")
+        if not queue_url:
+            return _error("MissingParameter", "QueueUrl is required")
+        # Queues are created on first use, named by the last path segment.
+        queue = self.get_queue(queue_url.rstrip("/").rpartition("/")[2])
+
+        if action == "SendMessage":
+            return 200, {"MessageId": queue.send(params["MessageBody"])}
+        if action == "SendMessageBatch":
+            return 200, {
+                "Successful": [
+                    {"Id": entry["Id"], "MessageId": queue.send(entry["MessageBody"])}
+                    for entry in params.get("Entries", [])
+                ],
+                "Failed": []
+            }
+        if action == "ReceiveMessage":
+            max_messages = int(params.get("MaxNumberOfMessages", 1))
+            if not 1 <= max_messages <= 10:
+                return _error("InvalidParameterValue", "MaxNumberOfMessages must be between 1 and 10")
+            visibility_timeout = params.get("VisibilityTimeout")
+            messages = queue.receive(
+                max_messages,
+                float(params.get("WaitTimeSeconds", 0)),
+                None if visibility_timeout is None else int(visibility_timeout)
+            )
+            return 200, {"Messages": messages} if messages else {}
+        if action == "DeleteMessage":
+            if not queue.delete(params["ReceiptHandle"]):
+                return _error("ReceiptHandleIsInvalid", "The receipt handle is not valid")
+            return 200, {}
+        if action == "DeleteMessageBatch":
+            return 200, self._batch(params, lambda entry: queue.delete(entry["ReceiptHandle"]))
+        if action == "ChangeMessageVisibility":
+            if not queue.change_visibility(params["ReceiptHandle"], int(params["VisibilityTimeout"])):
+                return _error("ReceiptHandleIsInvalid", "The receipt handle is not valid")
+            return 200, {}
+        if action == "ChangeMessageVisibilityBatch":
+            return 200, self._batch(
+                params,
+                lambda entry: queue.change_visibility(entry["ReceiptHandle"], int(entry["VisibilityTimeout"]))
+            )
+        if action == "GetQueueAttributes":
+            return 200, {"Attributes": queue.attributes()}
+        if action == "PurgeQueue":
+            queue.purge()
+            return 200, {}
+        return _error("InvalidAction", f"Unsupported action {action}")
+
+    def _batch(self, params: Dict[str, Any], apply: Any) -> Dict[str, Any]:
+        entries = params.get("Entries", [])
+        if len(entries) > 10:
+            return {"Successful": [], "Failed": [
+                {"Id": entry["Id"], "Code": "TooManyEntriesInBatchRequest", "SenderFault": True} for entry in entries
+            ]}
+        successful, failed = [], []
+        for entry in entries:
+            if apply(entry):
+                successful.append({"Id": entry["Id"]})
+            else:
+                failed.append({
+                    "Id": entry["Id"],
+                    "Code": "ReceiptHandleIsInvalid",
+                    "Message": "The receipt handle is not valid",
+                    "SenderFault": True
+                })
+        return {"Successful": successful, "Failed": failed}
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs adds ~40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+            action = self.headers.get("X-Amz-Target", "").rpartition(".")[2]
+            status, payload = self.server.sqs.dispatch(action, params)
+        except (ValueError, KeyError, TypeError) as e:
+            status, payload = _error("InvalidParameterValue", str(e))
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-amz-json-1.0")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+class LocalSqsServer:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, visibility_timeout: int = 30) -> None:
+        self.sqs = LocalSqs(visibility_timeout)
+        self._server = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.sqs = self.sqs
+        self.host, self.port = self._server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    def queue_url(self, name: str) -> str:
+        return f"http://{self.host}:{self.port}/{ACCOUNT_ID}/{name}"
+
+    def start(self) -> "LocalSqsServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-sqs", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local SQS stand-in for the worker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9324)
+    parser.add_argument("--queue", default="local")
+    parser.add_argument("--seed", type=int, default=0, help="number of sample requests to enqueue")
+    parser.add_argument("--visibility-timeout", type=int, default=30)
+    args = parser.parse_args()
+
+    server = LocalSqsServer(args.host, args.port, args.visibility_timeout)
+    queue = server.sqs.get_queue(args.queue)
+    for i in range(args.seed):
+        queue.send(json.dumps({"request_id": f"local-{i}", "payload": f"sample {i}"}))
+    print(f"Local SQS listening, SQS_QUEUE_URL={server.queue_url(args.queue)} ({args.seed} messages seeded)", flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
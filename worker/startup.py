@@ -0,0 +1,116 @@
+import importlib.abc
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from worker.logwriter import log
+
+class _TimedLoader(importlib.abc.Loader):
+
+    def __init__(self, loader: Any, name: str, timer: "ImportTimer") -> None:
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def create_module(self, spec: Any) -> Any:
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: Any) -> None:
+        self._timer.enter()
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.leave(self._name, time.perf_counter() - started)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loader, name)
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    # In-process equivalent of `python -X importtime`: wraps every loader
+    # found after installation and records cumulative and self time per module.
+
+    def __init__(self) -> None:
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self._child_time: List[float] = []
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname: str, path: Any, target: Any = None) -> Any:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, fullname, self)
+                return spec
+        return None
+
+    def enter(self) -> None:
+        self._child_time.append(0.0)
+
+    def leave(self, name: str, cumulative: float) -> None:
+        children = self._child_time.pop()
+        if self._child_time:
+            self._child_time[-1] += cumulative
+        self.timings[name] = (cumulative, cumulative - children)
+
+    def top(self, count: int = 15) -> List[Dict[str, Any]]:
+        ranked = sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True)[:count]
+        return [
+            {"module": name, "self_ms": round(own * 1000, 3), "cumulative_ms": round(total * 1000, 3)}
+            for name, (total, own) in ranked
+        ]
+
+def interpreter_start_seconds() -> Optional[float]:
+    # Seconds since the kernel started this process, from /proc; called at
+    # the top of app.py it approximates the interpreter's own start-up.
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+class StartupProfiler:
+
+    def __init__(self, started: float, import_timer: Optional[ImportTimer] = None) -> None:
+        self.started = started
+        self.import_timer = import_timer
+        self.process_age = interpreter_start_seconds()
+        self.phases: List[Tuple[str, float]] = []
+        self._last = started
+        self.reported = False
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self) -> None:
+        if self.reported:
+            return
+        self.reported = True
+        if self.import_timer is not None:
+            self.import_timer.uninstall()
+
+        total = time.perf_counter() - self.started
+        phases = {name: round(seconds * 1000, 3) for name, seconds in self.phases}
+        log(
+            f"Startup took {total * 1000:.1f}ms after interpreter start",
+            event="startup_profile",
+            total_ms=round(total * 1000, 3),
+            interpreter_start_ms=None if self.process_age is None else round(self.process_age * 1000, 1),
+            phases_ms=phases,
+            top_imports=self.import_timer.top() if self.import_timer is not None else []
+        )
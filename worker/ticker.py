@@ -0,0 +1,99 @@
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict
+
+SKIP = "skip"
+CATCH_UP = "catch_up"
+MISSED_TICK_POLICIES = (SKIP, CATCH_UP)
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class LatencyStats:
+
+    def __init__(self, window: int = 1024) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        self._samples.append(value)
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self._samples)
+        return {
+            "count": self.count,
+            "p50": percentile(ordered, 0.50),
+            "p99": percentile(ordered, 0.99),
+            "max": self.max
+        }
+
+class Ticker:
+    # Deadlines are fixed multiples of the interval from the first tick, so
+    # the time a job takes never pushes later ticks back.
+
+    def __init__(
+        self,
+        interval: float,
+        policy: str = SKIP,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        if interval <= 0:
+            raise ValueError(f"interval must be > 0, got {interval}")
+        if policy not in MISSED_TICK_POLICIES:
+            raise ValueError(f"Unknown missed tick policy: {policy}. Available: {list(MISSED_TICK_POLICIES)}")
+
+        self.interval = interval
+        self.policy = policy
+        self._clock = clock
+        self._next_deadline = clock()
+        self.ticks = 0
+        self.skipped = 0
+        self.lag = LatencyStats()
+        self.duration = LatencyStats()
+
+    def delay(self) -> float:
+        return max(0.0, self._next_deadline - self._clock())
+
+    def fire(self) -> float:
+        now = self._clock()
+        lag = max(0.0, now - self._next_deadline)
+        self.lag.record(lag)
+        self.ticks += 1
+
+        self._next_deadline += self.interval
+        if now >= self._next_deadline and self.policy == SKIP:
+            missed = math.floor((now - self._next_deadline) / self.interval) + 1
+            self._next_deadline += missed * self.interval
+            self.skipped += missed
+
+        return lag
+
+    def record_duration(self, seconds: float) -> None:
+        self.duration.record(seconds)
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "interval": self.interval,
+            "policy": self.policy,
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "lag": self.lag.summary(),
+            "duration": self.duration.summary()
+        }
+
+def format_summary(name: str, ticker: Ticker) -> str:
+    lag = ticker.lag.summary()
+    duration = ticker.duration.summary()
+    return (
+        f"Tick stats {name}: ticks={ticker.ticks} skipped={ticker.skipped} "
+        f"lag_ms p50={lag['p50'] * 1000:.2f} p99={lag['p99'] * 1000:.2f} max={lag['max'] * 1000:.2f} "
+        f"duration_ms p50={duration['p50'] * 1000:.2f} p99={duration['p99'] * 1000:.2f} max={duration['max'] * 1000:.2f}"
+    )
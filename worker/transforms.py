@@ -0,0 +1,16 @@
+import hashlib
+import json
+from typing import Any, Dict
+
+_canonical = json.JSONEncoder(sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode
+
+def normalize_request(record: Any) -> Dict[str, Any]:
+    if not isinstance(record, dict):
+        record = {"payload": record}
+
+    normalized = {
+        str(key).strip().lower(): value.strip() if isinstance(value, str) else value
+        for key, value in record.items()
+    }
+    normalized["fingerprint"] = hashlib.sha256(_canonical(normalized).encode("utf-8")).hexdigest()
+    return normalized